@@ -0,0 +1,192 @@
+"""按学期归档错题, 让活动数据库只保留当前学期的数据
+
+旧错题移入数据库同目录下的学期分片 study_archive_<学期>.db。分片包含
+mistakes (与主库同列)、其引用的 images 以及 rollup_daily 汇总表;
+主库中的删除由触发器同步全文索引、标签与汇总表。历史分析逐个 ATTACH
+分片取出汇总行后随即 DETACH, 再与主库汇总表 UNION ALL (见 StudyStore._rollup_source)。
+
+    python study_archive.py                      # 归档本学期之前的错题
+    python study_archive.py --before 2025-08-01
+    python study_archive.py --finished           # 同时归档已全部完成的课程
+"""
+import glob
+import os
+from datetime import date
+
+SHARD_PREFIX = "study_archive_"
+
+
+def term_of(created_at):
+    """时间所属学期: 2-7 月为春季, 8 月至次年 1 月为秋季"""
+    try:
+        year, month = int(created_at[:4]), int(created_at[5:7])
+    except (TypeError, ValueError):
+        return "未知"
+    if month == 1:
+        return f"{year - 1}秋"
+    return f"{year}春" if month < 8 else f"{year}秋"
+
+
+def term_start(today=None):
+    """当前学期第一天的 ISO 日期, 早于它的错题属于旧学期"""
+    today = today or date.today()
+    if today.month == 1:
+        return f"{today.year - 1}-08-01"
+    return f"{today.year}-02-01" if today.month < 8 else f"{today.year}-08-01"
+
+
+def shard_path(db_path, term):
+    """学期分片文件路径, 与主库放在同一目录"""
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), f"{SHARD_PREFIX}{term}.db")
+
+
+def shard_paths(db_path):
+    """已有的全部学期分片"""
+    pattern = os.path.join(os.path.dirname(os.path.abspath(db_path)), f"{SHARD_PREFIX}*.db")
+    return sorted(glob.glob(pattern))
+
+
+def finished_courses(store):
+    """全部资源都已完成的课程"""
+    rows = store.conn.execute('''
+        SELECT course_type FROM courses
+        GROUP BY course_type
+        HAVING MIN(completed) = 1
+    ''').fetchall()
+    return [row[0] for row in rows]
+
+
+def _ensure_shard_schema(cur, alias):
+    """在分片中建表, 返回分片 mistakes 的列名"""
+    # 以主库当前的列建表; 之后主库新增的列不会进入已有分片, 复制时按分片的列取值
+    cur.execute(f"CREATE TABLE IF NOT EXISTS {alias}.mistakes AS SELECT * FROM main.mistakes WHERE 0")
+    cur.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {alias}.idx_archive_mistakes_id ON mistakes(id)")
+    cur.execute(f'''CREATE TABLE IF NOT EXISTS {alias}.images (
+        hash TEXT PRIMARY KEY,
+        data BLOB NOT NULL,
+        size INTEGER
+    )''')
+    cur.execute(f'''CREATE TABLE IF NOT EXISTS {alias}.rollup_daily (
+        day TEXT NOT NULL,
+        course_type TEXT NOT NULL,
+        chapter TEXT NOT NULL,
+        error_type TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (day, course_type, chapter, error_type)
+    ) WITHOUT ROWID''')
+    return [row[1] for row in cur.execute(f"PRAGMA {alias}.table_info(mistakes)").fetchall()]
+
+
+def _copy_to_shard(cur, alias, columns):
+    """复制 temp.archive_ids 中的错题及其图片, 并重算分片汇总表"""
+    column_list = ", ".join(columns)
+    cur.execute(f'''
+        INSERT OR IGNORE INTO {alias}.mistakes ({column_list})
+        SELECT {column_list} FROM main.mistakes WHERE id IN temp.archive_ids
+    ''')
+    cur.execute(f'''
+        INSERT OR IGNORE INTO {alias}.images (hash, data, size)
+        SELECT hash, data, size FROM main.images
+        WHERE hash IN (SELECT image_hash FROM main.mistakes WHERE id IN temp.archive_ids)
+    ''')
+    cur.execute(f"DELETE FROM {alias}.rollup_daily")
+    cur.execute(f'''
+        INSERT INTO {alias}.rollup_daily (day, course_type, chapter, error_type, count)
+        SELECT IFNULL(date(created_at), ''), IFNULL(course_type, ''),
+               IFNULL(chapter, ''), IFNULL(error_type, ''), COUNT(*)
+        FROM {alias}.mistakes
+        GROUP BY 1, 2, 3, 4
+    ''')
+
+
+def _delete_from_main(cur):
+    """从主库删除 temp.archive_ids 中的错题, 以及不再被引用的图片与缩略图"""
+    hashes = [row[0] for row in cur.execute('''
+        SELECT DISTINCT image_hash FROM main.mistakes
+        WHERE id IN temp.archive_ids AND image_hash IS NOT NULL
+    ''').fetchall()]
+    uids = [row[0] for row in cur.execute(
+        "SELECT uid FROM main.mistakes WHERE id IN temp.archive_ids").fetchall()]
+    cur.execute("DELETE FROM main.mistakes WHERE id IN temp.archive_ids")
+    # 归档只是本机的存储分层, 不向其他设备同步为删除: 去掉触发器留下的墓碑
+    cur.executemany("DELETE FROM main.change_log WHERE entity = 'mistakes' AND key = ?",
+                    [(uid,) for uid in uids])
+    cur.executemany('''
+        DELETE FROM main.images
+        WHERE hash=? AND NOT EXISTS (SELECT 1 FROM main.mistakes WHERE image_hash=?)
+    ''', [(h, h) for h in hashes])
+    cur.executemany('''
+        DELETE FROM main.thumbnails
+        WHERE hash=? AND NOT EXISTS (SELECT 1 FROM main.images WHERE hash=?)
+    ''', [(h, h) for h in hashes])
+
+
+def archive_mistakes(store, before=None, course_types=()):
+    """把 before 之前创建的错题与 course_types 中课程的错题移入学期分片
+
+    返回 {学期: 条数}。每个学期先在一个事务中复制并提交, 再在另一个事务中
+    从主库删除: WAL 模式下跨库事务并非整体原子, 两步之间中断只会留下重复,
+    重新归档时按 id 跳过已复制的行。
+    """
+    conditions, params = [], []
+    if before:
+        conditions.append("created_at < ?")
+        params.append(before)
+    if course_types:
+        conditions.append(f"course_type IN ({', '.join('?' * len(course_types))})")
+        params.extend(course_types)
+    if not conditions:
+        return {}
+
+    store.flush()
+    cur = store.conn.cursor()
+    by_term = {}
+    for mistake_id, created_at in cur.execute(
+            f"SELECT id, created_at FROM mistakes WHERE {' OR '.join(conditions)}", params).fetchall():
+        by_term.setdefault(term_of(created_at), []).append(mistake_id)
+
+    moved = {}
+    try:
+        cur.execute("CREATE TEMP TABLE IF NOT EXISTS archive_ids (id INTEGER PRIMARY KEY)")
+        for term, ids in sorted(by_term.items()):
+            path = shard_path(store.db_path, term)
+            alias = store.attach_shard(path)
+            try:
+                columns = _ensure_shard_schema(cur, alias)
+                for step in (lambda: _copy_to_shard(cur, alias, columns), lambda: _delete_from_main(cur)):
+                    cur.execute("BEGIN IMMEDIATE")
+                    try:
+                        cur.execute("DELETE FROM temp.archive_ids")
+                        cur.executemany("INSERT INTO temp.archive_ids VALUES (?)", [(i,) for i in ids])
+                        step()
+                        store.commit()
+                    except Exception:
+                        store.conn.rollback()
+                        raise
+            finally:
+                store.detach_shard(path)
+            moved[term] = len(ids)
+    finally:
+        cur.close()
+        store.invalidate_sampler()
+    return moved
+
+
+if __name__ == "__main__":
+    import argparse
+    from study_store import StudyStore, DB_PATH
+
+    parser = argparse.ArgumentParser(description="按学期归档旧错题")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--before", default=term_start(), help="归档此日期之前创建的错题 (默认本学期开始)")
+    parser.add_argument("--finished", action="store_true", help="同时归档已全部完成的课程")
+    args = parser.parse_args()
+
+    store = StudyStore(args.db)
+    courses = finished_courses(store) if args.finished else ()
+    result = archive_mistakes(store, args.before, courses)
+    store.close()
+    for term, count in result.items():
+        print(f"{term}: 归档 {count} 条")
+    if not result:
+        print("没有需要归档的错题")
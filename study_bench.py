@@ -0,0 +1,340 @@
+"""StudyMasterPro 数据层基准测试
+
+生成合成的 courses/mistakes 数据集 (含真实大小的图片 BLOB),
+对 StudyStore 的热点操作测量延迟分位数与内存峰值, 并可与保存的基线对比。
+
+    python study_bench.py --rows 50000
+    python study_bench.py --rows 50000 200000 --save-baseline
+    python study_bench.py --rows 50000 --baseline bench_baseline.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from study_store import StudyStore, COURSE_CATALOG, ERROR_TYPES
+try:
+    import study_retention
+except ImportError:
+    # 未安装 NumPy 时不测复习日志分析
+    study_retention = None
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+
+
+def generate_dataset(db_path, rows, image_ratio, image_kb, seed=0, batch=5000):
+    """生成合成数据集, 返回 StudyStore"""
+    rng = random.Random(seed)
+    store = StudyStore(db_path)
+    store.seed_courses()
+
+    chapters = [(course, chapter) for course, items in COURSE_CATALOG.items()
+                for chapter, _ in items]
+    now = datetime.now()
+
+    def make_row():
+        course, chapter = rng.choice(chapters)
+        created = now - timedelta(seconds=rng.randint(0, 365 * 86400))
+        reviewed = created + timedelta(seconds=rng.randint(0, 30 * 86400))
+        mastery = rng.choice([0, 1, 2])
+        # JPEG 几乎不可压缩, 用随机字节模拟图片大小
+        digest = None
+        if rng.random() < image_ratio:
+            size = int(image_kb * 1024 * rng.uniform(0.5, 1.5))
+            digest = store.put_image(rng.randbytes(size))
+        return (
+            course, chapter,
+            f"合成题目 #{rng.randint(0, 10**9)}: " + "题干" * rng.randint(5, 60),
+            digest,
+            rng.choice(ERROR_TYPES),
+            ",".join(rng.sample(["公式", "单位", "图像", "概念", "符号", "推导"], rng.randint(0, 3))),
+            mastery,
+            max(0.1, 1.0 - (mastery-1)*0.4) if mastery else 1.0,
+            created.isoformat(),
+            reviewed.isoformat() if mastery else None,
+            (reviewed + timedelta(days=rng.randint(0, 60))).isoformat()
+        )
+
+    pending = []
+    for _ in range(rows):
+        pending.append(make_row())
+        if len(pending) >= batch:
+            _insert_rows(store, pending)
+            pending = []
+    if pending:
+        _insert_rows(store, pending)
+
+    # 复习日志: 平均每道错题两次复习, 分布在最近一年
+    start = int(now.timestamp()) - 365 * 86400
+    events = [
+        (rng.randint(1, rows), start + rng.randint(0, 365 * 86400), rng.choice((1, 2, 2)))
+        for _ in range(rows * 2)
+    ]
+    store.cursor.executemany("INSERT INTO review_log (mistake_id, reviewed_at, result) VALUES (?, ?, ?)",
+                             sorted(events, key=lambda e: e[1]))
+    store.conn.commit()
+    return store
+
+
+def _insert_rows(store, rows):
+    store.cursor.executemany('''
+        INSERT INTO mistakes (
+            course_type, chapter, question, image_hash, error_type, tags,
+            mastery_level, probability, created_at, last_reviewed, next_due
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+
+
+def _operations(store, rng):
+    """被测操作: 名称 -> 无参调用"""
+    max_id = store.conn.execute("SELECT MAX(id) FROM mistakes").fetchone()[0] or 1
+
+    def load_mistakes():
+        store.list_mistakes()
+
+    def scroll_mistakes():
+        # 连续翻 10 页, 模拟滚动到列表深处
+        rows = store.list_mistakes()
+        for _ in range(10):
+            if not rows:
+                break
+            rows = store.list_mistakes(after=(rows[-1][6], rows[-1][0]))
+
+    def random_review():
+        store.pick_review()
+
+    def due_review():
+        store.next_due_mistake()
+        store.due_count()
+
+    def review_session():
+        # 一轮 20 张: 抽取、逐张读取、一个事务提交全部结果
+        ids = store.pick_review_ids(20)
+        results = []
+        for mistake_id in ids:
+            store.get_mistake(mistake_id)
+            results.append((mistake_id, rng.choice((1, 2)), datetime.now()))
+        store.record_reviews(results)
+
+    def search_mistakes():
+        store.search_mistakes("题干", course_type=rng.choice(list(COURSE_CATALOG)),
+                              error_type=rng.choice(ERROR_TYPES))
+
+    def show_mistake_detail():
+        store.get_mistake(rng.randint(1, max_id))
+
+    def update_analytics():
+        for period in ("最近一周", "最近一月", "全部数据"):
+            store.error_type_stats(period)
+        store.course_progress()
+
+    def generate_recommendations():
+        store.incomplete_courses()
+        store.ranked_chapters()
+
+    def rank_after_review():
+        # 复习一题使其章节被标脏, 测增量重算一个章节 + 排序 (含这次提交)
+        store.record_review(rng.randint(1, max_id), rng.choice((1, 2)))
+        store.ranked_chapters()
+
+    def get_chapters():
+        store.get_chapters(rng.choice(list(COURSE_CATALOG)))
+
+    def retention_analytics():
+        study_retention.retention_report(store)
+
+    return {
+        "load_mistakes": load_mistakes,
+        "scroll_mistakes": scroll_mistakes,
+        "random_review": random_review,
+        "due_review": due_review,
+        "review_session": review_session,
+        "show_mistake_detail": show_mistake_detail,
+        "search_mistakes": search_mistakes,
+        "update_analytics": update_analytics,
+        "generate_recommendations": generate_recommendations,
+        "rank_after_review": rank_after_review,
+        "get_chapters": get_chapters,
+        **({"retention_analytics": retention_analytics} if study_retention else {}),
+    }
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def measure(func, repeat, warmup=2):
+    """多次调用 func, 返回延迟分位数 (ms) 与 Python 堆内存峰值 (KB)"""
+    for _ in range(warmup):
+        func()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    # tracemalloc 会拖慢调用, 内存单独测一次
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        "p50_ms": round(_percentile(timings, 50), 3),
+        "p95_ms": round(_percentile(timings, 95), 3),
+        "p99_ms": round(_percentile(timings, 99), 3),
+        "max_ms": round(timings[-1], 3),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def run_suite(rows, image_ratio, image_kb, repeat, workdir, seed=0):
+    """对一个数据规模运行全部操作"""
+    db_path = os.path.join(workdir, f"bench_{rows}.db")
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    start = time.perf_counter()
+    store = generate_dataset(db_path, rows, image_ratio, image_kb, seed=seed)
+    gen_seconds = time.perf_counter() - start
+
+    rng = random.Random(seed)
+    results = {}
+    for name, func in _operations(store, rng).items():
+        results[name] = measure(func, repeat)
+    store.close()
+    size_mb = os.path.getsize(db_path) / 1024 / 1024
+    os.remove(db_path)
+    return {
+        "rows": rows,
+        "image_ratio": image_ratio,
+        "image_kb": image_kb,
+        "db_mb": round(size_mb, 1),
+        "generate_s": round(gen_seconds, 2),
+        "operations": results,
+    }
+
+
+def run_io_suite(rows, image_ratio, image_kb, workdir, seed=0):
+    """导出再导入一个数据集, 报告吞吐量"""
+    from study_io import export_mistakes, import_mistakes
+    src_path = os.path.join(workdir, f"io_src_{rows}.db")
+    dst_path = os.path.join(workdir, f"io_dst_{rows}.db")
+    zip_path = os.path.join(workdir, f"io_{rows}.zip")
+    for path in (src_path, dst_path, zip_path):
+        if os.path.exists(path):
+            os.remove(path)
+    store = generate_dataset(src_path, rows, image_ratio, image_kb, seed=seed)
+    exported = export_mistakes(store, zip_path)
+    store.close()
+    target = StudyStore(dst_path)
+    imported = import_mistakes(target, zip_path)
+    target.close()
+    zip_mb = round(os.path.getsize(zip_path) / 1048576, 1)
+    for path in (src_path, dst_path, zip_path):
+        os.remove(path)
+    print(f"\n== io rows={rows}  zip={zip_mb} MB ==")
+    for name, r in (("export", exported), ("import", imported)):
+        print(f"{name:<8}{r['rows']:>8} rows {r['images']:>6} images "
+              f"{r['seconds']:>8.2f} s {r['rows_per_s']:>10.0f} rows/s {r['mb_per_s']:>8.1f} MB/s")
+    return {"export": exported, "import": imported, "zip_mb": zip_mb}
+
+
+def print_report(report, baseline=None, threshold=0.2):
+    """打印结果表, 若给出基线则标出回退; 返回是否存在回退"""
+    regressed = False
+    print(f"\n== rows={report['rows']}  db={report['db_mb']} MB  "
+          f"generate={report['generate_s']} s ==")
+    print(f"{'operation':<26}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}{'peakKB':>10}  vs baseline p95")
+    for name, r in report["operations"].items():
+        line = (f"{name:<26}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}"
+                f"{r['p99_ms']:>10.2f}{r['max_ms']:>10.2f}{r['peak_kb']:>10.1f}")
+        base = (baseline or {}).get("operations", {}).get(name)
+        if base and base["p95_ms"] > 0:
+            delta = (r["p95_ms"] - base["p95_ms"]) / base["p95_ms"]
+            mark = ""
+            if delta > threshold:
+                mark = "  REGRESSION"
+                regressed = True
+            line += f"  {delta:+.0%} ({base['p95_ms']:.2f} ms){mark}"
+        print(line)
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="StudyMasterPro 数据层基准测试")
+    parser.add_argument("--rows", type=int, nargs="*", default=[50000],
+                        help="错题数量, 可给出多个规模; 不给值则只跑 --io")
+    parser.add_argument("--image-ratio", type=float, default=0.02,
+                        help="带图片的错题比例")
+    parser.add_argument("--image-kb", type=int, default=150,
+                        help="图片平均大小 (KB)")
+    parser.add_argument("--repeat", type=int, default=30, help="每个操作的采样次数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default=None, help="临时数据库目录")
+    parser.add_argument("--baseline", default=None,
+                        help="与该基线文件对比 (默认读取 bench_baseline.json, 若存在)")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="把本次结果写入基线文件")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="p95 超过基线该比例即视为回退")
+    parser.add_argument("--json", default=None, help="把结果另存为 JSON")
+    parser.add_argument("--io", type=int, default=0, metavar="ROWS",
+                        help="另外测量 ROWS 条错题的导出/导入吞吐量")
+    args = parser.parse_args(argv)
+
+    baseline_path = args.baseline or BASELINE_PATH
+    baseline = {}
+    if os.path.exists(baseline_path) and not args.save_baseline:
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    own_workdir = args.workdir is None
+    workdir = args.workdir or tempfile.mkdtemp(prefix="studybench_")
+    reports = []
+    regressed = False
+    for rows in args.rows:
+        report = run_suite(rows, args.image_ratio, args.image_kb, args.repeat,
+                           workdir, seed=args.seed)
+        reports.append(report)
+        base = baseline.get(str(rows))
+        if base and (base["image_ratio"], base["image_kb"]) != (args.image_ratio, args.image_kb):
+            print(f"[rows={rows}] 基线的图片参数不同, 跳过对比")
+            base = None
+        regressed |= print_report(report, base, args.threshold)
+
+    io_report = None
+    if args.io:
+        io_report = run_io_suite(args.io, args.image_ratio, args.image_kb, workdir, seed=args.seed)
+
+    if own_workdir:
+        os.rmdir(workdir)
+
+    result = {str(r["rows"]): r for r in reports}
+    if io_report:
+        result["io"] = io_report
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    if args.save_baseline:
+        merged = {}
+        if os.path.exists(baseline_path):
+            with open(baseline_path, encoding="utf-8") as f:
+                merged = json.load(f)
+        merged.update(result)
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump(merged, f, ensure_ascii=False, indent=2)
+        print(f"\n基线已保存: {baseline_path}")
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""学习分析页的图表引擎"""
+import math
+
+
+class AnalyticsCharts:
+    """坐标轴只创建一次, 数据变化时原地更新饼图扇区与柱高
+
+    只有类别集合 (错误类型、课程) 变化时才清空并重建对应的子图;
+    数据与上次相同则不重绘。重绘使用 draw_idle, 由 Tk 空闲时合并执行。
+    """
+
+    def __init__(self, figure, canvas):
+        self.figure = figure
+        self.canvas = canvas
+        self.ax_pie = figure.add_subplot(221)
+        self.ax_bar = figure.add_subplot(222)
+        self._pie_labels = None
+        self._wedges = []
+        self._label_texts = []
+        self._pct_texts = []
+        self._bar_courses = None
+        self._bars = []
+        self._data = None
+        self._layout_done = False
+        self.ax_curve = None
+        self.ax_heat = None
+        self._curve_line = None
+        self._heat_image = None
+
+    def update(self, error_stats, progress):
+        """用新数据刷新图表, 返回是否真的重绘"""
+        data = (tuple(error_stats), tuple(progress))
+        if data == self._data:
+            return False
+        self._data = data
+        self._update_pie(error_stats)
+        self._update_bars(progress)
+        if not self._layout_done:
+            self.figure.tight_layout()
+            self._layout_done = True
+        self.canvas.draw_idle()
+        return True
+
+    def _update_pie(self, stats):
+        # 错题类型分布
+        labels = tuple(label for label, _ in stats)
+        sizes = [size for _, size in stats]
+        if labels != self._pie_labels:
+            self._pie_labels = labels
+            self.ax_pie.clear()
+            if stats:
+                self._wedges, self._label_texts, self._pct_texts = self.ax_pie.pie(
+                    sizes, labels=labels, autopct='%1.1f%%')
+                self.ax_pie.set_title('错题类型分布')
+            else:
+                self._wedges, self._label_texts, self._pct_texts = [], [], []
+                self.ax_pie.text(0.5, 0.5, '暂无数据', ha='center', va='center')
+            return
+
+        # 类别不变: 按 ax.pie 的默认几何 (半径 1, 标签 1.1, 百分比 0.6) 移动已有图元
+        total = float(sum(sizes))
+        theta = 0.0
+        for wedge, label, pct, size in zip(self._wedges, self._label_texts, self._pct_texts, sizes):
+            span = 360.0 * size / total
+            wedge.set_theta1(theta)
+            wedge.set_theta2(theta + span)
+            mid = math.radians(theta + span / 2)
+            x, y = math.cos(mid), math.sin(mid)
+            label.set_position((1.1 * x, 1.1 * y))
+            label.set_horizontalalignment('left' if x > 0 else 'right')
+            pct.set_position((0.6 * x, 0.6 * y))
+            pct.set_text(f'{100.0 * size / total:.1f}%')
+            theta += span
+
+    def _update_bars(self, progress):
+        # 学习进度分析
+        courses = tuple(course for course, _ in progress)
+        percents = [percent for _, percent in progress]
+        if courses != self._bar_courses:
+            self._bar_courses = courses
+            self.ax_bar.clear()
+            self._bars = []
+            if progress:
+                self._bars = list(self.ax_bar.bar(courses, percents))
+                self.ax_bar.set_ylim(0, 100)
+                self.ax_bar.set_title('课程完成进度')
+                self.ax_bar.set_ylabel('完成百分比 (%)')
+            return
+        for bar, percent in zip(self._bars, percents):
+            bar.set_height(percent)
+
+    def update_retention(self, report):
+        """刷新遗忘曲线与复习量热力图; report 为 study_retention.retention_report 的结果"""
+        if self.ax_curve is None:
+            self.ax_curve = self.figure.add_subplot(223)
+            self.ax_heat = self.figure.add_subplot(224)
+            days = report["curve_days"]
+            self._curve_line, = self.ax_curve.plot(range(len(days)), report["curve_rate"] * 100, marker='o')
+            self.ax_curve.set_xticks(range(len(days)))
+            self.ax_curve.set_xticklabels([str(d) for d in days])
+            self.ax_curve.set_ylim(0, 100)
+            self.ax_curve.set_title('遗忘曲线')
+            self.ax_curve.set_xlabel('距上次复习 (天)')
+            self.ax_curve.set_ylabel('回忆成功率 (%)')
+            self._heat_image = self.ax_heat.imshow(report["heatmap"], aspect='auto', cmap='Greens',
+                                                   interpolation='nearest')
+            self.ax_heat.set_yticks(range(7))
+            self.ax_heat.set_yticklabels(['一', '二', '三', '四', '五', '六', '日'])
+            self.ax_heat.set_title(f'近一年复习量 (共 {report["reviews"]} 次)')
+            self.figure.tight_layout()
+        else:
+            self._curve_line.set_ydata(report["curve_rate"] * 100)
+            self._heat_image.set_data(report["heatmap"])
+            self.ax_heat.set_title(f'近一年复习量 (共 {report["reviews"]} 次)')
+        self._heat_image.set_clim(0, max(1, int(report["heatmap"].max())))
+        self.canvas.draw_idle()
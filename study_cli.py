@@ -0,0 +1,156 @@
+"""无界面的命令行入口, 输出 JSON, 便于脚本与定时任务调用
+
+不导入 tkinter / matplotlib / PIL; 各子命令只在用到时才导入对应模块。
+
+    python -m study_cli stats
+    python -m study_cli recommend
+    python -m study_cli queue --mode due --limit 20
+    python -m study_cli export backup.zip
+    python -m study_cli import mistakes.csv --images ./pics
+    python -m study_cli maintenance check
+"""
+import argparse
+import json
+import sys
+from study_store import StudyStore, DB_PATH, PERIOD_OFFSETS, ARCHIVE_PERIOD
+
+QUESTION_PREVIEW = 80
+
+
+def cmd_stats(store, args):
+    """错题总数、今日待复习、错误类型分布与课程进度"""
+    return {
+        "mistakes": store.mistake_count(),
+        "due_today": store.due_count(),
+        "period": args.period,
+        "error_types": dict(store.error_type_stats(args.period)),
+        "course_progress": dict(store.course_progress()),
+    }
+
+
+def cmd_recommend(store, args):
+    """与分析页相同的学习推荐; --retention 时附带保持率最低的章节 (需要 NumPy)"""
+    result = {
+        "incomplete_courses": [f"{name} ({res_type})" for name, res_type in
+                               store.incomplete_courses(args.limit)],
+        "hot_chapters": [{"chapter": chapter, "mistakes": count} for chapter, count in
+                         store.hot_chapters(args.period, args.limit)],
+        "ranked_chapters": [{"chapter": chapter, "score": round(score, 2), "mistakes": count,
+                             "unmastered": unmastered, "top_error_type": error_type}
+                            for chapter, score, count, unmastered, error_type in
+                            store.ranked_chapters(args.limit)],
+    }
+    if not args.retention:
+        return result
+    # 导入 NumPy 本身就要几十毫秒, 所以按需开启
+    import study_retention
+    chapters = study_retention.retention_report(store)["chapters"][:args.limit]
+    result["weak_chapters"] = [{"chapter": chapter, "reviews": reviews, "retention": round(rate, 3)}
+                               for chapter, reviews, rate in chapters]
+    return result
+
+
+def cmd_queue(store, args):
+    """接下来要复习的错题: 间隔复习按到期先后, 随机复习按权重抽取"""
+    if args.mode == "due":
+        ids = store.due_review_ids(args.limit)
+    else:
+        ids = store.pick_review_ids(args.limit)
+    queue = []
+    for mistake_id in ids:
+        row = store.get_mistake(mistake_id)
+        queue.append({
+            "id": row[0], "course": row[1], "chapter": row[2],
+            "question": (row[3] or "")[:QUESTION_PREVIEW],
+            "has_image": bool(row[4]), "error_type": row[5],
+            "mastery_level": row[7], "last_reviewed": row[10],
+        })
+    return {"mode": args.mode, "count": len(queue), "queue": queue}
+
+
+def cmd_import(store, args):
+    """从 zip / JSONL / CSV 导入"""
+    import study_io
+    return study_io.import_mistakes(store, args.path, args.images)
+
+
+def cmd_export(store, args):
+    """导出为 zip"""
+    import study_io
+    return study_io.export_mistakes(store, args.zip_path)
+
+
+def cmd_maintenance(store, args):
+    """数据库维护"""
+    import study_maintenance
+    if args.action == "stats":
+        stats = study_maintenance.db_stats(store)
+        stats["largest_images"] = [
+            {"hash": digest, "bytes": size, "references": refs, "mistake_id": mistake_id}
+            for digest, size, refs, mistake_id in stats["largest_images"]
+        ]
+        stats["tables"] = dict(stats["tables"])
+        return stats
+    if args.action == "vacuum":
+        return {"freed_pages": study_maintenance.incremental_vacuum(store)}
+    if args.action == "optimize":
+        study_maintenance.optimize(store)
+        return {"optimized": True}
+    if args.action == "check":
+        problems = study_maintenance.quick_check(store)
+        return {"ok": not problems, "problems": problems}
+    before, after = study_maintenance.compact(store)
+    return {"bytes_before": before, "bytes_after": after}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m study_cli", description="学习数据命令行工具 (JSON 输出)")
+    parser.add_argument("--db", default=DB_PATH, help="数据库路径")
+    parser.add_argument("--pretty", action="store_true", help="缩进输出 JSON")
+    sub = parser.add_subparsers(dest="command", required=True)
+    periods = list(PERIOD_OFFSETS) + [ARCHIVE_PERIOD]
+
+    p = sub.add_parser("stats", help="错题与进度统计")
+    p.add_argument("--period", choices=periods, default="全部数据")
+    p.set_defaults(func=cmd_stats)
+
+    p = sub.add_parser("recommend", help="学习推荐")
+    p.add_argument("--period", choices=periods, default="最近一月")
+    p.add_argument("--limit", type=int, default=3)
+    p.add_argument("--retention", action="store_true", help="附带保持率最低的章节 (需要 NumPy)")
+    p.set_defaults(func=cmd_recommend)
+
+    p = sub.add_parser("queue", help="复习队列")
+    p.add_argument("--mode", choices=["due", "random"], default="due")
+    p.add_argument("--limit", type=int, default=20)
+    p.set_defaults(func=cmd_queue)
+
+    p = sub.add_parser("import", help="从 zip / JSONL / CSV 导入")
+    p.add_argument("path")
+    p.add_argument("--images", default=None, help="图片目录 (JSONL/CSV 中 image 字段的相对根目录)")
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser("export", help="导出为 zip")
+    p.add_argument("zip_path")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("maintenance", help="数据库维护")
+    p.add_argument("action", choices=["stats", "vacuum", "optimize", "check", "compact"])
+    p.set_defaults(func=cmd_maintenance)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    store = StudyStore(args.db)
+    try:
+        result = args.func(store, args)
+    finally:
+        store.close()
+    json.dump(result, sys.stdout, ensure_ascii=False, indent=2 if args.pretty else None)
+    sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
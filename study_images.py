@@ -0,0 +1,191 @@
+"""题目图片的入库处理、缩略图生成与显示缓存
+
+PIL 只在第一次真正处理图片时导入, 不拖慢程序启动。
+
+    python study_images.py recompress --dry-run    # 估算对已有图片重新处理能省下的空间
+"""
+from collections import OrderedDict
+from io import BytesIO
+from study_migrations import image_hash
+
+# 已解码 PhotoImage 的默认内存预算
+THUMBNAIL_BUDGET_MB = 64
+# 入库图片的最长边、编码格式与质量
+INGEST_MAX_SIDE = 1600
+INGEST_FORMAT = "WEBP"
+INGEST_QUALITY = 80
+# 追溯处理时每多少张图片提交一次
+RECOMPRESS_BATCH = 50
+_METADATA_KEYS = ("exif", "icc_profile", "xmp", "XML:com.adobe.xmp")
+
+
+def normalize_image(data, max_side=INGEST_MAX_SIDE, quality=INGEST_QUALITY, fmt=INGEST_FORMAT):
+    """入库前处理图片: 按 EXIF 方向摆正、限制最长边、丢弃元数据并重新编码
+
+    已是目标格式、尺寸不超限且不带元数据的图片原样返回, 重复处理不会反复有损压缩;
+    相同输入总得到相同输出, 入库时按内容摘要去重。
+    """
+    from PIL import Image, ImageOps, features
+    img = Image.open(BytesIO(data))
+    if fmt == "WEBP" and not features.check("webp"):
+        fmt = "JPEG"
+    if (img.format == fmt and max(img.size) <= max_side
+            and not any(key in img.info for key in _METADATA_KEYS)):
+        return data
+    has_alpha = img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+    img = ImageOps.exif_transpose(img)
+    img.thumbnail((max_side, max_side))
+    img = img.convert("RGBA" if has_alpha and fmt != "JPEG" else "RGB")
+    out = BytesIO()
+    # 不传 exif / icc_profile, 元数据随之丢弃
+    if fmt == "JPEG":
+        img.save(out, format="JPEG", quality=quality, optimize=True)
+    else:
+        img.save(out, format=fmt, quality=quality)
+    return out.getvalue()
+
+
+def recompress_images(store, max_side=INGEST_MAX_SIDE, quality=INGEST_QUALITY,
+                      dry_run=False, progress=None):
+    """对库中已有图片追溯执行入库处理, 返回节省空间的报告
+
+    只有处理后更小的图片才会替换; 处理后内容相同的图片合并为一份。
+    dry_run 时只计算不写入。progress(已处理张数, 总张数) 每张调用一次。
+    """
+    store.flush()
+    digests = [row[0] for row in store.conn.execute("SELECT hash FROM images").fetchall()]
+    existing = set(digests)
+    produced = set()
+    report = {"images": len(digests), "rewritten": 0, "merged": 0, "kept": 0, "failed": 0,
+              "bytes_before": 0, "bytes_after": 0}
+    for done, digest in enumerate(digests, 1):
+        data = store.load_image(digest)
+        report["bytes_before"] += len(data)
+        try:
+            new = normalize_image(data, max_side, quality)
+        except (OSError, ValueError):
+            new = None
+            report["failed"] += 1
+        if new is None or len(new) >= len(data):
+            if new is not None:
+                report["kept"] += 1
+            report["bytes_after"] += len(data)
+        else:
+            new_digest = image_hash(new)
+            if new_digest in existing or new_digest in produced:
+                report["merged"] += 1
+            else:
+                report["bytes_after"] += len(new)
+            produced.add(new_digest)
+            report["rewritten"] += 1
+            if not dry_run:
+                store.replace_image(digest, new)
+                if report["rewritten"] % RECOMPRESS_BATCH == 0:
+                    store.commit()
+        if progress:
+            progress(done, len(digests))
+    if not dry_run:
+        store.commit()
+    report["bytes_saved"] = report["bytes_before"] - report["bytes_after"]
+    report["saved_percent"] = (round(100.0 * report["bytes_saved"] / report["bytes_before"], 1)
+                               if report["bytes_before"] else 0.0)
+    return report
+
+
+def make_thumbnail(data, size):
+    """把原图缩放到 size×size 以内, 返回 PNG 字节"""
+    from PIL import Image
+    img = Image.open(BytesIO(data))
+    img.thumbnail((size, size))
+    if img.mode not in ("RGB", "RGBA", "L", "LA", "P"):
+        img = img.convert("RGB")
+    out = BytesIO()
+    img.save(out, format="PNG", optimize=False)
+    return out.getvalue()
+
+
+class ThumbnailCache:
+    """两级缩略图缓存: 数据库中按尺寸持久化的 PNG + 内存中按字节预算淘汰的 PhotoImage
+
+    同一张图在同一尺寸下只会被 PIL 解码一次; 之后的显示直接复用 PhotoImage。
+    prepare() 只做读库与解码, 可在后台线程用该线程自己的 store 调用;
+    PhotoImage 的创建与内存缓存的读写 (remember/cached) 必须在 Tk 主线程。
+    """
+
+    def __init__(self, budget_mb=THUMBNAIL_BUDGET_MB):
+        self.budget = int(budget_mb * 1024 * 1024)
+        self.used = 0
+        self._photos = OrderedDict()
+
+    def cached(self, digest, size):
+        """只查内存, 未命中返回 None"""
+        return self._lookup((digest, size))
+
+    @staticmethod
+    def decode(thumb):
+        """把缩略图字节解码为已载入像素的 PIL Image"""
+        from PIL import Image
+        img = Image.open(BytesIO(thumb))
+        img.load()
+        return img
+
+    @classmethod
+    def prepare(cls, store, digest, size):
+        """读取或生成缩略图并解码, 不涉及 Tk, 可在后台线程调用"""
+        thumb = store.load_thumbnail(digest, size)
+        if thumb is None:
+            data = store.load_image(digest)
+            if data is None:
+                return None
+            thumb = make_thumbnail(data, size)
+            store.save_thumbnail(digest, size, thumb)
+        return cls.decode(thumb)
+
+    def remember(self, key, img):
+        """由已解码的图片创建 PhotoImage 并放入内存缓存"""
+        from PIL import ImageTk
+        photo = ImageTk.PhotoImage(img)
+        # Tk 内部按 32 位像素保存
+        cost = img.width * img.height * 4
+        self._photos[key] = (photo, cost)
+        self.used += cost
+        while self.used > self.budget and len(self._photos) > 1:
+            _, (_, old_cost) = self._photos.popitem(last=False)
+            self.used -= old_cost
+        return photo
+
+    def _lookup(self, key):
+        entry = self._photos.get(key)
+        if entry is None:
+            return None
+        self._photos.move_to_end(key)
+        return entry[0]
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    from study_store import StudyStore, DB_PATH
+
+    parser = argparse.ArgumentParser(description="题目图片维护")
+    parser.add_argument("--db", default=DB_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_recompress = sub.add_parser("recompress", help="对已有图片追溯执行入库处理")
+    p_recompress.add_argument("--max-side", type=int, default=INGEST_MAX_SIDE)
+    p_recompress.add_argument("--quality", type=int, default=INGEST_QUALITY)
+    p_recompress.add_argument("--dry-run", action="store_true", help="只报告可节省的空间, 不写入")
+    args = parser.parse_args()
+
+    store = StudyStore(args.db)
+    result = recompress_images(
+        store, args.max_side, args.quality, args.dry_run,
+        progress=lambda done, total: print(f"\r已处理 {done}/{total}", end="", file=sys.stderr, flush=True)
+    )
+    store.close()
+    print(file=sys.stderr)
+    mb = 1024 * 1024
+    print(f"图片 {result['images']} 张: 重新编码 {result['rewritten']} (其中合并重复 {result['merged']}), "
+          f"保持原样 {result['kept']}, 无法解析 {result['failed']}")
+    print(f"占用 {result['bytes_before'] / mb:.1f} MB -> {result['bytes_after'] / mb:.1f} MB, "
+          f"节省 {result['bytes_saved'] / mb:.1f} MB ({result['saved_percent']}%)"
+          + (" [dry-run, 未写入]" if args.dry_run else ""))
@@ -0,0 +1,285 @@
+"""错题的批量导入与导出
+
+导入: JSONL / CSV 文件 (可附图片目录), 或本模块导出的 zip 包;
+先完整检查一遍记录与引用的图片, 有问题时不写入任何数据; 之后按批
+executemany 写入, 每批一个事务, 全文索引与汇总表由触发器维护。
+导出: 流式写入 zip, mistakes.jsonl 之外每张图片单独一个条目,
+任何时刻内存中只有一批错题行和一张图片。引用的图片已不存在的错题
+按无图片导出, 条数记在 missing_images。
+
+    python study_io.py export backup.zip
+    python study_io.py import backup.zip
+    python study_io.py import mistakes.csv --images ./pics
+"""
+import csv
+import io
+import json
+import os
+import sys
+import time
+import zipfile
+from datetime import datetime
+from study_migrations import image_hash, split_tags
+
+IMPORT_BATCH_SIZE = 1000
+EXPORT_BATCH_SIZE = 500
+# 导出/导入的字段 (image 为图片相对路径)
+FIELDS = ("course_type", "chapter", "question", "error_type", "tags", "mastery_level",
+          "probability", "created_at", "last_reviewed", "next_due", "image")
+
+
+def _image_ext(data):
+    if data.startswith(b"\x89PNG"):
+        return ".png"
+    if data.startswith(b"\xff\xd8"):
+        return ".jpg"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return ".webp"
+    return ".bin"
+
+
+def _read_records(path, archive=None):
+    """逐条产出导入记录 (dict)"""
+    if archive is not None:
+        with archive.open("mistakes.jsonl") as raw:
+            for line in io.TextIOWrapper(raw, encoding="utf-8"):
+                if line.strip():
+                    yield json.loads(line)
+    elif path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            yield from csv.DictReader(f)
+    else:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def _mastery(record):
+    return int(record.get("mastery_level") or 0)
+
+
+def _probability(record):
+    value = record.get("probability")
+    return 1.0 if value in (None, "") else float(value)
+
+
+def _image_path(image_dir, name):
+    """图片目录下的文件路径; 名字指向目录之外 (.. 或绝对路径、符号链接) 时抛出 ValueError"""
+    root = os.path.realpath(image_dir)
+    path = os.path.realpath(os.path.join(root, name))
+    if os.path.commonpath([root, path]) != root:
+        raise ValueError(f"图片不在图片目录内: {name}")
+    return path
+
+
+def _check_records(path, archive, image_dir):
+    """写入前检查整个文件: 记录可解析、数值字段合法、引用的图片都存在"""
+    names = set(archive.namelist()) if archive is not None else None
+    missing = []
+    for number, record in enumerate(_read_records(path, archive), 1):
+        if not isinstance(record, dict):
+            raise ValueError(f"第 {number} 条记录格式无效")
+        try:
+            _mastery(record)
+            _probability(record)
+        except (TypeError, ValueError):
+            raise ValueError(f"第 {number} 条记录的掌握程度或概率无效") from None
+        name = record.get("image")
+        if not name:
+            continue
+        if names is not None:
+            found = name in names
+        else:
+            try:
+                found = os.path.isfile(_image_path(image_dir, name))
+            except ValueError as e:
+                raise ValueError(f"第 {number} 条记录: {e}") from None
+        if not found:
+            missing.append(name)
+    if missing:
+        raise FileNotFoundError(f"缺少 {len(missing)} 张图片, 未导入任何错题: {', '.join(missing[:5])}")
+
+
+def import_mistakes(store, path, image_dir=None, batch_size=IMPORT_BATCH_SIZE, progress=None):
+    """流式导入错题, 返回统计信息; progress(已导入条数) 每批调用一次
+
+    先检查整个文件, 发现无效记录或缺失的图片时抛出 ValueError / FileNotFoundError,
+    数据库不做任何修改。
+    """
+    archive = zipfile.ZipFile(path) if zipfile.is_zipfile(path) else None
+    if image_dir is None and archive is None:
+        image_dir = os.path.dirname(os.path.abspath(path))
+    store.flush()
+    stats = {"rows": 0, "images": 0, "image_bytes": 0}
+    start = time.perf_counter()
+
+    def load_image(name):
+        if archive is not None:
+            return archive.read(name)
+        with open(_image_path(image_dir, name), "rb") as f:
+            return f.read()
+
+    batch = []
+    try:
+        _check_records(path, archive, image_dir)
+        for record in _read_records(path, archive):
+            batch.append(record)
+            if len(batch) >= batch_size:
+                _import_batch(store, batch, load_image, stats)
+                batch = []
+                if progress:
+                    progress(stats["rows"])
+        if batch:
+            _import_batch(store, batch, load_image, stats)
+            if progress:
+                progress(stats["rows"])
+    finally:
+        if archive is not None:
+            archive.close()
+        store.invalidate_sampler()
+
+    stats["seconds"] = round(time.perf_counter() - start, 3)
+    stats["rows_per_s"] = round(stats["rows"] / stats["seconds"], 1) if stats["seconds"] else None
+    stats["mb_per_s"] = (round(stats["image_bytes"] / 1048576 / stats["seconds"], 1)
+                         if stats["seconds"] else None)
+    return stats
+
+
+def _import_batch(store, records, load_image, stats):
+    """一批记录一个事务: 先写图片, 再按预分配的 id 写错题与标签关联"""
+    cur = store.cursor
+    now = datetime.now().isoformat()
+    cur.execute("BEGIN IMMEDIATE")
+    try:
+        # 持有写锁后分配连续 id, 以便 executemany 之后写标签关联
+        next_id = cur.execute("SELECT IFNULL(MAX(id), 0) + 1 FROM mistakes").fetchone()[0]
+        images = {}
+        rows = []
+        tag_links = []
+        for offset, r in enumerate(records):
+            digest = None
+            if r.get("image"):
+                data = load_image(r["image"])
+                digest = image_hash(data)
+                if digest not in images:
+                    images[digest] = data
+            mistake_id = next_id + offset
+            created_at = r.get("created_at") or now
+            rows.append((
+                mistake_id, r.get("course_type"), r.get("chapter"), r.get("question"),
+                digest, r.get("error_type"), r.get("tags"), _mastery(r), _probability(r),
+                created_at, r.get("last_reviewed") or None, r.get("next_due") or created_at
+            ))
+            tag_links.extend((mistake_id, name) for name in split_tags(r.get("tags")))
+
+        cur.executemany("INSERT OR IGNORE INTO images (hash, data, size) VALUES (?, ?, ?)",
+                        [(d, data, len(data)) for d, data in images.items()])
+        stats["images"] += cur.rowcount if cur.rowcount > 0 else 0
+        stats["image_bytes"] += sum(len(data) for data in images.values())
+        cur.executemany('''
+            INSERT INTO mistakes (
+                id, course_type, chapter, question, image_hash, error_type, tags,
+                mastery_level, probability, created_at, last_reviewed, next_due
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        cur.executemany("INSERT OR IGNORE INTO tags (name) VALUES (?)",
+                        [(name,) for name in {name for _, name in tag_links}])
+        cur.executemany('''
+            INSERT OR IGNORE INTO mistake_tags (tag_id, mistake_id)
+            SELECT id, ? FROM tags WHERE name = ?
+        ''', tag_links)
+        store.commit()
+    except Exception:
+        store.conn.rollback()
+        raise
+    stats["rows"] += len(records)
+
+
+def export_mistakes(store, zip_path, batch_size=EXPORT_BATCH_SIZE, progress=None):
+    """把全部错题与图片流式导出到 zip, 返回统计信息; progress(已导出条数, 总数)"""
+    store.flush()
+    start = time.perf_counter()
+    total = store.conn.execute("SELECT COUNT(*) FROM mistakes").fetchone()[0]
+    stats = {"rows": 0, "images": 0, "image_bytes": 0, "missing_images": 0}
+    ext = {}
+
+    with zipfile.ZipFile(zip_path, "w", allowZip64=True) as archive:
+        # 图片本身已压缩, 不再 deflate
+        cur = store.conn.cursor()
+        cur.execute("SELECT hash FROM images WHERE hash IN (SELECT image_hash FROM mistakes)")
+        digests = [row[0] for row in cur.fetchall()]
+        for digest in digests:
+            data = store.load_image(digest)
+            ext[digest] = _image_ext(data)
+            archive.writestr(f"images/{digest}{ext[digest]}", data,
+                             compress_type=zipfile.ZIP_STORED)
+            stats["images"] += 1
+            stats["image_bytes"] += len(data)
+
+        info = zipfile.ZipInfo("mistakes.jsonl", datetime.now().timetuple()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED
+        with archive.open(info, "w", force_zip64=True) as raw:
+            out = io.TextIOWrapper(raw, encoding="utf-8")
+            cur.execute('''
+                SELECT course_type, chapter, question, error_type, tags, mastery_level,
+                       probability, created_at, last_reviewed, next_due, image_hash
+                FROM mistakes ORDER BY id
+            ''')
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    record = dict(zip(FIELDS, row))
+                    digest = record["image"]
+                    if digest and digest not in ext:
+                        # 悬空的 image_hash: 图片行已不存在, 按无图片导出
+                        stats["missing_images"] += 1
+                        digest = None
+                    record["image"] = f"images/{digest}{ext[digest]}" if digest else None
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                stats["rows"] += len(rows)
+                if progress:
+                    progress(stats["rows"], total)
+            out.flush()
+            out.detach()
+        cur.close()
+
+    stats["seconds"] = round(time.perf_counter() - start, 3)
+    stats["rows_per_s"] = round(stats["rows"] / stats["seconds"], 1) if stats["seconds"] else None
+    stats["mb_per_s"] = (round(stats["image_bytes"] / 1048576 / stats["seconds"], 1)
+                         if stats["seconds"] else None)
+    return stats
+
+
+def _print_progress(done, total=None):
+    suffix = f"/{total}" if total else ""
+    print(f"\r已处理 {done}{suffix}", end="", file=sys.stderr, flush=True)
+
+
+if __name__ == "__main__":
+    import argparse
+    from study_store import StudyStore, DB_PATH
+
+    parser = argparse.ArgumentParser(description="错题批量导入导出")
+    parser.add_argument("--db", default=DB_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_export = sub.add_parser("export", help="导出为 zip")
+    p_export.add_argument("zip_path")
+    p_import = sub.add_parser("import", help="从 zip / JSONL / CSV 导入")
+    p_import.add_argument("path")
+    p_import.add_argument("--images", default=None, help="图片目录 (JSONL/CSV 中 image 字段的相对根目录)")
+    args = parser.parse_args()
+
+    store = StudyStore(args.db)
+    if args.command == "export":
+        result = export_mistakes(store, args.zip_path, progress=_print_progress)
+        if result["missing_images"]:
+            print(f"\n警告: {result['missing_images']} 条错题引用的图片已不存在, 按无图片导出",
+                  end="", file=sys.stderr)
+    else:
+        result = import_mistakes(store, args.path, args.images, progress=_print_progress)
+    store.close()
+    print(file=sys.stderr)
+    print(json.dumps(result, ensure_ascii=False))
@@ -0,0 +1,160 @@
+"""数据库维护: 增量回收空闲页、更新查询统计、完整性检查与一键压缩
+
+数据库使用 auto_vacuum=INCREMENTAL (迁移 10), 删除大图片留下的空闲页由
+界面在空闲时分批归还, 不必整库 VACUUM。迁移前建立的数据库要整库 VACUUM
+一次才会切换, 由空闲维护在后台完成 (enable_incremental_vacuum)。各函数都只使用传入 store 的连接,
+界面在后台线程上用工作线程自己的连接调用。
+
+    python study_maintenance.py stats
+    python study_maintenance.py check
+    python study_maintenance.py compact
+"""
+import os
+import sqlite3
+
+# 每次空闲回收的最大页数 (4 KB 页约 4 MB)
+INCREMENTAL_VACUUM_PAGES = 1000
+LARGEST_ROWS = 10
+
+
+def _pragma(conn, name):
+    return conn.execute(f"PRAGMA {name}").fetchone()[0]
+
+
+def file_size(store):
+    """数据库文件与 WAL 文件的总字节数"""
+    total = 0
+    for path in (store.db_path, store.db_path + "-wal"):
+        if os.path.exists(path):
+            total += os.path.getsize(path)
+    return total
+
+
+def db_stats(store, top=LARGEST_ROWS):
+    """文件大小、空闲页、各表占用与最大的图片行"""
+    conn = store.conn
+    page_size = _pragma(conn, "page_size")
+    stats = {
+        "file_bytes": file_size(store),
+        "page_size": page_size,
+        "page_count": _pragma(conn, "page_count"),
+        "free_pages": _pragma(conn, "freelist_count"),
+        "auto_vacuum": {0: "NONE", 1: "FULL", 2: "INCREMENTAL"}.get(_pragma(conn, "auto_vacuum")),
+    }
+    stats["free_bytes"] = stats["free_pages"] * page_size
+    # length() 只读记录头, 不会把图片内容从溢出页读出来
+    stats["largest_images"] = conn.execute('''
+        SELECT i.hash, length(i.data), COUNT(m.id), MIN(m.id)
+        FROM images i LEFT JOIN mistakes m ON m.image_hash = i.hash
+        GROUP BY i.hash
+        ORDER BY length(i.data) DESC
+        LIMIT ?
+    ''', (top,)).fetchall()
+    try:
+        stats["tables"] = conn.execute('''
+            SELECT name, SUM(pgsize) FROM dbstat
+            GROUP BY name ORDER BY 2 DESC LIMIT ?
+        ''', (top,)).fetchall()
+    except sqlite3.OperationalError:
+        # SQLite 未编译 dbstat 虚表
+        stats["tables"] = []
+    return stats
+
+
+def incremental_vacuum_pending(store):
+    """数据库是否还没有切换到 auto_vacuum=INCREMENTAL"""
+    return _pragma(store.conn, "auto_vacuum") != 2
+
+
+def enable_incremental_vacuum(store):
+    """整库 VACUUM 一次, 把 auto_vacuum 切换为 INCREMENTAL; 已切换时返回 False
+
+    耗时与库大小成正比, 期间数据库被锁定, 应在后台连接上于空闲时调用。
+    """
+    if not incremental_vacuum_pending(store):
+        return False
+    store.flush()
+    # auto_vacuum 的新值不持久化, 只对同一连接上随后的 VACUUM 有效
+    store.conn.executescript('''
+        PRAGMA auto_vacuum = INCREMENTAL;
+        VACUUM;
+    ''')
+    store.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    return True
+
+
+def incremental_vacuum(store, max_pages=INCREMENTAL_VACUUM_PAGES):
+    """归还至多 max_pages 个空闲页, 返回实际归还的页数"""
+    store.flush()
+    before = _pragma(store.conn, "freelist_count")
+    if before:
+        # 该 PRAGMA 每 step 一次只归还一页, execute 只 step 一次, executescript 才会执行到底;
+        # WAL 模式下文件在检查点时才真正截短
+        store.conn.executescript(f'''
+            PRAGMA incremental_vacuum({int(max_pages)});
+            PRAGMA wal_checkpoint(PASSIVE);
+        ''')
+    return before - _pragma(store.conn, "freelist_count")
+
+
+def optimize(store):
+    """更新查询规划器统计; 从未 ANALYZE 过时先完整执行一次"""
+    store.flush()
+    analyzed = store.conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone()
+    if not analyzed:
+        store.conn.execute("ANALYZE")
+    store.conn.execute("PRAGMA optimize")
+
+
+def quick_check(store):
+    """PRAGMA quick_check, 返回发现的问题 (空列表表示正常)"""
+    rows = [row[0] for row in store.conn.execute("PRAGMA quick_check").fetchall()]
+    return [] if rows == ["ok"] else rows
+
+
+def compact(store):
+    """整库 VACUUM 并截断 WAL, 返回 (压缩前字节数, 压缩后字节数)"""
+    store.flush()
+    before = file_size(store)
+    store.conn.executescript('''
+        PRAGMA auto_vacuum = INCREMENTAL;
+        VACUUM;
+    ''')
+    store.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    return before, file_size(store)
+
+
+if __name__ == "__main__":
+    import argparse
+    from study_store import StudyStore, DB_PATH
+
+    parser = argparse.ArgumentParser(description="数据库维护")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("command", choices=["stats", "vacuum", "optimize", "check", "compact"])
+    args = parser.parse_args()
+
+    mb = 1024 * 1024
+    store = StudyStore(args.db)
+    if args.command == "stats":
+        result = db_stats(store)
+        print(f"文件 {result['file_bytes'] / mb:.1f} MB, 空闲页 {result['free_pages']} "
+              f"({result['free_bytes'] / mb:.1f} MB), auto_vacuum={result['auto_vacuum']}")
+        for name, size in result["tables"]:
+            print(f"  {name:<32}{size / mb:10.1f} MB")
+        for digest, size, refs, mistake_id in result["largest_images"]:
+            print(f"  图片 {digest[:12]}  {size / 1024:10.0f} KB  错题 #{mistake_id} 等 {refs} 条引用")
+    elif args.command == "vacuum":
+        if enable_incremental_vacuum(store):
+            print("已整库 VACUUM, auto_vacuum 切换为 INCREMENTAL")
+        print(f"归还空闲页 {incremental_vacuum(store)} 个")
+    elif args.command == "optimize":
+        optimize(store)
+        print("统计信息已更新")
+    elif args.command == "check":
+        problems = quick_check(store)
+        print("\n".join(problems) if problems else "ok")
+    else:
+        before, after = compact(store)
+        print(f"{before / mb:.1f} MB -> {after / mb:.1f} MB")
+    store.close()
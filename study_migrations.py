@@ -0,0 +1,569 @@
+"""按 PRAGMA user_version 递增执行的数据库迁移
+
+每个迁移是一个接收 cursor 的函数, 与 user_version 的更新在同一事务中提交,
+中途失败时整体回滚, 下次启动会重新执行。新迁移只能追加到 MIGRATIONS 末尾,
+不再需要的迁移保留为空操作, 以免已有数据库的版本号错位。
+"""
+import hashlib
+import re
+
+
+def image_hash(data):
+    """图片内容的 sha256 十六进制摘要, 作为 images 表主键"""
+    return hashlib.sha256(data).hexdigest()
+
+
+_CJK = re.compile(r'([\u3400-\u9fff\uf900-\ufaff])')
+_TAG_SPLIT = re.compile(r'[\s,，;；、]+')
+
+
+def fts_text(text):
+    """全文索引用的切分: 每个汉字单独成词, 其余按 unicode61 规则处理
+
+    unicode61 会把连续汉字当作一个词, 无法按词内子串检索; 逐字切开后
+    用短语查询 ("电 路") 即可匹配任意长度的中文片段。
+    """
+    if not text:
+        return ''
+    return _CJK.sub(r' \1 ', text)
+
+
+def split_tags(tags):
+    """把自由文本标签拆成去重后的标签列表"""
+    seen = []
+    for tag in _TAG_SPLIT.split(tags or ''):
+        tag = tag.strip().lower()
+        if tag and tag not in seen:
+            seen.append(tag)
+    return seen
+
+
+def register_functions(conn):
+    """注册触发器依赖的 SQL 函数; 每个连接都必须调用"""
+    conn.create_function("fts_text", 1, fts_text, deterministic=True)
+
+
+def _m001_base_schema(cur):
+    """v5 原始表结构"""
+    # 课程表
+    cur.execute('''CREATE TABLE IF NOT EXISTS courses (
+        id INTEGER PRIMARY KEY,
+        course_type TEXT,
+        chapter TEXT,
+        resource_type TEXT,
+        completed INTEGER DEFAULT 0,
+        last_updated TEXT,
+        sort_order INTEGER
+    )''')
+
+    # 错题表
+    cur.execute('''CREATE TABLE IF NOT EXISTS mistakes (
+        id INTEGER PRIMARY KEY,
+        course_type TEXT,
+        chapter TEXT,
+        question TEXT,
+        image BLOB,
+        error_type TEXT,
+        tags TEXT,
+        mastery_level INTEGER DEFAULT 0,
+        probability REAL DEFAULT 1.0,
+        created_at TEXT,
+        last_reviewed TEXT
+    )''')
+
+
+def _m002_unique_courses(cur):
+    """清理每次启动重复写入的课程行, 并加唯一索引"""
+    # 保留每组最小 id, 合并完成状态与最后更新时间
+    cur.execute('''
+        UPDATE courses
+        SET completed = (
+                SELECT MAX(c.completed) FROM courses c
+                WHERE c.course_type IS courses.course_type
+                  AND c.chapter IS courses.chapter
+                  AND c.resource_type IS courses.resource_type),
+            last_updated = (
+                SELECT MAX(c.last_updated) FROM courses c
+                WHERE c.course_type IS courses.course_type
+                  AND c.chapter IS courses.chapter
+                  AND c.resource_type IS courses.resource_type)
+        WHERE id IN (
+            SELECT MIN(id) FROM courses
+            GROUP BY course_type, chapter, resource_type
+            HAVING COUNT(*) > 1)
+    ''')
+    cur.execute('''
+        DELETE FROM courses
+        WHERE id NOT IN (
+            SELECT MIN(id) FROM courses
+            GROUP BY course_type, chapter, resource_type)
+    ''')
+    cur.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_courses_key
+        ON courses(course_type, chapter, resource_type)
+    ''')
+
+
+def _m003_image_store(cur):
+    """把 mistakes.image 中的图片移到按内容寻址的 images 表"""
+    cur.execute('''CREATE TABLE IF NOT EXISTS images (
+        hash TEXT PRIMARY KEY,
+        data BLOB NOT NULL,
+        size INTEGER
+    )''')
+    cur.execute("ALTER TABLE mistakes ADD COLUMN image_hash TEXT")
+    cur.connection.create_function("image_hash", 1, image_hash, deterministic=True)
+    cur.execute('''
+        INSERT OR IGNORE INTO images (hash, data, size)
+        SELECT image_hash(image), image, length(image)
+        FROM mistakes WHERE image IS NOT NULL
+    ''')
+    # 旧的 image 列保留但不再写入, 置空后其溢出页即被释放
+    cur.execute('''
+        UPDATE mistakes SET image_hash = image_hash(image), image = NULL
+        WHERE image IS NOT NULL
+    ''')
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_mistakes_image_hash ON mistakes(image_hash)")
+
+
+def _m004_thumbnails(cur):
+    """按尺寸持久化的缩略图"""
+    cur.execute('''CREATE TABLE IF NOT EXISTS thumbnails (
+        hash TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        data BLOB NOT NULL,
+        PRIMARY KEY (hash, size)
+    )''')
+
+
+def _m005_recent_index(cur):
+    """支持错题列表默认排序 (最近复习在前, 未复习在后) 的键集分页"""
+    cur.execute('''
+        CREATE INDEX IF NOT EXISTS idx_mistakes_recent
+        ON mistakes(IFNULL(last_reviewed, ''))
+    ''')
+
+
+def _m006_spaced_repetition(cur):
+    """SM-2 调度字段与到期索引; 旧错题全部视为已到期"""
+    cur.execute("ALTER TABLE mistakes ADD COLUMN repetitions INTEGER DEFAULT 0")
+    cur.execute("ALTER TABLE mistakes ADD COLUMN interval_days INTEGER DEFAULT 0")
+    cur.execute("ALTER TABLE mistakes ADD COLUMN ease REAL DEFAULT 2.5")
+    cur.execute("ALTER TABLE mistakes ADD COLUMN next_due TEXT")
+    cur.execute('''
+        UPDATE mistakes
+        SET next_due = COALESCE(last_reviewed, created_at, datetime('now', 'localtime'))
+    ''')
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_mistakes_next_due ON mistakes(next_due)")
+
+
+def rebuild_rollups(cur):
+    """从 mistakes 全量重算汇总表"""
+    cur.execute("DELETE FROM rollup_daily")
+    cur.execute("DELETE FROM rollup_total")
+    cur.execute('''
+        INSERT INTO rollup_daily (day, course_type, chapter, error_type, count)
+        SELECT IFNULL(date(created_at), ''), IFNULL(course_type, ''),
+               IFNULL(chapter, ''), IFNULL(error_type, ''), COUNT(*)
+        FROM mistakes
+        GROUP BY 1, 2, 3, 4
+    ''')
+    cur.execute('''
+        INSERT INTO rollup_total (course_type, chapter, error_type, count)
+        SELECT course_type, chapter, error_type, SUM(count)
+        FROM rollup_daily
+        GROUP BY 1, 2, 3
+    ''')
+
+
+def _m007_rollups(cur):
+    """按 日期×课程×章节×错误类型 汇总错题数, 由触发器随 mistakes 增删改维护"""
+    cur.execute('''CREATE TABLE IF NOT EXISTS rollup_daily (
+        day TEXT NOT NULL,
+        course_type TEXT NOT NULL,
+        chapter TEXT NOT NULL,
+        error_type TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (day, course_type, chapter, error_type)
+    ) WITHOUT ROWID''')
+    cur.execute('''CREATE TABLE IF NOT EXISTS rollup_total (
+        course_type TEXT NOT NULL,
+        chapter TEXT NOT NULL,
+        error_type TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (course_type, chapter, error_type)
+    ) WITHOUT ROWID''')
+
+    # 汇总维度为 NULL 时记为空串, 否则主键冲突不会触发累加
+    add = '''
+        INSERT INTO rollup_daily VALUES (
+            IFNULL(date(NEW.created_at), ''), IFNULL(NEW.course_type, ''),
+            IFNULL(NEW.chapter, ''), IFNULL(NEW.error_type, ''), 1)
+        ON CONFLICT DO UPDATE SET count = count + 1;
+        INSERT INTO rollup_total VALUES (
+            IFNULL(NEW.course_type, ''), IFNULL(NEW.chapter, ''),
+            IFNULL(NEW.error_type, ''), 1)
+        ON CONFLICT DO UPDATE SET count = count + 1;
+    '''
+    remove = '''
+        UPDATE rollup_daily SET count = count - 1
+        WHERE day = IFNULL(date(OLD.created_at), '') AND course_type = IFNULL(OLD.course_type, '')
+          AND chapter = IFNULL(OLD.chapter, '') AND error_type = IFNULL(OLD.error_type, '');
+        UPDATE rollup_total SET count = count - 1
+        WHERE course_type = IFNULL(OLD.course_type, '')
+          AND chapter = IFNULL(OLD.chapter, '') AND error_type = IFNULL(OLD.error_type, '');
+    '''
+    cur.execute(f"CREATE TRIGGER IF NOT EXISTS trg_rollup_insert AFTER INSERT ON mistakes BEGIN {add} END")
+    cur.execute(f"CREATE TRIGGER IF NOT EXISTS trg_rollup_delete AFTER DELETE ON mistakes BEGIN {remove} END")
+    cur.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_rollup_update
+        AFTER UPDATE OF created_at, course_type, chapter, error_type ON mistakes
+        BEGIN {remove} {add} END
+    ''')
+    rebuild_rollups(cur)
+
+
+def sync_tags(cur, mistake_id, tags):
+    """按 tags 文本重写一条错题的标签关联"""
+    cur.execute("DELETE FROM mistake_tags WHERE mistake_id=?", (mistake_id,))
+    for name in split_tags(tags):
+        cur.execute("INSERT OR IGNORE INTO tags (name) VALUES (?)", (name,))
+        cur.execute('''
+            INSERT OR IGNORE INTO mistake_tags (tag_id, mistake_id)
+            SELECT id, ? FROM tags WHERE name=?
+        ''', (mistake_id, name))
+
+
+def _m008_search(cur):
+    """题目与标签的 FTS5 全文索引, 以及规范化的标签表"""
+    register_functions(cur.connection)
+    cur.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS mistakes_fts
+        USING fts5(question, tags, tokenize='unicode61')
+    ''')
+    # 索引中存放 fts_text 切分后的文本, rowid 对应 mistakes.id
+    cur.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_fts_insert AFTER INSERT ON mistakes BEGIN
+            INSERT INTO mistakes_fts (rowid, question, tags)
+            VALUES (NEW.id, fts_text(NEW.question), fts_text(NEW.tags));
+        END
+    ''')
+    cur.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_fts_delete AFTER DELETE ON mistakes BEGIN
+            DELETE FROM mistakes_fts WHERE rowid = OLD.id;
+        END
+    ''')
+    cur.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_fts_update AFTER UPDATE OF question, tags ON mistakes BEGIN
+            UPDATE mistakes_fts SET question = fts_text(NEW.question), tags = fts_text(NEW.tags)
+            WHERE rowid = NEW.id;
+        END
+    ''')
+    cur.execute("DELETE FROM mistakes_fts")
+    cur.execute('''
+        INSERT INTO mistakes_fts (rowid, question, tags)
+        SELECT id, fts_text(question), fts_text(tags) FROM mistakes
+    ''')
+
+    cur.execute('''CREATE TABLE IF NOT EXISTS tags (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE
+    )''')
+    cur.execute('''CREATE TABLE IF NOT EXISTS mistake_tags (
+        tag_id INTEGER NOT NULL,
+        mistake_id INTEGER NOT NULL,
+        PRIMARY KEY (tag_id, mistake_id)
+    ) WITHOUT ROWID''')
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_mistake_tags_mistake ON mistake_tags(mistake_id)")
+    cur.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_tags_delete AFTER DELETE ON mistakes BEGIN
+            DELETE FROM mistake_tags WHERE mistake_id = OLD.id;
+        END
+    ''')
+    rows = cur.execute("SELECT id, tags FROM mistakes WHERE IFNULL(tags, '') != ''").fetchall()
+    for mistake_id, tags in rows:
+        sync_tags(cur, mistake_id, tags)
+
+
+def _m009_review_log(cur):
+    """只追加的复习日志, 全部整数编码: 错题 id、epoch 秒、结果 (即掌握程度 1/2)"""
+    cur.execute('''CREATE TABLE IF NOT EXISTS review_log (
+        mistake_id INTEGER NOT NULL,
+        reviewed_at INTEGER NOT NULL,
+        result INTEGER NOT NULL
+    )''')
+    # 旧数据只保留了最后一次复习, 每道错题补一条; last_reviewed 为本地时间
+    cur.execute('''
+        INSERT INTO review_log (mistake_id, reviewed_at, result)
+        SELECT id, CAST(strftime('%s', last_reviewed, 'utc') AS INTEGER), mastery_level
+        FROM mistakes
+        WHERE last_reviewed IS NOT NULL AND mastery_level IN (1, 2)
+        ORDER BY last_reviewed
+    ''')
+
+
+def _m010_incremental_vacuum(cur):
+    """空操作占位: auto_vacuum 改为 INCREMENTAL 不在迁移中进行
+
+    新建的库在打开连接时就已设置 (study_store.CONNECTION_PRAGMAS)。已有数据库
+    要整库 VACUUM 一次才会切换; 为免拖慢启动, 由维护任务在空闲时于后台完成
+    (study_maintenance.enable_incremental_vacuum)。
+    """
+
+
+def _m011_change_log(cur):
+    """多设备同步: 错题的全局 uid, 以及由触发器维护的变更序号与删除墓碑
+
+    change_log 中每个 (表, 键) 只保留最新一条, 每次变更取新的自增序号;
+    删除留下 deleted=1 的墓碑。课程以 [课程, 章节, 资源类型] 的 JSON 数组为键。
+    sync_state.applying 在应用对端变更的事务中设为对端设备 id, 记入 origin,
+    推送时据此跳过从该对端收到的变更。
+    """
+    cur.execute("ALTER TABLE mistakes ADD COLUMN uid TEXT")
+    cur.execute("UPDATE mistakes SET uid = lower(hex(randomblob(16))) WHERE uid IS NULL")
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_mistakes_uid ON mistakes(uid)")
+    cur.execute('''CREATE TABLE IF NOT EXISTS change_log (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        entity TEXT NOT NULL,
+        key TEXT NOT NULL,
+        deleted INTEGER NOT NULL DEFAULT 0,
+        changed_at TEXT NOT NULL,
+        origin TEXT,
+        UNIQUE (entity, key)
+    )''')
+    cur.execute('''CREATE TABLE IF NOT EXISTS sync_state (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        device_id TEXT NOT NULL,
+        applying TEXT
+    )''')
+    cur.execute("INSERT OR IGNORE INTO sync_state (id, device_id) VALUES (1, lower(hex(randomblob(8))))")
+    # 本机与各对端的同步游标: pulled 为对端 change_log 序号, pushed 为本机序号
+    cur.execute('''CREATE TABLE IF NOT EXISTS sync_peers (
+        peer TEXT PRIMARY KEY,
+        pulled INTEGER NOT NULL DEFAULT 0,
+        pushed INTEGER NOT NULL DEFAULT 0,
+        synced_at TEXT
+    )''')
+
+    # 先删后插而不用 INSERT OR REPLACE: 触发器内语句的冲突策略会被外层语句
+    # (如 UPSERT、INSERT OR IGNORE) 的策略覆盖
+    def log(entity, key, deleted):
+        return f'''
+            DELETE FROM change_log WHERE entity = '{entity}' AND key = {key};
+            INSERT INTO change_log (entity, key, deleted, changed_at, origin)
+            VALUES ('{entity}', {key}, {deleted}, strftime('%Y-%m-%dT%H:%M:%fZ', 'now'),
+                    (SELECT applying FROM sync_state));
+        '''
+
+    # 插入时补 uid 与记录变更放在同一个触发器里, 保证记录的是补上之后的 uid;
+    # 补 uid 的 UPDATE 因 OLD.uid 为空不会再触发更新记录
+    cur.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_change_mistake_insert AFTER INSERT ON mistakes BEGIN
+            UPDATE mistakes SET uid = lower(hex(randomblob(16))) WHERE id = NEW.id AND NEW.uid IS NULL;
+            {log('mistakes', '(SELECT uid FROM mistakes WHERE id = NEW.id)', 0)}
+        END
+    ''')
+    cur.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_change_mistake_update AFTER UPDATE ON mistakes
+        WHEN OLD.uid IS NOT NULL BEGIN {log('mistakes', 'NEW.uid', 0)} END
+    ''')
+    cur.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_change_mistake_delete AFTER DELETE ON mistakes
+        BEGIN {log('mistakes', 'OLD.uid', 1)} END
+    ''')
+    course_key = "json_array({0}.course_type, {0}.chapter, {0}.resource_type)"
+    cur.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_change_course_insert AFTER INSERT ON courses
+        BEGIN {log('courses', course_key.format('NEW'), 0)} END
+    ''')
+    cur.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_change_course_update AFTER UPDATE ON courses
+        BEGIN {log('courses', course_key.format('NEW'), 0)} END
+    ''')
+    cur.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_change_course_delete AFTER DELETE ON courses
+        BEGIN {log('courses', course_key.format('OLD'), 1)} END
+    ''')
+
+    # 已有数据全部记一次变更, 首次同步时完整发送
+    cur.execute('''
+        INSERT OR IGNORE INTO change_log (entity, key, changed_at)
+        SELECT 'courses', json_array(course_type, chapter, resource_type),
+               strftime('%Y-%m-%dT%H:%M:%fZ', 'now')
+        FROM courses ORDER BY id
+    ''')
+    cur.execute('''
+        INSERT OR IGNORE INTO change_log (entity, key, changed_at)
+        SELECT 'mistakes', uid, strftime('%Y-%m-%dT%H:%M:%fZ', 'now')
+        FROM mistakes ORDER BY id
+    ''')
+
+
+def _score_key(row):
+    """score_rollup 的主键表达式; 最近活动日取创建与最后复习中较晚的日期"""
+    return (f"IFNULL({row}.course_type, ''), IFNULL({row}.chapter, ''), "
+            f"IFNULL({row}.error_type, ''), IFNULL({row}.mastery_level, 0), "
+            f"substr(MAX(IFNULL({row}.created_at, ''), IFNULL({row}.last_reviewed, '')), 1, 10)")
+
+
+def rebuild_score_rollup(cur):
+    """从 mistakes 全量重算 score_rollup, 并把全部章节标脏"""
+    cur.execute("DELETE FROM score_rollup")
+    cur.execute(f'''
+        INSERT INTO score_rollup
+        SELECT {_score_key('m')}, COUNT(*) FROM mistakes m GROUP BY 1, 2, 3, 4, 5
+    ''')
+    cur.execute("UPDATE chapter_scores SET dirty = 1")
+    cur.execute('''
+        INSERT OR IGNORE INTO chapter_scores (course_type, chapter)
+        SELECT DISTINCT course_type, chapter FROM score_rollup
+    ''')
+
+
+def _m012_chapter_scores(cur):
+    """章节薄弱度评分: 按章节聚合的 score_rollup 与评分缓存表 chapter_scores
+
+    score_rollup 按 课程×章节×错误类型×掌握程度×最近活动日 计数, 与 rollup_daily
+    一样由触发器增量维护, 重算一个章节只读它的聚合行, 与错题数无关。
+    错题或课程完成状态变化时触发器把章节标脏; 分数组成见 study_scoring,
+    revision 在每次重算时递增, 各连接的内存缓存据此只载入新算出的行。
+    """
+    cur.execute('''CREATE TABLE IF NOT EXISTS score_rollup (
+        course_type TEXT NOT NULL,
+        chapter TEXT NOT NULL,
+        error_type TEXT NOT NULL,
+        mastery_level INTEGER NOT NULL,
+        day TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (course_type, chapter, error_type, mastery_level, day)
+    ) WITHOUT ROWID''')
+    cur.execute('''CREATE TABLE IF NOT EXISTS chapter_scores (
+        course_type TEXT NOT NULL,
+        chapter TEXT NOT NULL,
+        dirty INTEGER NOT NULL DEFAULT 1,
+        revision INTEGER NOT NULL DEFAULT 0,
+        mistakes INTEGER NOT NULL DEFAULT 0,
+        unmastered INTEGER NOT NULL DEFAULT 0,
+        gap REAL NOT NULL DEFAULT 0,
+        recency REAL NOT NULL DEFAULT 0,
+        completion REAL NOT NULL DEFAULT 1,
+        top_error_type TEXT,
+        computed_at REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (course_type, chapter)
+    ) WITHOUT ROWID''')
+
+    add = f'''
+        INSERT INTO score_rollup VALUES ({_score_key('NEW')}, 1)
+        ON CONFLICT DO UPDATE SET count = count + 1;
+        INSERT INTO chapter_scores (course_type, chapter)
+        VALUES (IFNULL(NEW.course_type, ''), IFNULL(NEW.chapter, ''))
+        ON CONFLICT DO UPDATE SET dirty = 1;
+    '''
+    remove = f'''
+        UPDATE score_rollup SET count = count - 1
+        WHERE (course_type, chapter, error_type, mastery_level, day) = ({_score_key('OLD')});
+        UPDATE chapter_scores SET dirty = 1
+        WHERE course_type = IFNULL(OLD.course_type, '') AND chapter = IFNULL(OLD.chapter, '');
+    '''
+    cur.execute(f"CREATE TRIGGER IF NOT EXISTS trg_score_insert AFTER INSERT ON mistakes BEGIN {add} END")
+    cur.execute(f"CREATE TRIGGER IF NOT EXISTS trg_score_delete AFTER DELETE ON mistakes BEGIN {remove} END")
+    cur.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_score_update
+        AFTER UPDATE OF course_type, chapter, error_type, mastery_level, created_at, last_reviewed ON mistakes
+        BEGIN {remove} {add} END
+    ''')
+    cur.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_score_course_update
+        AFTER UPDATE OF completed ON courses BEGIN
+            UPDATE chapter_scores SET dirty = 1
+            WHERE course_type = IFNULL(NEW.course_type, '') AND chapter = IFNULL(NEW.chapter, '');
+        END
+    ''')
+    # 已有章节全部标脏, 第一次排序时计算
+    rebuild_score_rollup(cur)
+
+
+def _m013_review_chapters(cur):
+    """复习日志记下复习时错题所属章节的整数键, 按时间建覆盖索引
+
+    章节分析只需读时间窗口内的日志与很小的 review_chapters 表, 不再扫描
+    mistakes。chapter_id 由触发器在插入日志时填写, 已有日志按当前章节回填。
+    """
+    cur.execute('''CREATE TABLE IF NOT EXISTS review_chapters (
+        id INTEGER PRIMARY KEY,
+        course_type TEXT NOT NULL,
+        chapter TEXT NOT NULL,
+        UNIQUE (course_type, chapter)
+    )''')
+    cur.execute("ALTER TABLE review_log ADD COLUMN chapter_id INTEGER")
+    cur.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_review_log_chapter
+        AFTER INSERT ON review_log WHEN NEW.chapter_id IS NULL BEGIN
+            INSERT OR IGNORE INTO review_chapters (course_type, chapter)
+            SELECT IFNULL(course_type, ''), IFNULL(chapter, '') FROM mistakes WHERE id = NEW.mistake_id;
+            UPDATE review_log SET chapter_id = (
+                SELECT c.id FROM mistakes m JOIN review_chapters c
+                ON c.course_type = IFNULL(m.course_type, '') AND c.chapter = IFNULL(m.chapter, '')
+                WHERE m.id = NEW.mistake_id
+            ) WHERE rowid = NEW.rowid;
+        END
+    ''')
+    cur.execute('''
+        INSERT OR IGNORE INTO review_chapters (course_type, chapter)
+        SELECT DISTINCT IFNULL(course_type, ''), IFNULL(chapter, '') FROM mistakes
+        WHERE id IN (SELECT mistake_id FROM review_log)
+    ''')
+    cur.execute('''
+        UPDATE review_log SET chapter_id = (
+            SELECT c.id FROM mistakes m JOIN review_chapters c
+            ON c.course_type = IFNULL(m.course_type, '') AND c.chapter = IFNULL(m.chapter, '')
+            WHERE m.id = review_log.mistake_id
+        )
+    ''')
+    cur.execute('''
+        CREATE INDEX IF NOT EXISTS idx_review_log_time
+        ON review_log(reviewed_at, mistake_id, result, chapter_id)
+    ''')
+
+
+MIGRATIONS = [
+    _m001_base_schema,
+    _m002_unique_courses,
+    _m003_image_store,
+    _m004_thumbnails,
+    _m005_recent_index,
+    _m006_spaced_repetition,
+    _m007_rollups,
+    _m008_search,
+    _m009_review_log,
+    _m010_incremental_vacuum,
+    _m011_change_log,
+    _m012_chapter_scores,
+    _m013_review_chapters,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def schema_version(conn):
+    """当前数据库的 user_version"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """执行所有未应用的迁移, 返回迁移后的版本号"""
+    version = schema_version(conn)
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(f"数据库版本 {version} 高于程序支持的 {SCHEMA_VERSION}, 请升级程序")
+    for number in range(version + 1, SCHEMA_VERSION + 1):
+        cur = conn.cursor()
+        migration = MIGRATIONS[number - 1]
+        cur.execute("BEGIN")
+        try:
+            migration(cur)
+            cur.execute(f"PRAGMA user_version = {number}")
+            cur.execute("COMMIT")
+        except Exception:
+            cur.execute("ROLLBACK")
+            raise
+    return SCHEMA_VERSION
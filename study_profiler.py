@@ -0,0 +1,209 @@
+"""可选的性能剖析: SQL 语句追踪、热点处理函数计时与 Chrome trace 导出
+
+默认不安装任何钩子; 程序以 --profile 启动 (或设置环境变量 STUDYPRO_PROFILE)
+时才用 set_trace_callback 记录每条 SQL, 并用 wrap() 给处理函数加计时。
+统计在"性能"调试页实时显示, 事件可导出为 chrome://tracing / Perfetto
+能打开的 JSON, 其中附带各处理函数的汇总, 便于对比两个版本:
+
+    python study_profiler.py compare old_trace.json new_trace.json
+"""
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# 每个处理函数保留最近多少次耗时用于计算 p95
+RECENT_SAMPLES = 200
+# 内存中最多保留的 trace 事件数, 超出后丢弃最早的
+MAX_EVENTS = 200000
+SQL_TEXT_LIMIT = 200
+
+
+class SpanStats:
+    """单个处理函数的累计耗时统计 (秒)"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.sql = 0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def add(self, duration, sql_count):
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+        self.sql += sql_count
+        self.recent.append(duration)
+
+    def p95(self):
+        ordered = sorted(self.recent)
+        return ordered[int(0.95 * (len(ordered) - 1))] if ordered else 0.0
+
+
+class Profiler:
+    """收集计时区间与 SQL 语句; 可在多个线程中同时使用"""
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.events = deque(maxlen=MAX_EVENTS)
+        self.stats = {}
+        self.sql_total = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._pid = os.getpid()
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _ts(self, at):
+        return round((at - self.origin) * 1e6, 1)
+
+    @contextmanager
+    def span(self, name, cat="ui"):
+        """计时一个区间; 区间内执行的 SQL 条数计入该区间 (含嵌套区间)"""
+        frame = [name, 0]
+        stack = self._stack()
+        stack.append(frame)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            stack.pop()
+            if stack:
+                stack[-1][1] += frame[1]
+            self._record(name, cat, start, end, frame[1])
+
+    def _record(self, name, cat, start, end, sql_count):
+        event = {
+            "name": name, "cat": cat, "ph": "X",
+            "ts": self._ts(start), "dur": round((end - start) * 1e6, 1),
+            "pid": self._pid, "tid": threading.get_ident(),
+            "args": {"sql": sql_count},
+        }
+        with self._lock:
+            self.events.append(event)
+            stats = self.stats.get(name)
+            if stats is None:
+                stats = self.stats[name] = SpanStats()
+            stats.add(end - start, sql_count)
+
+    def timed(self, func, name, cat="ui"):
+        """返回带计时的 func"""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with self.span(name, cat):
+                return func(*args, **kwargs)
+        return wrapper
+
+    def wrap(self, owner, attr, cat="ui", name=None):
+        """把 owner (实例、类或模块) 上的 attr 替换为计时版本
+
+        界面按钮在创建时就绑定了方法, 所以实例方法要在构建界面之前包装。
+        """
+        name = name or attr
+        raw = inspect.getattr_static(owner, attr)
+        if isinstance(raw, staticmethod):
+            setattr(owner, attr, staticmethod(self.timed(raw.__func__, name, cat)))
+        else:
+            setattr(owner, attr, self.timed(getattr(owner, attr), name, cat))
+
+    def attach(self, conn):
+        """用 set_trace_callback 记录该连接执行的每条 SQL"""
+        conn.set_trace_callback(self._trace_sql)
+
+    def _trace_sql(self, statement):
+        stack = self._stack()
+        if stack:
+            stack[-1][1] += 1
+        event = {
+            "name": "sql", "cat": "sql", "ph": "i", "s": "t",
+            "ts": self._ts(time.perf_counter()),
+            "pid": self._pid, "tid": threading.get_ident(),
+            "args": {"sql": statement[:SQL_TEXT_LIMIT]},
+        }
+        with self._lock:
+            self.events.append(event)
+            self.sql_total += 1
+
+    def summary(self):
+        """各处理函数的 (名称, 次数, 平均 ms, p95 ms, 最大 ms, 每次 SQL 条数), 按总耗时倒序"""
+        with self._lock:
+            items = list(self.stats.items())
+            rows = [
+                (name, s.count, s.total / s.count * 1000, s.p95() * 1000,
+                 s.max * 1000, s.sql / s.count)
+                for name, s in items
+            ]
+            totals = {name: s.total for name, s in items}
+        rows.sort(key=lambda row: totals[row[0]], reverse=True)
+        return rows
+
+    def clear(self):
+        """丢弃已收集的事件与统计"""
+        with self._lock:
+            self.events.clear()
+            self.stats.clear()
+            self.sql_total = 0
+
+    def dump(self, path):
+        """导出 Chrome trace JSON, otherData.summary 为各处理函数的汇总"""
+        with self._lock:
+            events = list(self.events)
+        summary = {
+            name: {"count": count, "mean_ms": round(mean, 3), "p95_ms": round(p95, 3),
+                   "max_ms": round(worst, 3), "sql_per_call": round(sql, 2)}
+            for name, count, mean, p95, worst, sql in self.summary()
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "traceEvents": events,
+                "displayTimeUnit": "ms",
+                "otherData": {"summary": summary, "sql_total": self.sql_total},
+            }, f, ensure_ascii=False)
+        return path
+
+
+def compare(old_path, new_path):
+    """对比两次导出的汇总, 返回 (名称, 旧平均, 新平均, 旧 p95, 新 p95, 平均变化 %)"""
+    def load(path):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f).get("otherData", {}).get("summary", {})
+
+    old, new = load(old_path), load(new_path)
+    rows = []
+    for name in sorted(set(old) | set(new)):
+        a, b = old.get(name, {}), new.get(name, {})
+        change = None
+        if a.get("mean_ms") and "mean_ms" in b:
+            change = (b["mean_ms"] - a["mean_ms"]) / a["mean_ms"] * 100
+        rows.append((name, a.get("mean_ms"), b.get("mean_ms"),
+                     a.get("p95_ms"), b.get("p95_ms"), change))
+    return rows
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="性能 trace 工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_compare = sub.add_parser("compare", help="对比两次导出的 trace")
+    p_compare.add_argument("old")
+    p_compare.add_argument("new")
+    args = parser.parse_args()
+
+    def fmt(value):
+        return f"{value:10.2f}" if value is not None else f"{'-':>10}"
+
+    print(f"{'handler':<24}{'old mean':>10}{'new mean':>10}{'old p95':>10}{'new p95':>10}{'change':>10}")
+    for name, old_mean, new_mean, old_p95, new_p95, change in compare(args.old, args.new):
+        verdict = f"{change:+9.1f}%" if change is not None else f"{'-':>10}"
+        print(f"{name:<24}{fmt(old_mean)}{fmt(new_mean)}{fmt(old_p95)}{fmt(new_p95)}{verdict}")
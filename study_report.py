@@ -0,0 +1,190 @@
+"""离线学习报表: 按 课程 × 周期 渲染错题分析图, 并拆分到各章节
+
+数据一次性从汇总表读出 (每个周期一条查询), 之后每张图是一个只含普通
+数据的任务, 分给进程池中的各进程用无界面的 Agg 后端渲染, 互不共享
+数据库连接与 matplotlib 状态。
+
+    python study_report.py reports/
+    python study_report.py reports/ --format png pdf --jobs 8
+    python study_report.py reports/ --period 最近一周 --no-chapters
+"""
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from study_store import PERIOD_OFFSETS
+
+OVERVIEW_NAME = "总览"
+REPORT_DPI = 120
+# 每个进程一次领取的任务数, 减少进程间往返
+JOB_CHUNKSIZE = 4
+
+
+def _safe_name(name):
+    """用作文件名: 去掉路径分隔符等非法字符"""
+    return re.sub(r'[\\/:*?"<>|]+', "_", name).strip() or "_"
+
+
+def _setup_worker():
+    """进程初始化: 选 Agg 后端并设置与界面相同的中文字体"""
+    import matplotlib
+    matplotlib.use("Agg")
+    matplotlib.rcParams['font.sans-serif'] = ['Microsoft YaHei', 'SimHei', 'Noto Sans CJK SC', 'DejaVu Sans']
+    matplotlib.rcParams['axes.unicode_minus'] = False
+
+
+def _pie(ax, stats, title):
+    if stats:
+        ax.pie([count for _, count in stats], labels=[label for label, _ in stats], autopct='%1.1f%%')
+    else:
+        ax.text(0.5, 0.5, '暂无数据', ha='center', va='center')
+        ax.set_axis_off()
+    ax.set_title(title)
+
+
+def _stacked_barh(ax, rows, title):
+    """rows 为 (类别, {错误类型: 条数}), 每个类别一根按错误类型堆叠的横条"""
+    ax.set_title(title)
+    if not rows:
+        ax.text(0.5, 0.5, '暂无数据', ha='center', va='center')
+        ax.set_axis_off()
+        return
+    labels = [label for label, _ in rows]
+    error_types = sorted({error_type for _, counts in rows for error_type in counts})
+    left = [0] * len(rows)
+    for error_type in error_types:
+        widths = [counts.get(error_type, 0) for _, counts in rows]
+        ax.barh(labels, widths, left=left, label=error_type)
+        left = [a + b for a, b in zip(left, widths)]
+    ax.invert_yaxis()
+    ax.set_xlabel('错题数')
+    ax.legend(fontsize='small')
+
+
+def render_job(job):
+    """渲染一张图并按各格式保存, 返回写出的文件路径; 在工作进程中执行"""
+    from matplotlib.figure import Figure
+
+    kind, title, data, base, formats = job
+    if kind == "chapter":
+        figure = Figure(figsize=(6, 4.5))
+        _pie(figure.add_subplot(111), data, title)
+    else:
+        figure = Figure(figsize=(12, 5.5))
+        stats, breakdown = data
+        _pie(figure.add_subplot(121), stats, '错题类型分布')
+        _stacked_barh(figure.add_subplot(122), breakdown,
+                      '各课程错题' if kind == "overview" else '各章节错题')
+        figure.suptitle(title)
+    figure.tight_layout()
+    paths = []
+    for fmt in formats:
+        path = f"{base}.{fmt}"
+        figure.savefig(path, dpi=REPORT_DPI)
+        paths.append(path)
+    return paths
+
+
+def _error_stats(counts):
+    return sorted(counts.items(), key=lambda item: -item[1])
+
+
+def build_jobs(store, out_dir, periods=None, formats=("png",), chapters=True):
+    """从汇总表读数据, 生成渲染任务: 每个周期一张总览, 每门课程一张, 可选每个章节一张"""
+    jobs = []
+    for period in periods or list(PERIOD_OFFSETS):
+        # 课程 -> 章节 -> 错误类型 -> 条数
+        tree = {}
+        for course, chapter, error_type, count in store.rollup_rows(period):
+            tree.setdefault(course, {}).setdefault(chapter, {})[error_type] = count
+        period_dir = os.path.join(out_dir, _safe_name(period))
+
+        totals = {}
+        by_course = []
+        for course in sorted(tree):
+            course_counts = {}
+            for counts in tree[course].values():
+                for error_type, count in counts.items():
+                    course_counts[error_type] = course_counts.get(error_type, 0) + count
+                    totals[error_type] = totals.get(error_type, 0) + count
+            by_course.append((course, course_counts))
+        jobs.append(("overview", f"{period} · 全部课程",
+                     (_error_stats(totals), by_course),
+                     os.path.join(period_dir, OVERVIEW_NAME), formats))
+
+        for course, course_counts in by_course:
+            course_dir = os.path.join(period_dir, _safe_name(course))
+            breakdown = sorted(tree[course].items(), key=lambda item: -sum(item[1].values()))
+            jobs.append(("course", f"{period} · {course}",
+                         (_error_stats(course_counts), breakdown),
+                         os.path.join(period_dir, _safe_name(course)), formats))
+            if not chapters:
+                continue
+            for chapter, counts in tree[course].items():
+                jobs.append(("chapter", f"{course} - {chapter} ({period})", _error_stats(counts),
+                             os.path.join(course_dir, _safe_name(chapter)), formats))
+    return jobs
+
+
+def render_report(store, out_dir, periods=None, formats=("png",), chapters=True, jobs=None, progress=None):
+    """渲染全部报表, 返回统计信息; jobs=1 时在本进程中顺序渲染, progress(已完成, 总数)"""
+    start = time.perf_counter()
+    store.flush()
+    tasks = build_jobs(store, out_dir, periods, formats, chapters)
+    for task in tasks:
+        os.makedirs(os.path.dirname(task[3]), exist_ok=True)
+    query_seconds = time.perf_counter() - start
+
+    files = []
+    if jobs == 1:
+        _setup_worker()
+        results = map(render_job, tasks)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(max_workers=jobs, initializer=_setup_worker)
+        results = pool.map(render_job, tasks, chunksize=JOB_CHUNKSIZE)
+    try:
+        for paths in results:
+            files.extend(paths)
+            if progress:
+                progress(len(files) // len(formats), len(tasks))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    return {
+        "figures": len(tasks),
+        "files": len(files),
+        "workers": jobs or os.cpu_count(),
+        "query_seconds": round(query_seconds, 3),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    import sys
+    from study_store import StudyStore, DB_PATH, ARCHIVE_PERIOD
+
+    parser = argparse.ArgumentParser(description="离线渲染学习分析报表")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("out_dir")
+    parser.add_argument("--period", nargs="+", choices=list(PERIOD_OFFSETS) + [ARCHIVE_PERIOD], default=None)
+    parser.add_argument("--format", nargs="+", choices=["png", "pdf", "svg"], default=["png"])
+    parser.add_argument("--jobs", type=int, default=None, help="进程数 (默认 CPU 核数, 1 表示不开进程池)")
+    parser.add_argument("--no-chapters", action="store_true", help="不生成各章节的图")
+    args = parser.parse_args()
+
+    def show_progress(done, total):
+        print(f"\r已渲染 {done}/{total}", end="", file=sys.stderr, flush=True)
+
+    store = StudyStore(args.db)
+    try:
+        result = render_report(store, args.out_dir, args.period, tuple(args.format),
+                               not args.no_chapters, args.jobs, show_progress)
+    finally:
+        store.close()
+    print(file=sys.stderr)
+    print(json.dumps(result, ensure_ascii=False))
@@ -0,0 +1,80 @@
+"""复习日志的向量化分析: 遗忘曲线、各章节保持率与复习量热力图
+
+时间窗口内的 review_log 由 SQLite 打包成一个整数串, 一次解析成 NumPy 数组,
+之后全是数组运算, 不按条目循环; 章节取自日志中的章节键, 不扫描 mistakes。
+依赖 NumPy; 未安装时界面跳过这部分分析。
+"""
+import time
+import numpy as np
+
+DAY = 86400
+HEATMAP_WEEKS = 53
+# 遗忘曲线按距上次复习的天数分桶: [0,1) [1,2) [2,4) ... [365,∞)
+CURVE_BUCKETS = np.array([0, 1, 2, 4, 7, 14, 30, 60, 120, 365])
+# 章节保持率至少需要的复习次数
+MIN_CHAPTER_REVIEWS = 5
+RECALLED = 2
+
+
+def load_review_log(store, since=0):
+    """读取复习日志, 返回按 (错题, 时间) 排序的 (mistake_id, reviewed_at, result, chapter_id) 数组"""
+    log = np.fromstring(store.review_log_packed(since), dtype=np.int64, sep=" ").reshape(-1, 4)
+    order = np.lexsort((log[:, 1], log[:, 0]))
+    log = log[order]
+    return log[:, 0], log[:, 1], log[:, 2], log[:, 3]
+
+
+def forgetting_curve(mistake_ids, reviewed_at, result):
+    """各间隔桶内的 (复习次数, 回忆成功率); 每道错题的首次复习没有间隔, 不计入"""
+    repeat = np.empty(len(mistake_ids), dtype=bool)
+    repeat[:1] = False
+    repeat[1:] = mistake_ids[1:] == mistake_ids[:-1]
+    gap_days = np.diff(reviewed_at, prepend=reviewed_at[:1]) / DAY
+    bucket = np.digitize(gap_days[repeat], CURVE_BUCKETS) - 1
+    counts = np.bincount(bucket, minlength=len(CURVE_BUCKETS))
+    recalled = np.bincount(bucket, weights=result[repeat] == RECALLED, minlength=len(CURVE_BUCKETS))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rate = np.where(counts > 0, recalled / counts, np.nan)
+    return counts, rate
+
+
+def chapter_retention(chapter_ids, result, labels):
+    """各章节的 (章节, 复习次数, 回忆成功率), 按成功率升序; labels 为 {章节键: 章节}"""
+    # 复习时错题已不存在的日志没有章节键 (-1), 跳过
+    found = chapter_ids >= 0
+    if not labels or not found.any():
+        return []
+    code = chapter_ids[found]
+    counts = np.bincount(code)
+    recalled = np.bincount(code, weights=result[found] == RECALLED)
+    keep = np.flatnonzero((counts >= MIN_CHAPTER_REVIEWS) & np.isin(np.arange(len(counts)), list(labels)))
+    rate = recalled[keep] / counts[keep]
+    order = np.argsort(rate, kind="stable")
+    return [(labels[int(keep[i])], int(counts[keep[i]]), float(rate[i])) for i in order]
+
+
+def review_heatmap(reviewed_at, today, offset):
+    """最近 HEATMAP_WEEKS 周每天的复习量, 形状 (7, 周数), 行为周一到周日"""
+    first = today - (today + 3) % 7 - (HEATMAP_WEEKS - 1) * 7
+    day = (reviewed_at + offset) // DAY - first
+    day = day[(day >= 0) & (day < HEATMAP_WEEKS * 7)]
+    return np.bincount(day, minlength=HEATMAP_WEEKS * 7).reshape(HEATMAP_WEEKS, 7).T
+
+
+def retention_report(store, now=None):
+    """最近一年的遗忘曲线、章节保持率与复习量热力图"""
+    now = now or time.time()
+    offset = int(time.localtime(now).tm_gmtoff)
+    # epoch 第 0 天是周四; today 为本地日期的天序号
+    today = int((now + offset) // DAY)
+    since = (today - (today + 3) % 7 - (HEATMAP_WEEKS - 1) * 7) * DAY - offset
+    mistake_ids, reviewed_at, result, chapter_ids = load_review_log(store, since)
+    counts, rate = forgetting_curve(mistake_ids, reviewed_at, result)
+    return {
+        "reviews": int(len(mistake_ids)),
+        "curve_days": CURVE_BUCKETS,
+        "curve_counts": counts,
+        "curve_rate": rate,
+        "chapters": chapter_retention(chapter_ids, result, store.review_chapter_labels()),
+        "heatmap": review_heatmap(reviewed_at, today, offset),
+    }
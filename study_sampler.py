@@ -0,0 +1,137 @@
+"""按 probability 加权随机抽取错题的内存索引"""
+import random
+from array import array
+
+
+class WeightedSampler:
+    """Fenwick (树状数组) 加权抽样器
+
+    每个 key (错题 id) 占一个槽位, 抽取、增删和改权重都是 O(log n)。
+    抽中某个 key 的概率严格等于其权重占总权重的比例。
+    删除留下的空槽位会被后续新增复用。
+    """
+
+    def __init__(self, items=(), seed=None):
+        self.rng = random.Random(seed)
+        self.rebuild(items)
+
+    def reseed(self, seed):
+        """重置随机数种子, 使后续抽取序列可复现"""
+        self.rng.seed(seed)
+
+    def rebuild(self, items):
+        """由 (key, weight) 序列 O(n) 重建"""
+        self._slot = {}
+        self._keys = []
+        self._weights = array('d')
+        self._free = []
+        for key, weight in items:
+            if weight > 0:
+                self._slot[key] = len(self._keys)
+                self._keys.append(key)
+                self._weights.append(weight)
+        n = len(self._weights)
+        tree = array('d', [0.0]) * (n + 1)
+        for i in range(1, n + 1):
+            tree[i] += self._weights[i - 1]
+            parent = i + (i & -i)
+            if parent <= n:
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def __len__(self):
+        return len(self._slot)
+
+    def __contains__(self, key):
+        return key in self._slot
+
+    def weight(self, key):
+        """key 当前的权重, 不存在时为 0"""
+        pos = self._slot.get(key)
+        return 0.0 if pos is None else self._weights[pos]
+
+    def total(self):
+        """全部权重之和"""
+        return self._prefix(len(self._weights))
+
+    def set(self, key, weight):
+        """新增或修改 key 的权重; 权重 <= 0 等同于删除"""
+        if weight <= 0:
+            self.remove(key)
+            return
+        pos = self._slot.get(key)
+        if pos is None:
+            pos = self._alloc(key)
+        delta = weight - self._weights[pos]
+        self._weights[pos] = weight
+        self._add(pos + 1, delta)
+
+    def remove(self, key):
+        """移除 key, 其槽位留待复用"""
+        pos = self._slot.pop(key, None)
+        if pos is None:
+            return
+        self._add(pos + 1, -self._weights[pos])
+        self._weights[pos] = 0.0
+        self._keys[pos] = None
+        self._free.append(pos)
+
+    def draw(self):
+        """按权重抽取一个 key, 为空时返回 None"""
+        if not self._slot:
+            return None
+        n = len(self._weights)
+        for _ in range(4):
+            target = self.rng.random() * self.total()
+            pos = 0
+            step = 1 << (n.bit_length() - 1)
+            # 自顶向下找到前缀和首次超过 target 的位置
+            while step:
+                nxt = pos + step
+                if nxt <= n and self._tree[nxt] <= target:
+                    pos = nxt
+                    target -= self._tree[nxt]
+                step >>= 1
+            # 浮点累计误差可能落到空槽位上, 重抽即可
+            if pos < n and self._weights[pos] > 0:
+                return self._keys[pos]
+        return next(iter(self._slot))
+
+    def draw_distinct(self, k):
+        """不放回地按权重抽取至多 k 个不同的 key, 抽取后权重原样恢复"""
+        drawn = []
+        while len(drawn) < k and self._slot:
+            key = self.draw()
+            drawn.append((key, self.weight(key)))
+            self.remove(key)
+        # 逆序放回, 各 key 取回原来的槽位
+        for key, weight in reversed(drawn):
+            self.set(key, weight)
+        return [key for key, _ in drawn]
+
+    def _alloc(self, key):
+        if self._free:
+            pos = self._free.pop()
+            self._keys[pos] = key
+        else:
+            # 在末尾追加节点: 新节点覆盖 (i - lowbit(i), i] 区间
+            pos = len(self._weights)
+            i = pos + 1
+            self._keys.append(key)
+            self._weights.append(0.0)
+            self._tree.append(self._prefix(i - 1) - self._prefix(i - (i & -i)))
+        self._slot[key] = pos
+        return pos
+
+    def _add(self, i, delta):
+        n = len(self._weights)
+        while i <= n:
+            self._tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, i):
+        total = 0.0
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
@@ -0,0 +1,41 @@
+"""SM-2 间隔重复调度"""
+from datetime import datetime, timedelta
+
+# 复习按钮 (掌握程度) -> SM-2 回忆质量 (0-5, <3 视为遗忘)
+REVIEW_QUALITY = {
+    2: 4,   # 完全掌握
+    1: 2,   # 仍需复习
+}
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+
+
+def sm2(repetitions, interval_days, ease, quality):
+    """按 SM-2 计算下一次的 (连续答对次数, 间隔天数, 难度系数)"""
+    ease = max(MIN_EASE, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    if quality < 3:
+        return 0, 1, ease
+    repetitions += 1
+    if repetitions == 1:
+        interval_days = 1
+    elif repetitions == 2:
+        interval_days = 6
+    else:
+        interval_days = round(interval_days * ease)
+    return repetitions, interval_days, ease
+
+
+def schedule(repetitions, interval_days, ease, mastery_level, now=None):
+    """处理一次复习结果, 返回 (连续答对次数, 间隔天数, 难度系数, 下次到期时间)"""
+    now = now or datetime.now()
+    quality = REVIEW_QUALITY.get(mastery_level, 2)
+    repetitions, interval_days, ease = sm2(repetitions or 0, interval_days or 0,
+                                           ease or DEFAULT_EASE, quality)
+    next_due = now + timedelta(days=interval_days)
+    return repetitions, interval_days, ease, next_due.isoformat()
+
+
+def end_of_today(now=None):
+    """今天结束时刻的 ISO 字符串, 用于统计今日待复习数"""
+    now = now or datetime.now()
+    return now.replace(hour=23, minute=59, second=59, microsecond=999999).isoformat()
@@ -0,0 +1,88 @@
+"""章节薄弱度评分: 综合错题数、近期程度、掌握程度、错误类型与课程完成度
+
+分数的组成部分按章节存在 chapter_scores 表 (迁移 12) 并缓存在内存中;
+错题与课程的增删改由触发器把受影响的章节标脏, 排序前只重算脏章节,
+重算读取触发器维护的 score_rollup 聚合行, 代价与错题数无关。
+近期程度按指数衰减记录, 到排序时再乘以自计算以来的衰减因子, 因此
+数据不变时无需重算。
+"""
+import math
+import time
+from datetime import date
+
+# 近期程度的衰减时间常数 (天)
+RECENCY_DAYS = 14
+RECENCY_WEIGHT = 1.0
+# 课程资源未完成的章节加权: 分数乘以 1 + INCOMPLETE_WEIGHT * 未完成比例
+INCOMPLETE_WEIGHT = 0.5
+# 概念与方法错误比粗心类错误更能说明章节薄弱
+ERROR_TYPE_WEIGHTS = {"概念错误": 1.0, "方法错误": 0.8, "计算错误": 0.5, "审题错误": 0.4}
+DEFAULT_ERROR_WEIGHT = 0.6
+DAY_SECONDS = 86400
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+SCORE_COLUMNS = "mistakes, unmastered, gap, recency, completion, top_error_type, computed_at"
+
+
+def compute_chapter(cur, course_type, chapter, now):
+    """从 score_rollup 与 courses 计算一个章节的分数组成, 返回 SCORE_COLUMNS 顺序的元组"""
+    rows = cur.execute('''
+        SELECT error_type, mastery_level, day, count FROM score_rollup
+        WHERE course_type = ? AND chapter = ? AND count > 0
+    ''', (course_type, chapter)).fetchall()
+    # 活动日为本地日期, 与 now 换算到同一时区的日序号
+    today = (now + time.localtime(now).tm_gmtoff) / DAY_SECONDS + EPOCH_ORDINAL
+    mistakes = unmastered = 0
+    gap = recency = 0.0
+    by_type = {}
+    for error_type, mastery, day, count in rows:
+        mistakes += count
+        if mastery >= 2:
+            continue
+        unmastered += count
+        gap += count * ERROR_TYPE_WEIGHTS.get(error_type, DEFAULT_ERROR_WEIGHT) * (2 - mastery) / 2
+        try:
+            age = today - date.fromisoformat(day).toordinal()
+        except ValueError:
+            age = None
+        if age is not None:
+            recency += count * math.exp(-max(0.0, age) / RECENCY_DAYS)
+        by_type[error_type] = by_type.get(error_type, 0) + count
+    completion = cur.execute('''
+        SELECT AVG(completed) FROM courses WHERE course_type = ? AND chapter = ?
+    ''', (course_type, chapter)).fetchone()[0]
+    top_error_type = max(by_type, key=by_type.get) if by_type else None
+    return (mistakes, unmastered, gap, recency,
+            1.0 if completion is None else completion, top_error_type, now)
+
+
+def score(components, now):
+    """由分数组成计算 now 时刻的薄弱度"""
+    mistakes, unmastered, gap, recency, completion, top_error_type, computed_at = components
+    decay = math.exp(-max(0.0, now - computed_at) / (RECENCY_DAYS * DAY_SECONDS))
+    return (gap + RECENCY_WEIGHT * recency * decay) * (1 + INCOMPLETE_WEIGHT * (1 - completion))
+
+
+class ChapterScores:
+    """chapter_scores 表的内存副本, revision 为已载入的最大修订号"""
+
+    def __init__(self):
+        self.components = {}
+        self.revision = 0
+
+    def load(self, rows):
+        """载入 (课程, 章节, 修订号, *SCORE_COLUMNS) 行"""
+        for course_type, chapter, revision, *components in rows:
+            self.components[(course_type, chapter)] = tuple(components)
+            self.revision = max(self.revision, revision)
+
+    def ranked(self, limit=3, now=None):
+        """薄弱度最高的章节: (课程 - 章节, 分数, 错题数, 未掌握数, 主要错误类型)"""
+        now = time.time() if now is None else now
+        ranked = []
+        for (course_type, chapter), components in self.components.items():
+            if components[1]:
+                ranked.append((f"{course_type} - {chapter}", score(components, now),
+                               components[0], components[1], components[5]))
+        ranked.sort(key=lambda item: item[1], reverse=True)
+        return ranked[:limit]
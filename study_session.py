@@ -0,0 +1,63 @@
+"""连续复习: 一轮复习的卡片队列、后台预取与结果暂存
+
+一轮开始时就选定全部卡片; 当前卡片之后的 PREFETCH_DEPTH 张由后台线程预取
+题目与解码好的图片, 翻到时直接显示。结果先暂存在内存, 一轮结束时在一个
+事务中提交 (StudyStore.record_reviews), 复习过程中不占用数据库写锁。
+"""
+from collections import deque
+from datetime import datetime
+from itertools import islice
+
+# 一轮最多复习的卡片数与预取深度
+REVIEW_SESSION_SIZE = 100
+PREFETCH_DEPTH = 5
+
+
+class ReviewSession:
+    """一轮复习的状态; 不涉及 Tk 与数据库, 由界面驱动"""
+
+    def __init__(self, ids, prefetch_depth=PREFETCH_DEPTH):
+        self.pending = deque(ids)
+        self.total = len(self.pending)
+        self.prefetch_depth = prefetch_depth
+        self.cards = {}
+        self.requested = set()
+        self.results = []
+        self.current = None
+        self.closed = False
+        # 预取失败而跳过的卡片数
+        self.failed = 0
+
+    def to_prefetch(self):
+        """接下来 prefetch_depth 张中尚未请求预取的 id, 并标记为已请求"""
+        ids = [i for i in islice(self.pending, self.prefetch_depth) if i not in self.requested]
+        self.requested.update(ids)
+        return ids
+
+    def loaded(self, mistake_id, card):
+        """保存预取完成的卡片"""
+        self.cards[mistake_id] = card
+
+    def load_failed(self, mistake_id):
+        """预取失败: 计数并存为空卡片, 翻到时与已删除的错题一样跳过"""
+        self.failed += 1
+        self.cards[mistake_id] = (None, None)
+
+    def card(self, mistake_id):
+        """已预取的卡片, 尚未就绪时返回 None"""
+        return self.cards.get(mistake_id)
+
+    def advance(self):
+        """翻到下一张, 返回其 id; 没有更多卡片时返回 None"""
+        if self.current is not None:
+            self.cards.pop(self.current, None)
+        self.current = self.pending.popleft() if self.pending else None
+        return self.current
+
+    def record(self, mastery_level):
+        """暂存当前卡片的复习结果"""
+        self.results.append((self.current, mastery_level, datetime.now()))
+
+    def position(self):
+        """当前是第几张 (从 1 开始)"""
+        return self.total - len(self.pending)
@@ -0,0 +1,707 @@
+import os
+import sqlite3
+import time
+import appdirs
+from datetime import datetime
+from study_migrations import (migrate, image_hash, rebuild_rollups, rebuild_score_rollup,
+                              register_functions, sync_tags, fts_text)
+from study_sampler import WeightedSampler
+from study_scoring import ChapterScores, SCORE_COLUMNS, compute_chapter
+from study_scheduler import schedule, end_of_today
+from study_archive import shard_paths
+
+# 数据存储路径优化
+DATA_DIR = appdirs.user_data_dir("StudyMasterPro", "StudyMaster")
+DB_PATH = os.path.join(DATA_DIR, "study_data_v5.db")
+os.makedirs(DATA_DIR, exist_ok=True)
+
+# 课程目录: 课程类型 -> [(章节, 排序)]
+COURSE_CATALOG = {
+    "物化": [
+        ("热力学第一定律", 1),
+        ("热力学第二定律", 2),
+        ("多组分系统热力学", 3),
+        ("化学平衡", 4),
+        ("相平衡", 5),
+        ("化学动力学", 6),
+        ("电化学", 7),
+        ("界面现象", 8),
+        ("胶体化学", 9)
+    ],
+    "电工": [
+        ("电路的基本概念与基本定律", 1),
+        ("电路的基本定律和分析方法", 2),
+        ("正弦交流电路", 3),
+        ("三相交流电路", 4),
+        ("电路的暂态分析", 5),
+        ("磁路与铁心线圈电路", 6),
+        ("异步电动机", 7),
+        ("继电接触控制系统", 8),
+        ("半导体器件", 9),
+        ("三极管和基本放大电路", 10),
+        ("集成运放电路", 11),
+        ("电子电路中的反馈", 12),
+        ("直流稳压电源", 13)
+    ]
+}
+RESOURCE_TYPES = ["ppt", "作业"]
+ERROR_TYPES = ["概念错误", "计算错误", "审题错误", "方法错误"]
+
+# 分析周期 -> date('now', ...) 的偏移; None 表示全部数据
+PERIOD_OFFSETS = {
+    "最近一周": "-7 days",
+    "最近一月": "-1 month",
+    "全部数据": None
+}
+# 包含已归档学期分片的分析周期
+ARCHIVE_PERIOD = "含归档学期"
+
+# 错题详情所用的列, 不含图片数据; 第 4 列是图片摘要
+MISTAKE_COLUMNS = ("id, course_type, chapter, question, image_hash, error_type, "
+                   "tags, mastery_level, probability, created_at, last_reviewed")
+
+# 错题列表行: 6 个显示列 + 排序键
+MISTAKE_ROW_COLUMNS = '''
+    id,
+    course_type,
+    chapter,
+    error_type,
+    CASE mastery_level
+        WHEN 2 THEN '已掌握'
+        WHEN 1 THEN '需复习'
+        ELSE '未学习' END,
+    strftime('%Y-%m-%d %H:%M', created_at),
+    IFNULL(last_reviewed, '')
+'''
+MISTAKE_PAGE_SIZE = 200
+
+# 连接参数: WAL 下读写互不阻塞, synchronous=NORMAL 只在检查点时 fsync
+CONNECTION_PRAGMAS = (
+    # 只对尚未初始化的新库直接生效, 须在切换 WAL 之前; 已有的库要 VACUUM 一次 (迁移 10)
+    "PRAGMA auto_vacuum=INCREMENTAL",
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",      # 16 MB 页缓存
+    "PRAGMA mmap_size=268435456",    # 256 MB 内存映射读
+    "PRAGMA temp_store=MEMORY",
+)
+STATEMENT_CACHE_SIZE = 256
+# 等待其他连接释放写锁的最长时间 (秒)
+BUSY_TIMEOUT = 10
+# 写后延迟模式下累计多少次复习结果即立即提交
+WRITE_BEHIND_MAX_PENDING = 50
+
+
+def connect(db_path):
+    """按性能配置打开连接"""
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT, cached_statements=STATEMENT_CACHE_SIZE)
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    register_functions(conn)
+    return conn
+
+
+def fts_query(text):
+    """把搜索框输入转成 FTS5 查询: 空白分隔的每段作为短语, 各段之间为 AND"""
+    phrases = []
+    for term in text.split():
+        tokens = fts_text(term).split()
+        if tokens:
+            phrases.append('"' + ' '.join(tokens).replace('"', '""') + '"')
+    return ' AND '.join(phrases)
+
+
+class StudyStore:
+    """与界面无关的数据访问层
+
+    write_behind=True 时, record_review 不立即提交, 复习结果累积在同一个
+    未提交事务里, 由 flush() (定时器或关闭时) 一次提交。崩溃语义:
+      - 进程崩溃或断电时, 尚未 flush 的复习结果整体丢失, 数据库保持在上次
+        提交后的一致状态, 不会出现半条记录;
+      - 已提交的数据在 WAL + synchronous=NORMAL 下不会因进程崩溃丢失,
+        断电时可能回退最近一次检查点之后的事务, 但不会损坏数据库;
+      - 其他写操作 (新增、删除、课程状态) 始终立即提交, 并顺带提交积压的复习结果。
+    写后延迟期间, 本连接能读到未提交的结果, 其他连接 (后台线程) 读到的是提交前的快照。
+    积压期间本连接一直持有写锁, 其他连接的写入 (如后台线程的 refresh_scores) 要等到
+    flush 之后, 至多等 BUSY_TIMEOUT 秒; 后台线程一次只执行一个任务, 排在后面的读取
+    也随之推迟。因此要在后台写入之前先 flush, 关闭时先 flush 再停后台线程;
+    缩略图可以随时重新生成, save_thumbnail 遇到写锁被占用时直接放弃, 不等待。
+    """
+
+    def __init__(self, db_path=DB_PATH, seed=None, write_behind=False):
+        self.db_path = db_path
+        self.conn = connect(db_path)
+        self.cursor = self.conn.cursor()
+        self.write_behind = write_behind
+        self.pending_writes = 0
+        # 随机复习的加权抽样器, 首次抽取时才从数据库构建
+        self.review_seed = seed
+        self.sampler = None
+        # 章节薄弱度的内存缓存, 首次排序时载入
+        self.scores = None
+        # 已 ATTACH 的学期分片: 路径 -> schema 别名
+        self.attached = {}
+        self.setup_schema()
+
+    def setup_schema(self):
+        """建表并执行未应用的迁移"""
+        migrate(self.conn)
+
+    def commit(self):
+        """提交当前事务 (包括积压的写后延迟结果)"""
+        self.conn.commit()
+        self.pending_writes = 0
+
+    def flush(self):
+        """提交写后延迟积压的结果, 返回本次提交的条数"""
+        pending = self.pending_writes
+        if self.conn.in_transaction:
+            self.commit()
+        return pending
+
+    def close(self):
+        """提交积压的写入并关闭数据库连接"""
+        self.flush()
+        # 先关游标: 未释放的语句会让 close 变成延迟关闭, WAL 文件留在磁盘上
+        self.cursor.close()
+        self.conn.close()
+
+    # ---- 课程 ----
+
+    def seed_courses(self, catalog=COURSE_CATALOG):
+        """写入课程目录, 目录未变化时不产生任何写入; 返回新增或调整的行数"""
+        self.cursor.execute('''
+            SELECT course_type, chapter, resource_type, sort_order FROM courses
+        ''')
+        existing = {row[:3]: row[3] for row in self.cursor.fetchall()}
+        changes = [
+            (course_type, chapter, res, order)
+            for course_type, chapters in catalog.items()
+            for chapter, order in chapters
+            for res in RESOURCE_TYPES
+            if existing.get((course_type, chapter, res)) != order
+        ]
+        if not changes:
+            return 0
+        with self.conn:
+            self.cursor.executemany('''
+                INSERT INTO courses
+                (course_type, chapter, resource_type, sort_order)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(course_type, chapter, resource_type)
+                DO UPDATE SET sort_order=excluded.sort_order
+            ''', changes)
+        return len(changes)
+
+    def list_courses(self):
+        """课程树的全部资源行, 按目录顺序 (课程、章节、资源) 排列
+
+        返回 (id, 课程, 章节, 资源类型, 是否完成, 最后更新时间)。
+        课程按其最早写入的行排序, 与 COURSE_CATALOG 中的顺序一致。
+        """
+        self.cursor.execute('''
+            SELECT id, course_type, chapter, resource_type, completed, last_updated
+            FROM courses
+            ORDER BY MIN(id) OVER (PARTITION BY course_type), sort_order, chapter, id
+        ''')
+        return self.cursor.fetchall()
+
+    def set_course_status(self, course_id, completed):
+        """按主键更新课程资源的完成状态, 返回写入的更新时间"""
+        now = datetime.now().isoformat()
+        self.cursor.execute('''
+            UPDATE courses
+            SET completed=?, last_updated=?
+            WHERE id=?
+        ''', (1 if completed else 0, now, course_id))
+        self.commit()
+        return now
+
+    def get_chapters(self, course):
+        """从数据库获取章节数据"""
+        self.cursor.execute('''
+            SELECT DISTINCT chapter
+            FROM courses
+            WHERE course_type=?
+            ORDER BY sort_order
+        ''', (course,))
+        return [row[0] for row in self.cursor.fetchall()]
+
+    # ---- 错题 ----
+
+    def add_mistake(self, course_type, chapter, question, image, error_type, tags):
+        """新增错题, 返回新记录 id"""
+        digest = self.put_image(image) if image else None
+        now = datetime.now().isoformat()
+        self.cursor.execute('''
+            INSERT INTO mistakes (
+                course_type,
+                chapter,
+                question,
+                image_hash,
+                error_type,
+                tags,
+                created_at,
+                next_due
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (course_type, chapter, question, digest, error_type, tags, now, now))
+        mistake_id = self.cursor.lastrowid
+        sync_tags(self.cursor, mistake_id, tags)
+        self.commit()
+        if self.sampler is not None:
+            self.sampler.set(mistake_id, 1.0)
+        return mistake_id
+
+    def delete_mistake(self, mistake_id):
+        """删除错题记录, 图片不再被引用时一并删除"""
+        self.cursor.execute("SELECT image_hash FROM mistakes WHERE id=?", (mistake_id,))
+        row = self.cursor.fetchone()
+        self.cursor.execute("DELETE FROM mistakes WHERE id=?", (mistake_id,))
+        if row and row[0]:
+            self.cursor.execute('''
+                DELETE FROM images
+                WHERE hash=? AND NOT EXISTS (SELECT 1 FROM mistakes WHERE image_hash=?)
+            ''', (row[0], row[0]))
+            if self.cursor.rowcount:
+                self.cursor.execute("DELETE FROM thumbnails WHERE hash=?", (row[0],))
+        self.commit()
+        if self.sampler is not None:
+            self.sampler.remove(int(mistake_id))
+
+    def list_mistakes(self, after=None, limit=MISTAKE_PAGE_SIZE):
+        """错题列表的一页, 按最近复习倒序
+
+        每行末尾附带排序键, (row[6], row[0]) 可作为下一页的 after 游标。
+        """
+        where = ""
+        params = []
+        if after is not None:
+            # 拆开写而不用行值比较, 这样 SQLite 才会在索引上定位而不是从头扫描
+            where = '''WHERE IFNULL(last_reviewed, '') <= ?
+                       AND (IFNULL(last_reviewed, '') < ? OR id < ?)'''
+            params.extend([after[0], after[0], after[1]])
+        params.append(limit)
+        self.cursor.execute(f'''
+            SELECT {MISTAKE_ROW_COLUMNS}
+            FROM mistakes
+            {where}
+            ORDER BY IFNULL(last_reviewed, '') DESC, id DESC
+            LIMIT ?
+        ''', params)
+        return self.cursor.fetchall()
+
+    def search_mistakes(self, text="", course_type=None, chapter=None, error_type=None,
+                        tag=None, limit=500):
+        """全文检索并按课程/章节/错误类型/标签过滤, 行格式同 list_mistakes
+
+        有检索词时按录入先后倒序 (新在前) 流式取前 limit 条; 按 bm25 相关度排序
+        需要给全部命中打分, 10 万行时慢约两个数量级, 因此不采用。
+        无检索词时按列表默认顺序。
+        """
+        joins = []
+        where = []
+        params = []
+        query = fts_query(text or "")
+        if query:
+            joins.append('''JOIN (SELECT rowid AS hit FROM mistakes_fts
+                                WHERE mistakes_fts MATCH ? ORDER BY rowid DESC) AS f
+                          ON f.hit = mistakes.id''')
+            params.append(query)
+        if tag:
+            joins.append('''JOIN mistake_tags mt ON mt.mistake_id = mistakes.id
+                            AND mt.tag_id = (SELECT id FROM tags WHERE name = ?)''')
+            params.append(tag.strip().lower())
+        for column, value in (("course_type", course_type), ("chapter", chapter),
+                              ("error_type", error_type)):
+            if value:
+                where.append(f"mistakes.{column} = ?")
+                params.append(value)
+        order = "f.hit DESC" if query else "IFNULL(last_reviewed, '') DESC, mistakes.id DESC"
+        params.append(limit)
+        self.cursor.execute(f'''
+            SELECT {MISTAKE_ROW_COLUMNS}
+            FROM mistakes
+            {' '.join(joins)}
+            {'WHERE ' + ' AND '.join(where) if where else ''}
+            ORDER BY {order}
+            LIMIT ?
+        ''', params)
+        return self.cursor.fetchall()
+
+    def tag_names(self):
+        """所有标签, 按使用次数降序"""
+        self.cursor.execute('''
+            SELECT t.name FROM tags t
+            JOIN mistake_tags mt ON mt.tag_id = t.id
+            GROUP BY t.id
+            ORDER BY COUNT(*) DESC, t.name
+        ''')
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def mistake_row(self, mistake_id):
+        """单条错题的列表行 (格式同 list_mistakes), 用于增量刷新"""
+        self.cursor.execute(f"SELECT {MISTAKE_ROW_COLUMNS} FROM mistakes WHERE id=?",
+                            (mistake_id,))
+        return self.cursor.fetchone()
+
+    def get_mistake(self, mistake_id):
+        """读取单条错题"""
+        self.cursor.execute(f"SELECT {MISTAKE_COLUMNS} FROM mistakes WHERE id=?", (mistake_id,))
+        return self.cursor.fetchone()
+
+    def review_sampler(self):
+        """按 probability 加权的抽样器, 首次使用时一次性载入"""
+        if self.sampler is None:
+            self.cursor.execute("SELECT id, probability FROM mistakes WHERE probability > 0")
+            self.sampler = WeightedSampler(self.cursor.fetchall(), seed=self.review_seed)
+        return self.sampler
+
+    def reseed(self, seed):
+        """重置随机复习的随机数种子, 使抽取序列可复现"""
+        self.review_seed = seed
+        if self.sampler is not None:
+            self.sampler.reseed(seed)
+
+    def invalidate_sampler(self):
+        """绕过本类批量改写 mistakes 后调用, 下次抽取时重建"""
+        self.sampler = None
+
+    def pick_review(self):
+        """按概率权重随机抽取一道错题, O(log n)"""
+        mistake_id = self.review_sampler().draw()
+        if mistake_id is None:
+            return None
+        return self.get_mistake(mistake_id)
+
+    def pick_review_ids(self, limit):
+        """随机复习一轮: 按权重不放回地抽取至多 limit 道错题的 id"""
+        return self.review_sampler().draw_distinct(limit)
+
+    def due_review_ids(self, limit, now=None):
+        """间隔复习一轮: 已到期的错题 id, 最早到期的在前"""
+        self.cursor.execute('''
+            SELECT id FROM mistakes
+            WHERE next_due <= ?
+            ORDER BY next_due
+            LIMIT ?
+        ''', (now or datetime.now().isoformat(), limit))
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def _apply_review(self, mistake_id, mastery_level, reviewed_at=None):
+        # 写入一次复习结果 (不提交)
+        reviewed_at = reviewed_at or datetime.now()
+        new_prob = max(0.1, 1.0 - (mastery_level-1)*0.4)
+        self.cursor.execute(
+            "SELECT repetitions, interval_days, ease FROM mistakes WHERE id=?",
+            (mistake_id,))
+        row = self.cursor.fetchone()
+        if row is None:
+            return
+        repetitions, interval_days, ease, next_due = schedule(*row, mastery_level, now=reviewed_at)
+        self.cursor.execute('''
+            UPDATE mistakes
+            SET mastery_level=?, probability=?, last_reviewed=?,
+                repetitions=?, interval_days=?, ease=?, next_due=?
+            WHERE id=?
+        ''', (mastery_level, new_prob, reviewed_at.isoformat(),
+              repetitions, interval_days, ease, next_due, mistake_id))
+        # chapter_id 由触发器填写 (迁移 13)
+        self.cursor.execute("INSERT INTO review_log (mistake_id, reviewed_at, result) VALUES (?, ?, ?)",
+                            (mistake_id, int(reviewed_at.timestamp()), mastery_level))
+        if self.sampler is not None:
+            self.sampler.set(int(mistake_id), new_prob)
+
+    def record_review(self, mistake_id, mastery_level):
+        """记录复习结果, 同时更新随机模式的权重和间隔复习的调度"""
+        self._apply_review(mistake_id, mastery_level)
+        if self.write_behind:
+            self.pending_writes += 1
+            if self.pending_writes >= WRITE_BEHIND_MAX_PENDING:
+                self.commit()
+        else:
+            self.commit()
+
+    def record_reviews(self, results):
+        """在一个事务中记录一轮复习的全部结果 [(id, 掌握程度, 复习时间)]"""
+        # 先提交写后延迟积压的结果, 失败回滚时只撤销本轮
+        self.flush()
+        try:
+            for mistake_id, mastery_level, reviewed_at in results:
+                self._apply_review(mistake_id, mastery_level, reviewed_at)
+            self.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    def next_due_mistake(self, now=None):
+        """最早到期且已到期的错题, 走 next_due 索引"""
+        now = now or datetime.now().isoformat()
+        self.cursor.execute(f'''
+            SELECT {MISTAKE_COLUMNS} FROM mistakes
+            WHERE next_due <= ?
+            ORDER BY next_due
+            LIMIT 1
+        ''', (now,))
+        return self.cursor.fetchone()
+
+    def mistake_count(self):
+        """错题总数"""
+        self.cursor.execute("SELECT COUNT(*) FROM mistakes")
+        return self.cursor.fetchone()[0]
+
+    def due_count(self, until=None):
+        """截至 until (默认今天结束) 到期的错题数"""
+        self.cursor.execute("SELECT COUNT(*) FROM mistakes WHERE next_due <= ?",
+                            (until or end_of_today(),))
+        return self.cursor.fetchone()[0]
+
+    # ---- 图片 ----
+
+    def put_image(self, data):
+        """按内容写入图片 (不提交), 返回摘要; 相同内容只存一份"""
+        digest = image_hash(data)
+        self.cursor.execute('''
+            INSERT OR IGNORE INTO images (hash, data, size) VALUES (?, ?, ?)
+        ''', (digest, data, len(data)))
+        return digest
+
+    def replace_image(self, old_digest, data):
+        """用新内容替换图片 (不提交): 错题改为引用新摘要, 旧图片及其缩略图删除; 返回新摘要"""
+        digest = self.put_image(data)
+        if digest != old_digest:
+            self.cursor.execute("UPDATE mistakes SET image_hash=? WHERE image_hash=?", (digest, old_digest))
+            self.cursor.execute("DELETE FROM images WHERE hash=?", (old_digest,))
+            self.cursor.execute("DELETE FROM thumbnails WHERE hash=?", (old_digest,))
+        return digest
+
+    def load_image(self, digest):
+        """按摘要读取图片字节, 不存在时返回 None"""
+        self.cursor.execute("SELECT data FROM images WHERE hash=?", (digest,))
+        row = self.cursor.fetchone()
+        return row[0] if row else None
+
+    def load_thumbnail(self, digest, size):
+        """读取已生成的缩略图字节"""
+        self.cursor.execute("SELECT data FROM thumbnails WHERE hash=? AND size=?", (digest, size))
+        row = self.cursor.fetchone()
+        return row[0] if row else None
+
+    def save_thumbnail(self, digest, size, data):
+        """保存缩略图; 写锁被其他连接占用时不等待, 放弃本次保存并返回 False"""
+        self.flush()
+        self.conn.execute("PRAGMA busy_timeout = 0")
+        try:
+            self.cursor.execute('''
+                INSERT OR REPLACE INTO thumbnails (hash, size, data) VALUES (?, ?, ?)
+            ''', (digest, size, data))
+            self.commit()
+        except sqlite3.OperationalError as e:
+            if "locked" not in str(e):
+                raise
+            self.conn.rollback()
+            return False
+        finally:
+            self.conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT * 1000}")
+        return True
+
+    # ---- 分析 ----
+
+    def attach_shard(self, path):
+        """ATTACH 学期分片 (已附加的直接复用), 返回其 schema 别名
+
+        SQLite 同时最多附加 10 个数据库, 用完要调用 detach_shard。
+        """
+        alias = self.attached.get(path)
+        if alias is None:
+            # ATTACH 不能在事务中执行
+            self.flush()
+            used = set(self.attached.values())
+            alias = next(f"shard{i}" for i in range(len(used) + 1) if f"shard{i}" not in used)
+            self.conn.execute(f"ATTACH DATABASE ? AS {alias}", (path,))
+            self.attached[path] = alias
+        return alias
+
+    def detach_shard(self, path):
+        """DETACH 学期分片, 未附加时忽略"""
+        alias = self.attached.pop(path, None)
+        if alias is not None:
+            # DETACH 同样不能在事务中执行
+            self.flush()
+            self.conn.execute(f"DETACH DATABASE {alias}")
+
+    def _archive_rollup(self):
+        """把各分片的汇总行逐个收进 temp.archive_rollup, 同一时刻只附加一个分片"""
+        self.cursor.execute('''
+            CREATE TEMP TABLE IF NOT EXISTS archive_rollup (
+                course_type TEXT, chapter TEXT, error_type TEXT, count INTEGER
+            )
+        ''')
+        self.cursor.execute("DELETE FROM temp.archive_rollup")
+        self.commit()
+        for path in shard_paths(self.db_path):
+            alias = self.attach_shard(path)
+            try:
+                self.cursor.execute(f'''
+                    INSERT INTO temp.archive_rollup
+                    SELECT course_type, chapter, error_type, SUM(count)
+                    FROM {alias}.rollup_daily
+                    GROUP BY course_type, chapter, error_type
+                ''')
+                self.commit()
+            finally:
+                self.detach_shard(path)
+
+    def _rollup_source(self, period):
+        """按周期选择汇总表: 全部数据读 rollup_total, 其余读 rollup_daily 的日期区间
+
+        含归档学期时先把各分片的汇总行收进临时表, 再与主库汇总表 UNION ALL。
+        """
+        if period == ARCHIVE_PERIOD:
+            self._archive_rollup()
+            return ('''(
+                SELECT course_type, chapter, error_type, count FROM main.rollup_total
+                UNION ALL
+                SELECT course_type, chapter, error_type, count FROM temp.archive_rollup
+            )''', "", ())
+        offset = PERIOD_OFFSETS[period]
+        if offset is None:
+            return "rollup_total", "", ()
+        return "rollup_daily", "WHERE day > date('now', ?)", (offset,)
+
+    def error_type_stats(self, period="全部数据"):
+        """错题类型分布 (读汇总表)"""
+        table, where, params = self._rollup_source(period)
+        self.cursor.execute(f'''
+            SELECT error_type, SUM(count)
+            FROM {table}
+            {where}
+            GROUP BY error_type
+            HAVING SUM(count) > 0
+        ''', params)
+        return self.cursor.fetchall()
+
+    def course_progress(self):
+        """各课程完成百分比"""
+        self.cursor.execute('''
+            SELECT course_type,
+                   ROUND(100.0 * SUM(completed)/COUNT(*), 1)
+            FROM courses
+            GROUP BY course_type
+        ''')
+        return self.cursor.fetchall()
+
+    def incomplete_courses(self, limit=3):
+        """未完成的课程资源"""
+        self.cursor.execute('''
+            SELECT course_type || ' - ' || chapter, resource_type
+            FROM courses
+            WHERE completed=0
+            ORDER BY sort_order
+            LIMIT ?
+        ''', (limit,))
+        return self.cursor.fetchall()
+
+    def review_log_packed(self, since=0):
+        """since (epoch 秒) 之后的复习日志, 打包成空格分隔的整数串
+
+        每条依次为 错题 id、epoch 秒、结果、章节键 (无章节为 -1)。在 SQLite 中
+        拼成一个字符串, 调用方一次解析成数组, 不为每条日志创建 Python 元组。
+        """
+        self.cursor.execute('''
+            SELECT group_concat(mistake_id || ' ' || reviewed_at || ' ' || result || ' '
+                                || IFNULL(chapter_id, -1), ' ')
+            FROM review_log
+            WHERE reviewed_at >= ?
+        ''', (since,))
+        return self.cursor.fetchone()[0] or ""
+
+    def review_chapter_labels(self):
+        """复习日志的章节键 -> "课程 - 章节" 标签"""
+        self.cursor.execute("SELECT id, course_type || ' - ' || chapter FROM review_chapters")
+        return dict(self.cursor.fetchall())
+
+    def hot_chapters(self, period="全部数据", limit=2):
+        """错题最多的章节 (读汇总表)"""
+        table, where, params = self._rollup_source(period)
+        self.cursor.execute(f'''
+            SELECT course_type || ' - ' || chapter, SUM(count)
+            FROM {table}
+            {where}
+            GROUP BY course_type, chapter
+            HAVING SUM(count) > 0
+            ORDER BY SUM(count) DESC
+            LIMIT ?
+        ''', params + (limit,))
+        return self.cursor.fetchall()
+
+    def refresh_scores(self, now=None):
+        """重算被标脏的章节并载入其他连接新算出的分数, 返回重算的章节数"""
+        self.flush()
+        if self.scores is None:
+            self.scores = ChapterScores()
+        now = time.time() if now is None else now
+        dirty = 0
+        if self.conn.execute("SELECT 1 FROM chapter_scores WHERE dirty = 1 LIMIT 1").fetchone():
+            # 持有写锁后再读脏章节, 与其他连接的标脏互不遗漏
+            self.cursor.execute("BEGIN IMMEDIATE")
+            try:
+                revision = self.cursor.execute(
+                    "SELECT IFNULL(MAX(revision), 0) + 1 FROM chapter_scores").fetchone()[0]
+                keys = self.cursor.execute(
+                    "SELECT course_type, chapter FROM chapter_scores WHERE dirty = 1").fetchall()
+                for course_type, chapter in keys:
+                    self.cursor.execute(f'''
+                        UPDATE chapter_scores
+                        SET ({SCORE_COLUMNS}) = ({", ".join("?" * 7)}), dirty = 0, revision = ?
+                        WHERE course_type = ? AND chapter = ?
+                    ''', compute_chapter(self.cursor, course_type, chapter, now)
+                        + (revision, course_type, chapter))
+                self.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+            dirty = len(keys)
+        self.cursor.execute(f'''
+            SELECT course_type, chapter, revision, {SCORE_COLUMNS}
+            FROM chapter_scores WHERE dirty = 0 AND revision > ?
+        ''', (self.scores.revision,))
+        self.scores.load(self.cursor.fetchall())
+        return dirty
+
+    def ranked_chapters(self, limit=3, now=None):
+        """按薄弱度排序的章节: (课程 - 章节, 分数, 错题数, 未掌握数, 主要错误类型)
+
+        只重算自上次以来被触发器标脏的章节, 排序在内存中完成。
+        """
+        now = time.time() if now is None else now
+        self.refresh_scores(now)
+        return self.scores.ranked(limit, now)
+
+    def rollup_rows(self, period="全部数据"):
+        """(课程, 章节, 错误类型, 条数), 供离线报表按课程与章节拆分 (读汇总表)"""
+        table, where, params = self._rollup_source(period)
+        self.cursor.execute(f'''
+            SELECT course_type, chapter, error_type, SUM(count)
+            FROM {table}
+            {where}
+            GROUP BY course_type, chapter, error_type
+            HAVING SUM(count) > 0
+        ''', params)
+        return self.cursor.fetchall()
+
+    def rebuild_rollups(self):
+        """从 mistakes 全量重建汇总表 (用于修复或导入旧数据后)"""
+        with self.conn:
+            rebuild_rollups(self.cursor)
+            rebuild_score_rollup(self.cursor)
+
+
+if __name__ == "__main__":
+    import sys
+    if sys.argv[1:] == ["rebuild-rollups"]:
+        store = StudyStore()
+        store.rebuild_rollups()
+        store.close()
+        print("汇总表已重建")
+    else:
+        print("用法: python study_store.py rebuild-rollups")
@@ -0,0 +1,455 @@
+"""多设备增量同步: 只交换对端游标之后变更的课程、错题与图片
+
+每次修改 courses / mistakes 都由触发器记入 change_log (迁移 11), 取新的
+自增序号, 删除留下墓碑。同步时客户端先拉取对端游标之后的变更, 再推送
+本机游标之后的变更; 图片按内容摘要只传对方缺少的。冲突按 changed_at
+(UTC) 后写者胜, 时间相同时取设备 id 较大的一方, 两端结果一致。复习日志、
+缩略图与学期分片不同步。
+
+    python study_sync.py serve --host 0.0.0.0 --token 口令   # 在另一台设备上
+    python study_sync.py sync http://192.168.1.5:8765 --token 口令
+
+服务默认只监听 127.0.0.1; 监听其他地址时必须设置共享口令, 客户端在
+X-Sync-Token 请求头中携带, 口令也可以通过环境变量 STUDY_SYNC_TOKEN 给出。
+"""
+import hmac
+import ipaddress
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from urllib.parse import parse_qs, quote, urlparse
+from study_migrations import image_hash, sync_tags
+
+# 每次请求最多携带的变更条数
+SYNC_BATCH_SIZE = 500
+SYNC_TIMEOUT = 30
+SYNC_TOKEN_HEADER = "X-Sync-Token"
+MISTAKE_SYNC_COLUMNS = ("course_type", "chapter", "question", "image_hash", "error_type", "tags",
+                        "mastery_level", "probability", "created_at", "last_reviewed",
+                        "repetitions", "interval_days", "ease", "next_due")
+COURSE_SYNC_COLUMNS = ("course_type", "chapter", "resource_type", "completed", "last_updated", "sort_order")
+
+
+class SyncError(Exception):
+    """对端返回错误或数据不一致"""
+
+
+def device_id(store):
+    """本机设备 id (迁移时随机生成)"""
+    return store.conn.execute("SELECT device_id FROM sync_state").fetchone()[0]
+
+
+def local_changes(store, since, peer=None, limit=SYNC_BATCH_SIZE):
+    """序号大于 since 的变更, 跳过从 peer 收到的; 返回 (变更列表, 新游标, 是否还有)
+
+    每条变更为 {seq, entity, key, deleted, changed_at, row}, row 为行内容 (墓碑为 None)。
+    """
+    store.flush()
+    conn = store.conn
+    # 先取最大序号再取变更: 单写者下序号按提交顺序分配, 不会漏掉两次查询之间提交的变更
+    latest = conn.execute("SELECT IFNULL(MAX(seq), 0) FROM change_log").fetchone()[0]
+    mistake_columns = ", ".join(f"m.{c}" for c in MISTAKE_SYNC_COLUMNS)
+    course_columns = ", ".join(f"co.{c}" for c in COURSE_SYNC_COLUMNS)
+    # 连接条件的求值顺序不确定, 只对课程的键做 JSON 解析
+    course_key = "CASE WHEN c.entity = 'courses' THEN c.key END"
+    rows = conn.execute(f'''
+        SELECT c.seq, c.entity, c.key, c.deleted, c.changed_at, m.id, {mistake_columns}, co.id, {course_columns}
+        FROM change_log c
+        LEFT JOIN mistakes m ON c.entity = 'mistakes' AND c.deleted = 0 AND m.uid = c.key
+        LEFT JOIN courses co ON c.entity = 'courses' AND c.deleted = 0
+            AND co.course_type = json_extract({course_key}, '$[0]')
+            AND co.chapter = json_extract({course_key}, '$[1]')
+            AND co.resource_type = json_extract({course_key}, '$[2]')
+        WHERE c.seq > ? AND (? IS NULL OR c.origin IS NOT ?)
+        ORDER BY c.seq
+        LIMIT ?
+    ''', (since, peer, peer, limit)).fetchall()
+
+    split = 6 + len(MISTAKE_SYNC_COLUMNS)
+    changes = []
+    for row in rows:
+        seq, entity, key, deleted, changed_at = row[:5]
+        record = None
+        if not deleted:
+            if entity == "mistakes" and row[5] is not None:
+                record = dict(zip(MISTAKE_SYNC_COLUMNS, row[6:split]))
+            elif entity == "courses" and row[split] is not None:
+                record = dict(zip(COURSE_SYNC_COLUMNS, row[split + 1:]))
+        changes.append({"seq": seq, "entity": entity, "key": key, "deleted": bool(deleted),
+                        "changed_at": changed_at, "row": record})
+    more = len(rows) == limit
+    cursor = rows[-1][0] if more else max(latest, rows[-1][0] if rows else 0)
+    return changes, cursor, more
+
+
+def missing_images(store, digests):
+    """digests 中本机没有的图片摘要"""
+    have = set()
+    digests = list(dict.fromkeys(d for d in digests if d))
+    for start in range(0, len(digests), SYNC_BATCH_SIZE):
+        part = digests[start:start + SYNC_BATCH_SIZE]
+        have.update(row[0] for row in store.conn.execute(
+            f"SELECT hash FROM images WHERE hash IN ({', '.join('?' * len(part))})", part))
+    return [d for d in digests if d not in have]
+
+
+def store_image(store, digest, data):
+    """校验摘要后写入收到的图片并提交"""
+    if image_hash(data) != digest:
+        raise SyncError(f"图片 {digest[:12]} 内容与摘要不符")
+    store.put_image(data)
+    store.commit()
+
+
+def _newer(remote_at, remote_device, local_at, local_device):
+    """后写者胜; 同一时刻设备 id 较大者胜"""
+    if local_at is None or remote_at != local_at:
+        return local_at is None or remote_at > local_at
+    return remote_device > local_device
+
+
+def _drop_unused_image(cur, digest):
+    """删除不再被任何错题引用的图片及其缩略图"""
+    cur.execute('''
+        DELETE FROM images
+        WHERE hash=? AND NOT EXISTS (SELECT 1 FROM mistakes WHERE image_hash=?)
+    ''', (digest, digest))
+    if cur.rowcount:
+        cur.execute("DELETE FROM thumbnails WHERE hash=?", (digest,))
+
+
+def _apply_mistake(cur, key, deleted, row):
+    found = cur.execute("SELECT id, image_hash FROM mistakes WHERE uid=?", (key,)).fetchone()
+    if deleted:
+        if found:
+            cur.execute("DELETE FROM mistakes WHERE id=?", (found[0],))
+            if found[1]:
+                _drop_unused_image(cur, found[1])
+        return
+    values = [row.get(c) for c in MISTAKE_SYNC_COLUMNS]
+    if found:
+        assignments = ", ".join(f"{c}=?" for c in MISTAKE_SYNC_COLUMNS)
+        cur.execute(f"UPDATE mistakes SET {assignments} WHERE id=?", values + [found[0]])
+        mistake_id = found[0]
+        if found[1] and found[1] != row.get("image_hash"):
+            _drop_unused_image(cur, found[1])
+    else:
+        cur.execute(f'''
+            INSERT INTO mistakes (uid, {", ".join(MISTAKE_SYNC_COLUMNS)})
+            VALUES (?{", ?" * len(MISTAKE_SYNC_COLUMNS)})
+        ''', [key] + values)
+        mistake_id = cur.lastrowid
+    sync_tags(cur, mistake_id, row.get("tags"))
+
+
+def _apply_course(cur, key, deleted, row):
+    course_type, chapter, resource_type = json.loads(key)
+    if deleted:
+        cur.execute("DELETE FROM courses WHERE course_type=? AND chapter=? AND resource_type=?",
+                    (course_type, chapter, resource_type))
+        return
+    cur.execute('''
+        INSERT INTO courses (course_type, chapter, resource_type, completed, last_updated, sort_order)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(course_type, chapter, resource_type)
+        DO UPDATE SET completed=excluded.completed, last_updated=excluded.last_updated,
+                      sort_order=excluded.sort_order
+    ''', [row.get(c) for c in COURSE_SYNC_COLUMNS])
+
+
+def apply_changes(store, changes, peer):
+    """在一个事务中应用 peer 发来的变更, 返回 {"applied": 条数, "skipped": 本机较新而跳过的条数}
+
+    错题引用的图片须已写入 (见 missing_images)。应用后的 change_log 记录保留
+    对端的 changed_at, origin 记为 peer。
+    """
+    store.flush()
+    own = device_id(store)
+    cur = store.conn.cursor()
+    result = {"applied": 0, "skipped": 0}
+    cur.execute("BEGIN IMMEDIATE")
+    try:
+        cur.execute("UPDATE sync_state SET applying=?", (peer,))
+        for change in changes:
+            entity, key = change["entity"], change["key"]
+            local = cur.execute("SELECT changed_at, origin FROM change_log WHERE entity=? AND key=?",
+                                (entity, key)).fetchone()
+            if local and not _newer(change["changed_at"], peer, local[0], local[1] or own):
+                result["skipped"] += 1
+                continue
+            if change["row"] is None and not change["deleted"]:
+                # 对端没能按键取到行内容 (课程键含 NULL 时无法匹配), 不当作删除
+                result["skipped"] += 1
+                continue
+            if entity == "mistakes":
+                _apply_mistake(cur, key, change["deleted"], change["row"])
+            elif entity == "courses":
+                _apply_course(cur, key, change["deleted"], change["row"])
+            else:
+                raise SyncError(f"未知的同步表 {entity}")
+            # 取新序号以便继续转发给其他设备; changed_at 保留对端的时间
+            cur.execute('''
+                INSERT OR REPLACE INTO change_log (entity, key, deleted, changed_at, origin)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (entity, key, int(change["deleted"]), change["changed_at"], peer))
+            result["applied"] += 1
+        cur.execute("UPDATE sync_state SET applying=NULL")
+        store.commit()
+    except Exception:
+        store.conn.rollback()
+        raise
+    finally:
+        cur.close()
+        store.invalidate_sampler()
+    return result
+
+
+def peer_cursors(store, peer):
+    """与 peer 的 (pulled, pushed) 游标"""
+    row = store.conn.execute("SELECT pulled, pushed FROM sync_peers WHERE peer=?", (peer,)).fetchone()
+    return row or (0, 0)
+
+
+def save_cursors(store, peer, pulled, pushed):
+    with store.conn:
+        store.conn.execute('''
+            INSERT INTO sync_peers (peer, pulled, pushed, synced_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT(peer) DO UPDATE SET pulled=excluded.pulled, pushed=excluded.pushed,
+                                            synced_at=excluded.synced_at
+        ''', (peer, pulled, pushed, datetime.now().isoformat()))
+
+
+# ---- HTTP ----
+
+class SyncClient:
+    """同步服务器的 HTTP 客户端, 记录收发的字节数"""
+
+    def __init__(self, base_url, timeout=SYNC_TIMEOUT, token=None):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.token = token
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def request(self, method, path, body=None, content_type="application/json"):
+        from urllib.error import HTTPError
+        from urllib.request import Request, urlopen
+
+        if body is not None and content_type == "application/json":
+            body = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        req = Request(self.base_url + path, data=body, method=method)
+        if self.token:
+            # 请求头只能是 latin-1, 口令按 URL 编码传输
+            req.add_header(SYNC_TOKEN_HEADER, quote(self.token, safe=""))
+        if body is not None:
+            req.add_header("Content-Type", content_type)
+            self.bytes_sent += len(body)
+        try:
+            with urlopen(req, timeout=self.timeout) as response:
+                data = response.read()
+                is_json = response.headers.get_content_type() == "application/json"
+        except HTTPError as e:
+            raise SyncError(f"{method} {path}: {e.code} {e.read().decode('utf-8', 'replace')}") from None
+        self.bytes_received += len(data)
+        return json.loads(data) if is_json else data
+
+
+def sync(store, base_url, progress=None, token=None):
+    """与 base_url 上的同步服务器双向同步, 返回统计信息; progress(阶段, 已处理条数)"""
+    start = time.perf_counter()
+    client = SyncClient(base_url, token=token)
+    own = device_id(store)
+    stats = {"pulled": 0, "pushed": 0, "skipped": 0, "images_in": 0, "images_out": 0}
+
+    # 拉取
+    peer = client.request("GET", "/device")["device_id"]
+    pulled, pushed = peer_cursors(store, peer)
+    while True:
+        page = client.request("GET", f"/changes?since={pulled}&peer={own}&limit={SYNC_BATCH_SIZE}")
+        changes = page["changes"]
+        if changes:
+            digests = [c["row"].get("image_hash") for c in changes if c["entity"] == "mistakes" and c["row"]]
+            for digest in missing_images(store, digests):
+                store_image(store, digest, client.request("GET", f"/images/{digest}"))
+                stats["images_in"] += 1
+            result = apply_changes(store, changes, peer)
+            stats["pulled"] += result["applied"]
+            stats["skipped"] += result["skipped"]
+        pulled = page["cursor"]
+        save_cursors(store, peer, pulled, pushed)
+        if progress:
+            progress("pull", stats["pulled"])
+        if not page["more"]:
+            break
+
+    # 推送
+    while True:
+        changes, cursor, more = local_changes(store, pushed, peer)
+        if changes:
+            digests = [c["row"].get("image_hash") for c in changes if c["entity"] == "mistakes" and c["row"]]
+            wanted = client.request("POST", "/images/missing", {"hashes": list(set(filter(None, digests)))})
+            for digest in wanted["missing"]:
+                client.request("PUT", f"/images/{digest}", store.load_image(digest),
+                               content_type="application/octet-stream")
+                stats["images_out"] += 1
+            result = client.request("POST", f"/changes?peer={own}", {"changes": changes})
+            stats["pushed"] += result["applied"]
+            stats["skipped"] += result["skipped"]
+        pushed = cursor
+        save_cursors(store, peer, pulled, pushed)
+        if progress:
+            progress("push", stats["pushed"])
+        if not more:
+            break
+
+    stats["peer"] = peer
+    stats["bytes_sent"] = client.bytes_sent
+    stats["bytes_received"] = client.bytes_received
+    stats["seconds"] = round(time.perf_counter() - start, 3)
+    return stats
+
+
+def is_loopback(host):
+    """host 是否只在本机可达"""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def make_server(db_path, host="127.0.0.1", port=0, token=None):
+    """创建同步服务器 (port=0 时由系统分配); 调用 serve_forever() 开始服务
+
+    单线程服务, 数据库连接在服务线程中第一次请求时打开。设置 token 时
+    请求头 X-Sync-Token 不符的请求一律返回 401; 监听非本机地址必须设置。
+    """
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from study_store import StudyStore
+
+    if not token and not is_loopback(host):
+        raise SyncError(f"监听 {host} 需要设置同步口令")
+
+    class SyncHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def store(self):
+            if self.server.store is None:
+                self.server.store = StudyStore(db_path)
+            return self.server.store
+
+        def send_body(self, body, content_type="application/json", status=200):
+            if content_type == "application/json":
+                body = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def read_body(self):
+            return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+        def authorized(self):
+            if not token:
+                return True
+            given = self.headers.get(SYNC_TOKEN_HEADER) or ""
+            return hmac.compare_digest(given.encode("latin-1"), quote(token, safe="").encode("ascii"))
+
+        def dispatch(self, method):
+            if not self.authorized():
+                return self.send_body({"error": "unauthorized"}, status=401)
+            url = urlparse(self.path)
+            query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            parts = url.path.strip("/").split("/")
+            store = self.store()
+            try:
+                if method == "GET" and parts == ["device"]:
+                    return self.send_body({"device_id": device_id(store)})
+                if method == "GET" and parts == ["changes"]:
+                    changes, cursor, more = local_changes(
+                        store, int(query.get("since", 0)), query.get("peer"),
+                        min(int(query.get("limit", SYNC_BATCH_SIZE)), SYNC_BATCH_SIZE))
+                    return self.send_body({"changes": changes, "cursor": cursor, "more": more})
+                if method == "POST" and parts == ["changes"]:
+                    changes = json.loads(self.read_body())["changes"]
+                    return self.send_body(apply_changes(store, changes, query["peer"]))
+                if method == "POST" and parts == ["images", "missing"]:
+                    hashes = json.loads(self.read_body())["hashes"]
+                    return self.send_body({"missing": missing_images(store, hashes)})
+                if len(parts) == 2 and parts[0] == "images":
+                    if method == "GET":
+                        data = store.load_image(parts[1])
+                        if data is None:
+                            return self.send_body({"error": "no such image"}, status=404)
+                        return self.send_body(data, "application/octet-stream")
+                    if method == "PUT":
+                        store_image(store, parts[1], self.read_body())
+                        return self.send_body({"stored": parts[1]})
+                self.send_body({"error": "not found"}, status=404)
+            except (SyncError, KeyError, ValueError, TypeError, AttributeError) as e:
+                # 缺字段或类型不对的请求体
+                self.send_body({"error": f"{type(e).__name__}: {e}"}, status=400)
+            except sqlite3.Error as e:
+                self.send_body({"error": f"{type(e).__name__}: {e}"}, status=500)
+
+        def do_GET(self):
+            self.dispatch("GET")
+
+        def do_POST(self):
+            self.dispatch("POST")
+
+        def do_PUT(self):
+            self.dispatch("PUT")
+
+    server = HTTPServer((host, port), SyncHandler)
+    server.store = None
+    return server
+
+
+if __name__ == "__main__":
+    import argparse
+    from study_store import StudyStore, DB_PATH
+
+    parser = argparse.ArgumentParser(description="多设备增量同步")
+    parser.add_argument("--db", default=DB_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_serve = sub.add_parser("serve", help="提供同步服务")
+    p_serve.add_argument("--host", default="127.0.0.1", help="监听地址 (非本机地址需要 --token)")
+    p_serve.add_argument("--port", type=int, default=8765)
+    p_sync = sub.add_parser("sync", help="与同步服务器双向同步")
+    p_sync.add_argument("url")
+    for p in (p_serve, p_sync):
+        p.add_argument("--token", default=os.environ.get("STUDY_SYNC_TOKEN"),
+                       help="共享同步口令 (默认取环境变量 STUDY_SYNC_TOKEN)")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        try:
+            server = make_server(args.db, args.host, args.port, args.token)
+        except SyncError as e:
+            parser.error(str(e))
+        print(f"同步服务: http://{args.host}:{server.server_port}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if server.store is not None:
+                server.store.close()
+            server.server_close()
+    else:
+        store = StudyStore(args.db)
+        try:
+            result = sync(store, args.url,
+                          lambda stage, done: print(f"\r{stage} {done}", end="", file=sys.stderr, flush=True),
+                          args.token)
+        finally:
+            store.close()
+        print(file=sys.stderr)
+        print(json.dumps(result, ensure_ascii=False))
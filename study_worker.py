@@ -0,0 +1,93 @@
+"""后台工作线程: 数据库查询、文件读取与图片解码不在 Tk 主线程执行"""
+import queue
+import threading
+from study_store import StudyStore
+
+
+class BackgroundWorker:
+    """单线程任务执行器
+
+    任务是接收 StudyStore 的函数, 在工作线程上用其独立的连接执行;
+    结果放入队列, 由主线程通过 root.after 轮询取出后调用 callback。
+    同一 channel 上提交新任务会使旧任务作废: 尚未执行的直接跳过,
+    已执行完的结果在交付时丢弃 (例如用户已经选中了另一行)。
+    给出 profiler 时, 工作线程的 SQL 与每个任务的耗时 (按 channel 命名) 都会被记录。
+    """
+
+    def __init__(self, root, db_path, poll_ms=30, profiler=None):
+        self.root = root
+        self.poll_ms = poll_ms
+        self.profiler = profiler
+        self._tasks = queue.Queue()
+        self._results = queue.Queue()
+        self._generations = {}
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, args=(db_path,),
+                                        name="study-worker", daemon=True)
+        self._thread.start()
+        self._after_id = self.root.after(self.poll_ms, self._poll)
+
+    def submit(self, func, callback=None, errback=None, channel=None):
+        """提交任务 func(store); callback(result) / errback(exc) 在主线程调用"""
+        generation = None
+        if channel is not None:
+            generation = self._generations.get(channel, 0) + 1
+            self._generations[channel] = generation
+        self._tasks.put((func, callback, errback, channel, generation))
+
+    def cancel(self, channel):
+        """作废该 channel 上所有未交付的任务"""
+        self._generations[channel] = self._generations.get(channel, 0) + 1
+
+    def close(self):
+        """停止轮询并等待工作线程退出"""
+        if self._closed:
+            return
+        self._closed = True
+        self.root.after_cancel(self._after_id)
+        self._tasks.put(None)
+        self._thread.join(timeout=5)
+
+    def _stale(self, channel, generation):
+        return channel is not None and self._generations.get(channel) != generation
+
+    def _run(self, db_path):
+        store = StudyStore(db_path)
+        if self.profiler is not None:
+            self.profiler.attach(store.conn)
+        try:
+            while True:
+                task = self._tasks.get()
+                if task is None:
+                    break
+                func, callback, errback, channel, generation = task
+                if self._stale(channel, generation):
+                    continue
+                try:
+                    if self.profiler is not None:
+                        with self.profiler.span(f"worker:{channel}", "worker"):
+                            result, error = func(store), None
+                    else:
+                        result, error = func(store), None
+                except Exception as e:
+                    result, error = None, e
+                self._results.put((result, error, callback, errback, channel, generation))
+        finally:
+            store.close()
+
+    def _poll(self):
+        # 先安排下一次轮询, 回调抛出异常也不会让轮询停下
+        if not self._closed:
+            self._after_id = self.root.after(self.poll_ms, self._poll)
+        while True:
+            try:
+                result, error, callback, errback, channel, generation = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if self._stale(channel, generation):
+                continue
+            if error is not None:
+                if errback is not None:
+                    errback(error)
+            elif callback is not None:
+                callback(result)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 模块与主程序平铺在仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
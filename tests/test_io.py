@@ -0,0 +1,55 @@
+"""批量导入: 写入前整体检查, 图片路径不能越出图片目录"""
+import json
+
+import pytest
+
+from study_io import import_mistakes
+from study_store import StudyStore
+
+
+def write_jsonl(path, records):
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def count(store):
+    return store.conn.execute("SELECT COUNT(*) FROM mistakes").fetchone()[0]
+
+
+@pytest.mark.parametrize("name", ["../secret.png", "/etc/passwd", "sub/../../secret.png"])
+def test_image_outside_image_dir_is_rejected(tmp_path, name):
+    (tmp_path / "secret.png").write_bytes(b"\x89PNG secret")
+    images = tmp_path / "images"
+    images.mkdir()
+    (images / "ok.png").write_bytes(b"\x89PNG ok")
+    source = tmp_path / "mistakes.jsonl"
+    write_jsonl(source, [{"question": "甲", "image": "ok.png"}, {"question": "乙", "image": name}])
+
+    store = StudyStore(str(tmp_path / "study.db"))
+    try:
+        with pytest.raises(ValueError, match="第 2 条"):
+            import_mistakes(store, str(source), str(images), batch_size=1)
+        assert count(store) == 0
+        assert store.conn.execute("SELECT COUNT(*) FROM images").fetchone()[0] == 0
+    finally:
+        store.close()
+
+
+def test_missing_image_in_later_batch_writes_nothing(tmp_path):
+    (tmp_path / "ok.png").write_bytes(b"\x89PNG ok")
+    records = [{"question": f"题 {i}", "image": "ok.png"} for i in range(5)]
+    records.append({"question": "缺图", "image": "missing.png"})
+    source = tmp_path / "mistakes.jsonl"
+    write_jsonl(source, records)
+
+    store = StudyStore(str(tmp_path / "study.db"))
+    try:
+        with pytest.raises(FileNotFoundError):
+            import_mistakes(store, str(source), batch_size=2)
+        assert count(store) == 0
+        write_jsonl(source, records[:-1])
+        assert import_mistakes(store, str(source), batch_size=2)["rows"] == 5
+        assert count(store) == 5
+    finally:
+        store.close()
@@ -0,0 +1,39 @@
+"""加权抽样器: 固定种子可复现, 抽取频率符合权重"""
+from collections import Counter
+
+from study_sampler import WeightedSampler
+
+WEIGHTS = {1: 1.0, 2: 0.5, 3: 0.1, 4: 2.4}
+
+
+def test_fixed_seed_gives_fixed_sequence():
+    first = WeightedSampler(WEIGHTS.items(), seed=42)
+    second = WeightedSampler(WEIGHTS.items(), seed=42)
+    sequence = [first.draw() for _ in range(200)]
+    assert sequence == [second.draw() for _ in range(200)]
+
+    first.reseed(7)
+    again = [first.draw() for _ in range(50)]
+    first.reseed(7)
+    assert again == [first.draw() for _ in range(50)]
+
+
+def test_draws_follow_weights():
+    sampler = WeightedSampler(WEIGHTS.items(), seed=1)
+    draws = 40000
+    counts = Counter(sampler.draw() for _ in range(draws))
+    total = sum(WEIGHTS.values())
+    for key, weight in WEIGHTS.items():
+        expected = draws * weight / total
+        # 二项分布 4 倍标准差以内
+        assert abs(counts[key] - expected) < 4 * (expected * (1 - weight / total)) ** 0.5
+
+
+def test_updates_change_the_distribution():
+    sampler = WeightedSampler(WEIGHTS.items(), seed=3)
+    sampler.remove(4)
+    sampler.set(5, 1.4)
+    sampler.set(1, 0.0)
+    counts = Counter(sampler.draw() for _ in range(20000))
+    assert set(counts) == {2, 3, 5}
+    assert abs(counts[5] / 20000 - 1.4 / 2.0) < 0.02
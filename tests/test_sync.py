@@ -0,0 +1,142 @@
+"""多设备同步: 在本机起 make_server, 两个临时数据库经 HTTP 双向同步"""
+import threading
+
+import pytest
+
+from study_store import StudyStore
+from study_sync import SyncClient, SyncError, make_server, sync
+
+TIE = "2030-01-01T00:00:00.000Z"
+
+
+def serve(server):
+    """在线程中服务; 服务端连接在服务线程中打开, 也要在该线程中关闭"""
+    def run():
+        try:
+            server.serve_forever()
+        finally:
+            if server.store is not None:
+                server.store.close()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+@pytest.fixture
+def remote(tmp_path):
+    """本机同步服务, 返回 (地址, 服务端数据库路径)"""
+    db = str(tmp_path / "server.db")
+    StudyStore(db).close()
+    server = make_server(db)
+    thread = serve(server)
+    yield f"http://127.0.0.1:{server.server_port}", db
+    server.shutdown()
+    thread.join()
+    server.server_close()
+
+
+def questions(store):
+    return dict(store.conn.execute("SELECT uid, question FROM mistakes").fetchall())
+
+
+def set_device(path, device):
+    store = StudyStore(path)
+    store.conn.execute("UPDATE sync_state SET device_id=?", (device,))
+    store.commit()
+    store.close()
+
+
+def test_insert_update_delete_and_images(tmp_path, remote):
+    url, server_db = remote
+    local = StudyStore(str(tmp_path / "local.db"))
+    image = b"\x89PNG" + bytes(range(256)) * 4
+    kept = local.add_mistake("电工", "正弦交流电路", "相量图", image, "概念错误", "相量")
+    dropped = local.add_mistake("电工", "三相交流电路", "线电压", None, "计算错误", "")
+    first = sync(local, url)
+    assert first["pushed"] >= 2 and first["images_out"] == 1
+
+    server = StudyStore(server_db)
+    try:
+        assert questions(server) == questions(local)
+        uid = local.conn.execute("SELECT uid, image_hash FROM mistakes WHERE id=?", (kept,)).fetchone()
+        assert server.load_image(uid[1]) == image
+        # 服务端改一题、加一题 (带图片)
+        server_id = server.conn.execute("SELECT id FROM mistakes WHERE uid=?", (uid[0],)).fetchone()[0]
+        server.record_review(server_id, 2)
+        other = b"\xff\xd8" + bytes(range(200)) * 3
+        server.add_mistake("物化", "相平衡", "杠杆规则", other, "方法错误", "")
+    finally:
+        server.close()
+
+    local.delete_mistake(dropped)
+    second = sync(local, url)
+    assert second["images_in"] == 1 and second["pulled"] >= 2
+
+    server = StudyStore(server_db)
+    try:
+        assert questions(server) == questions(local)
+        assert "线电压" not in questions(server).values()
+        assert local.conn.execute("SELECT mastery_level FROM mistakes WHERE id=?", (kept,)).fetchone()[0] == 2
+        digest = local.conn.execute(
+            "SELECT image_hash FROM mistakes WHERE question='杠杆规则'").fetchone()[0]
+        assert local.load_image(digest) == other
+    finally:
+        server.close()
+
+    # 没有新变更时再同步不移动任何行与图片
+    again = sync(local, url)
+    assert (again["pulled"], again["pushed"], again["images_in"], again["images_out"]) == (0, 0, 0, 0)
+    local.close()
+
+
+@pytest.mark.parametrize("winner", ["server", "local"])
+def test_tie_goes_to_larger_device_id(tmp_path, remote, winner):
+    url, server_db = remote
+    local_db = str(tmp_path / "local.db")
+    set_device(server_db, "ffff" if winner == "server" else "0000")
+    set_device(local_db, "0000" if winner == "server" else "ffff")
+
+    local = StudyStore(local_db)
+    mistake_id = local.add_mistake("电工", "半导体器件", "原题", None, "概念错误", "")
+    sync(local, url)
+    uid = local.conn.execute("SELECT uid FROM mistakes WHERE id=?", (mistake_id,)).fetchone()[0]
+
+    # 两端同一时刻改同一题
+    server = StudyStore(server_db)
+    server.conn.execute("UPDATE mistakes SET question='服务端' WHERE uid=?", (uid,))
+    server.conn.execute("UPDATE change_log SET changed_at=? WHERE key=?", (TIE, uid))
+    server.commit()
+    server.close()
+    local.conn.execute("UPDATE mistakes SET question='本机' WHERE uid=?", (uid,))
+    local.conn.execute("UPDATE change_log SET changed_at=? WHERE key=?", (TIE, uid))
+    local.commit()
+
+    sync(local, url)
+    expected = "服务端" if winner == "server" else "本机"
+    server = StudyStore(server_db)
+    try:
+        assert questions(local)[uid] == questions(server)[uid] == expected
+    finally:
+        server.close()
+        local.close()
+
+
+def test_token_required_off_loopback(tmp_path):
+    db = str(tmp_path / "server.db")
+    with pytest.raises(SyncError):
+        make_server(db, "0.0.0.0", 0)
+
+    server = make_server(db, "0.0.0.0", 0, token="口令")
+    thread = serve(server)
+    url = f"http://127.0.0.1:{server.server_port}"
+    try:
+        with pytest.raises(SyncError, match="401"):
+            SyncClient(url).request("GET", "/device")
+        with pytest.raises(SyncError, match="401"):
+            SyncClient(url, token="错误").request("GET", "/device")
+        assert SyncClient(url, token="口令").request("GET", "/device")["device_id"]
+    finally:
+        server.shutdown()
+        thread.join()
+        server.server_close()
@@ -0,0 +1,82 @@
+"""写后延迟: 崩溃时已 flush 的复习结果保留、积压的整体丢失, 以及写锁被占用时的后台写入"""
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+
+from study_store import StudyStore
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FLUSHED = 20
+BUFFERED = 10
+
+# 子进程: 复习 FLUSHED 题并 flush, 再复习 BUFFERED 题不提交, 然后等待被杀
+WRITER = f'''
+import sys, time
+from study_store import StudyStore
+store = StudyStore(sys.argv[1], write_behind=True)
+for i in range(1, {FLUSHED} + 1):
+    store.record_review(i, 2)
+store.flush()
+for i in range({FLUSHED} + 1, {FLUSHED + BUFFERED} + 1):
+    store.record_review(i, 3)
+print("ready", flush=True)
+time.sleep(60)
+'''
+
+
+def make_db(path, count):
+    store = StudyStore(path)
+    for i in range(count):
+        store.add_mistake("电路", "第一章", f"题目 {i}", None, "计算错误", "")
+    store.close()
+
+
+def test_kill_keeps_flushed_and_drops_buffered(tmp_path):
+    db = str(tmp_path / "study.db")
+    make_db(db, FLUSHED + BUFFERED)
+
+    proc = subprocess.Popen([sys.executable, "-c", WRITER, db], cwd=ROOT,
+                            stdout=subprocess.PIPE, text=True)
+    try:
+        assert proc.stdout.readline().strip() == "ready"
+    finally:
+        proc.kill()
+        proc.wait()
+        proc.stdout.close()
+
+    conn = sqlite3.connect(db)
+    try:
+        assert conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+        reviewed = {row[0]: row[1:] for row in conn.execute(
+            "SELECT id, mastery_level, last_reviewed FROM mistakes WHERE last_reviewed IS NOT NULL")}
+        logged = [row[0] for row in conn.execute("SELECT mistake_id FROM review_log ORDER BY mistake_id")]
+        assert sorted(reviewed) == list(range(1, FLUSHED + 1))
+        assert all(mastery == 2 for mastery, _ in reviewed.values())
+        # 没有半条记录: 复习日志与错题的更新要么同时存在, 要么都不存在
+        assert logged == sorted(reviewed)
+        untouched = conn.execute(
+            "SELECT COUNT(*) FROM mistakes WHERE id > ? AND mastery_level = 0 AND repetitions = 0",
+            (FLUSHED,)).fetchone()[0]
+        assert untouched == BUFFERED
+    finally:
+        conn.close()
+
+
+def test_thumbnail_save_does_not_wait_for_write_behind_lock(tmp_path):
+    db = str(tmp_path / "study.db")
+    make_db(db, 1)
+    gui = StudyStore(db, write_behind=True)
+    worker = StudyStore(db)
+    try:
+        gui.record_review(1, 2)
+        start = time.perf_counter()
+        assert worker.save_thumbnail("abc", 400, b"png") is False
+        assert time.perf_counter() - start < 1
+        gui.flush()
+        assert worker.save_thumbnail("abc", 400, b"png") is True
+        assert worker.load_thumbnail("abc", 400) == b"png"
+    finally:
+        worker.close()
+        gui.close()
@@ -1,70 +1,124 @@
+import time
+_STARTED = time.perf_counter()
+import sys
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-from PIL import Image, ImageTk
 import sqlite3
 import os
-import matplotlib
-matplotlib.use('TkAgg')
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from matplotlib.figure import Figure
-import matplotlib.pyplot as plt
-import appdirs
-from datetime import datetime
-from io import BytesIO
-import random
-
-# 字体配置增强
-plt.rcParams['font.sans-serif'] = ['Microsoft YaHei']
-plt.rcParams['axes.unicode_minus'] = False
-
-# 数据存储路径优化
-DATA_DIR = appdirs.user_data_dir("StudyMasterPro", "StudyMaster")
-DB_PATH = os.path.join(DATA_DIR, "study_data_v5.db")
-os.makedirs(DATA_DIR, exist_ok=True)
+from study_store import (StudyStore, COURSE_CATALOG, ERROR_TYPES,
+                         MISTAKE_PAGE_SIZE, ARCHIVE_PERIOD)
+from study_images import ThumbnailCache, make_thumbnail, normalize_image
+from study_worker import BackgroundWorker
+from study_charts import AnalyticsCharts
+from study_migrations import image_hash
+import study_io
+import study_archive
+import study_images
+import study_maintenance
+from study_profiler import Profiler
+from study_session import ReviewSession, REVIEW_SESSION_SIZE
+_IMPORTED = time.perf_counter()
+
+# matplotlib 与 PIL 在首次需要时才导入, 冷启动预算 (毫秒) 只覆盖到首个可交互窗口
+STARTUP_BUDGET_MS = 800
+# 复习结果写后延迟提交的间隔
+WRITE_BEHIND_FLUSH_MS = 2000
+# 性能调试页的刷新间隔
+PROFILE_REFRESH_MS = 1000
+# 空闲维护: 检查间隔、判定空闲的无操作秒数、两次 PRAGMA optimize 的最小间隔
+MAINTENANCE_INTERVAL_MS = 60000
+MAINTENANCE_IDLE_S = 30
+OPTIMIZE_INTERVAL_S = 3600
+# 启动后多久在后台做一次 quick_check
+QUICK_CHECK_DELAY_MS = 10000
+# 剖析模式下计时的界面处理函数
+PROFILED_HANDLERS = (
+    "load_mistakes", "append_mistake_page", "show_mistake_detail", "fill_mistake_detail",
+    "random_review", "due_review", "show_review_card", "run_search", "show_search_results",
+    "update_analytics", "refresh_analytics", "apply_analytics", "load_course_tree",
+)
+
+
+def setup_matplotlib():
+    """首次打开学习分析页时导入 matplotlib"""
+    import matplotlib
+    matplotlib.use('TkAgg')
+    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+    from matplotlib.figure import Figure
+    # 字体配置增强
+    matplotlib.rcParams['font.sans-serif'] = ['Microsoft YaHei']
+    matplotlib.rcParams['axes.unicode_minus'] = False
+    return Figure, FigureCanvasTkAgg
+
+
+def load_retention(store):
+    """复习日志的保持率分析; 未安装 NumPy 时跳过"""
+    try:
+        import study_retention
+    except ImportError:
+        return None
+    return study_retention.retention_report(store)
+
 
 class StudyMasterPro:
-    def __init__(self):
+    def __init__(self, startup_timing=False, profile_path=None):
+        self.startup_timing = startup_timing
+        self.startup_phases = [("imports", _IMPORTED)]
+        self.profile_path = profile_path
+        self.profiler = Profiler() if profile_path else None
         self.setup_database()
+        self.mark_startup("database")
         self.root = tk.Tk()
+        self.mark_startup("tk")
         self.root.title("智能学习管理系统 v9.0")
         self.root.geometry("1200x800")
         self.current_image = None
+        self.review_win = None
+        self.review_session = None
+        self.thumbnails = ThumbnailCache()
+        self.worker = BackgroundWorker(self.root, self.store.db_path, profiler=self.profiler)
+        if self.profiler is not None:
+            self.install_profiler()
+        # 分析页只在可见且数据变化时刷新, 多次请求合并为一次
+        self.analytics_dirty = True
+        self.analytics_after = None
         self.build_interface()
+        self.mark_startup("interface")
         self.load_initial_data()
+        self.mark_startup("initial data")
         self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.setup_maintenance()
+        # 主循环处理完首批事件 (窗口已映射) 即视为可交互
+        self.root.after_idle(self.report_startup)
         self.root.mainloop()
 
+    def mark_startup(self, phase):
+        """记录启动阶段的完成时刻"""
+        self.startup_phases.append((phase, time.perf_counter()))
+
+    def report_startup(self):
+        """启动计时模式下输出各阶段耗时并退出"""
+        self.mark_startup("first idle")
+        if not self.startup_timing:
+            return
+        last = _STARTED
+        for phase, at in self.startup_phases:
+            print(f"{phase:<14}{(at - last) * 1000:8.1f} ms", file=sys.stderr)
+            last = at
+        total = (last - _STARTED) * 1000
+        verdict = "OK" if total <= STARTUP_BUDGET_MS else "超出预算"
+        print(f"{'total':<14}{total:8.1f} ms  (预算 {STARTUP_BUDGET_MS} ms, {verdict})", file=sys.stderr)
+        self.startup_exit_code = 0 if total <= STARTUP_BUDGET_MS else 1
+        self.worker.close()
+        self.store.close()
+        self.root.destroy()
+
     def setup_database(self):
         """完整的数据库初始化"""
-        self.conn = sqlite3.connect(DB_PATH)
-        self.cursor = self.conn.cursor()
-        
-        # 课程表
-        self.cursor.execute('''CREATE TABLE IF NOT EXISTS courses (
-            id INTEGER PRIMARY KEY,
-            course_type TEXT,
-            chapter TEXT,
-            resource_type TEXT,
-            completed INTEGER DEFAULT 0,
-            last_updated TEXT,
-            sort_order INTEGER
-        )''')
-        
-        # 错题表
-        self.cursor.execute('''CREATE TABLE IF NOT EXISTS mistakes (
-            id INTEGER PRIMARY KEY,
-            course_type TEXT,
-            chapter TEXT,
-            question TEXT,
-            image BLOB,
-            error_type TEXT,
-            tags TEXT,
-            mastery_level INTEGER DEFAULT 0,
-            probability REAL DEFAULT 1.0,
-            created_at TEXT,
-            last_reviewed TEXT
-        )''')
-        self.conn.commit()
+        self.store = StudyStore(write_behind=True)
+        if self.profiler is not None:
+            self.profiler.attach(self.store.conn)
+        self.flush_after = None
 
     def build_interface(self):
         """完整的界面构建"""
@@ -80,7 +134,62 @@ class StudyMasterPro:
         self.notebook.add(self.course_frame, text="课程进度")
         self.notebook.add(self.mistake_frame, text="错题管理")
         self.notebook.add(self.analytics_frame, text="学习分析")
+        if self.profiler is not None:
+            self.profile_frame = self.create_profile_tab()
+            self.notebook.add(self.profile_frame, text="性能")
         self.notebook.pack(expand=True, fill='both')
+        self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
+
+    def install_profiler(self):
+        """给热点处理函数与图片解码加计时; 必须在构建界面 (绑定按钮命令) 之前调用"""
+        for name in PROFILED_HANDLERS:
+            self.profiler.wrap(self, name)
+        self.profiler.wrap(ThumbnailCache, "decode", "image", "ThumbnailCache.decode")
+        self.profiler.wrap(study_images, "make_thumbnail", "image")
+
+    def create_profile_tab(self):
+        """性能调试页: 各处理函数的实时耗时统计"""
+        frame = ttk.Frame(self.notebook)
+        columns = ('count', 'mean', 'p95', 'max', 'sql')
+        self.profile_tree = ttk.Treeview(frame, columns=columns, show='tree headings')
+        self.profile_tree.heading('#0', text='处理函数', anchor='w')
+        for column, text in zip(columns, ('次数', '平均 (ms)', 'p95 (ms)', '最大 (ms)', 'SQL/次')):
+            self.profile_tree.heading(column, text=text)
+            self.profile_tree.column(column, width=100, anchor='e')
+        self.profile_tree.column('#0', width=250)
+        self.profile_tree.pack(fill='both', expand=True)
+
+        ctrl_frame = ttk.Frame(frame)
+        self.profile_label = ttk.Label(ctrl_frame, text="")
+        self.profile_label.pack(side='left', padx=5)
+        ttk.Button(ctrl_frame, text="导出 trace", command=self.dump_profile).pack(side='right', padx=5)
+        ttk.Button(ctrl_frame, text="清空", command=self.profiler.clear).pack(side='right', padx=5)
+        ctrl_frame.pack(fill='x', pady=5)
+        self.root.after(PROFILE_REFRESH_MS, self.refresh_profile)
+        return frame
+
+    def refresh_profile(self):
+        """调试页可见时刷新统计"""
+        self.root.after(PROFILE_REFRESH_MS, self.refresh_profile)
+        if self.notebook.select() != str(self.profile_frame):
+            return
+        self.profile_tree.delete(*self.profile_tree.get_children())
+        for name, count, mean, p95, worst, sql in self.profiler.summary():
+            self.profile_tree.insert("", "end", text=name, values=(
+                count, f"{mean:.1f}", f"{p95:.1f}", f"{worst:.1f}", f"{sql:.1f}"))
+        self.profile_label.config(text=f"SQL 语句共 {self.profiler.sql_total} 条")
+
+    def dump_profile(self):
+        """导出 Chrome trace JSON"""
+        path = filedialog.asksaveasfilename(
+            title="导出 trace",
+            initialfile=os.path.basename(self.profile_path),
+            defaultextension=".json",
+            filetypes=[("Chrome trace", "*.json")]
+        )
+        if path:
+            self.profiler.dump(path)
+            messagebox.showinfo("导出完成", f"已写入 {path}, 可在 chrome://tracing 或 Perfetto 中打开")
 
     def create_course_tab(self):
         """课程管理页完整实现"""
@@ -100,6 +209,10 @@ class StudyMasterPro:
         self.tree_menu = tk.Menu(self.root, tearoff=0)
         self.tree_menu.add_command(label="切换状态", command=self.toggle_status)
         self.course_tree.bind("<Button-3>", self.show_context_menu)
+        self.course_tree.bind("<<TreeviewOpen>>", self.expand_course_node)
+        # 资源节点 iid -> courses 表 id; 章节节点 iid -> 尚未插入的资源行
+        self.course_ids = {}
+        self.pending_resources = {}
         
         return frame
 
@@ -114,6 +227,9 @@ class StudyMasterPro:
         """错题管理页完整实现"""
         frame = ttk.Frame(self.notebook)
         
+        # 检索栏
+        self.create_search_bar(frame)
+        
         # 错题列表
         columns = ("id", "课程", "章节", "错误类型", "掌握程度", "添加时间")
         self.mistake_tree = ttk.Treeview(
@@ -125,8 +241,16 @@ class StudyMasterPro:
         for col in columns:
             self.mistake_tree.heading(col, text=col)
             self.mistake_tree.column(col, width=120, anchor='center')
+        self.mistake_scroll = ttk.Scrollbar(frame, orient='vertical', command=self.mistake_tree.yview)
+        self.mistake_tree.configure(yscrollcommand=self.on_mistake_scroll)
         self.mistake_tree.pack(side='left', fill='both', expand=True)
+        self.mistake_scroll.pack(side='left', fill='y')
         self.mistake_tree.bind("<<TreeviewSelect>>", self.show_mistake_detail)
+        # 按需分页: iid 为错题 id, 记录每行排序键与下一页游标
+        self.mistake_keys = {}
+        self.mistake_cursor = None
+        self.loading_more = False
+        self.search_active = False
         
         # 右键菜单
         self.mistake_menu = tk.Menu(self.root, tearoff=0)
@@ -144,10 +268,25 @@ class StudyMasterPro:
         
         # 控制按钮
         ctrl_frame = ttk.Frame(detail_frame)
-        ttk.Button(ctrl_frame, text="随机复习", command=self.random_review).pack(side='left', padx=5)
+        self.review_mode = ttk.Combobox(
+            ctrl_frame,
+            values=["随机复习", "间隔复习"],
+            state="readonly",
+            width=8
+        )
+        self.review_mode.current(0)
+        self.review_mode.pack(side='left', padx=5)
+        ttk.Button(ctrl_frame, text="开始复习", command=self.start_review).pack(side='left', padx=5)
         ttk.Button(ctrl_frame, text="标记掌握", command=lambda: self.update_mastery(2)).pack(side='left', padx=5)
         ttk.Button(ctrl_frame, text="仍需复习", command=lambda: self.update_mastery(1)).pack(side='left', padx=5)
         ctrl_frame.pack(pady=5)
+        io_frame = ttk.Frame(detail_frame)
+        ttk.Button(io_frame, text="批量导入", command=self.import_mistakes).pack(side='left', padx=5)
+        ttk.Button(io_frame, text="导出备份", command=self.export_mistakes).pack(side='left', padx=5)
+        ttk.Button(io_frame, text="数据库维护", command=self.show_maintenance_window).pack(side='left', padx=5)
+        io_frame.pack(pady=5)
+        self.due_label = ttk.Label(detail_frame, text="")
+        self.due_label.pack()
         
         # 录入表单
         form_frame = ttk.LabelFrame(frame, text="新增错题")
@@ -157,6 +296,86 @@ class StudyMasterPro:
         detail_frame.pack(side='right', fill='both', expand=True, padx=10)
         return frame
 
+    def create_search_bar(self, parent):
+        """全文检索与过滤条件"""
+        bar = ttk.Frame(parent)
+        ttk.Label(bar, text="搜索:").pack(side='left')
+        self.search_entry = ttk.Entry(bar, width=24)
+        self.search_entry.pack(side='left', padx=5)
+        self.search_entry.bind("<Return>", lambda e: self.run_search())
+
+        self.search_course = ttk.Combobox(bar, values=["全部课程"] + list(COURSE_CATALOG),
+                                          state="readonly", width=8)
+        self.search_course.current(0)
+        self.search_course.pack(side='left', padx=5)
+        self.search_course.bind("<<ComboboxSelected>>", self.update_search_chapters)
+
+        self.search_chapter = ttk.Combobox(bar, values=["全部章节"], state="readonly", width=18)
+        self.search_chapter.current(0)
+        self.search_chapter.pack(side='left', padx=5)
+
+        self.search_error = ttk.Combobox(bar, values=["全部类型"] + ERROR_TYPES,
+                                         state="readonly", width=8)
+        self.search_error.current(0)
+        self.search_error.pack(side='left', padx=5)
+
+        ttk.Label(bar, text="标签:").pack(side='left')
+        self.search_tag = ttk.Combobox(bar, width=10,
+                                       postcommand=lambda: self.search_tag.configure(
+                                           values=self.store.tag_names()))
+        self.search_tag.pack(side='left', padx=5)
+
+        ttk.Button(bar, text="搜索", command=self.run_search).pack(side='left', padx=5)
+        ttk.Button(bar, text="清除", command=self.clear_search).pack(side='left')
+        bar.pack(side='top', fill='x', padx=5, pady=5)
+
+    def update_search_chapters(self, event=None):
+        """检索栏的章节选项随课程变化"""
+        course = self.search_course.get()
+        chapters = self.get_chapters(course) if course in COURSE_CATALOG else []
+        self.search_chapter['values'] = ["全部章节"] + chapters
+        self.search_chapter.current(0)
+
+    def run_search(self):
+        """按检索栏条件在后台检索错题"""
+        text = self.search_entry.get().strip()
+        course = self.search_course.get() if self.search_course.current() > 0 else None
+        chapter = self.search_chapter.get() if self.search_chapter.current() > 0 else None
+        error_type = self.search_error.get() if self.search_error.current() > 0 else None
+        tag = self.search_tag.get().strip() or None
+        if not any([text, course, chapter, error_type, tag]):
+            self.clear_search()
+            return
+        self.worker.submit(
+            lambda store: store.search_mistakes(text, course, chapter, error_type, tag),
+            self.show_search_results,
+            lambda e: messagebox.showerror("搜索错误", f"检索失败: {str(e)}"),
+            channel="search"
+        )
+
+    def show_search_results(self, rows):
+        """用检索结果替换错题列表 (不分页)"""
+        self.worker.cancel("page")
+        self.search_active = True
+        self.mistake_tree.delete(*self.mistake_tree.get_children())
+        self.mistake_keys.clear()
+        self.mistake_cursor = None
+        for row in rows:
+            iid = str(row[0])
+            self.mistake_tree.insert("", "end", iid=iid, values=row[:6])
+            self.mistake_keys[iid] = (row[6], row[0])
+
+    def clear_search(self):
+        """清空检索条件并恢复完整列表"""
+        self.search_entry.delete(0, tk.END)
+        self.search_course.current(0)
+        self.update_search_chapters()
+        self.search_error.current(0)
+        self.search_tag.set('')
+        self.worker.cancel("search")
+        self.search_active = False
+        self.load_mistakes()
+
     def show_mistake_menu(self, event):
         """显示错题右键菜单"""
         item = self.mistake_tree.identify_row(event.y)
@@ -169,9 +388,11 @@ class StudyMasterPro:
         selected = self.mistake_tree.selection()
         if selected:
             item_id = self.mistake_tree.item(selected[0], "values")[0]
-            self.cursor.execute("DELETE FROM mistakes WHERE id=?", (item_id,))
-            self.conn.commit()
+            self.store.delete_mistake(item_id)
             self.mistake_tree.delete(selected[0])
+            self.mistake_keys.pop(selected[0], None)
+            self.update_due_count()
+            self.mark_analytics_dirty()
             messagebox.showinfo("提示", "记录删除成功")
 
     def create_mistake_form(self, parent):
@@ -185,7 +406,7 @@ class StudyMasterPro:
         course_combo = ttk.Combobox(
             row0, 
             textvariable=self.course_var,
-            values=["物化", "电工"],
+            values=list(COURSE_CATALOG),
             state="readonly",
             width=15
         )
@@ -212,7 +433,7 @@ class StudyMasterPro:
         error_combo = ttk.Combobox(
             row2,
             textvariable=self.error_var,
-            values=["概念错误", "计算错误", "审题错误", "方法错误"],
+            values=ERROR_TYPES,
             width=15
         )
         error_combo.pack(side='left', padx=5)
@@ -255,119 +476,102 @@ class StudyMasterPro:
         self.recommendation_list.pack(fill='both', expand=True)
         rec_frame.pack(side='left', fill='both', expand=True, padx=5, pady=5)
         
-        # 可视化面板
+        # 可视化面板, Figure 在首次显示时创建
         fig_frame = ttk.LabelFrame(frame, text="学习分析")
-        self.figure = Figure(figsize=(8, 6), dpi=100)
-        self.canvas = FigureCanvasTkAgg(self.figure, fig_frame)
-        self.canvas.get_tk_widget().pack(fill='both', expand=True)
+        self.fig_frame = fig_frame
+        self.charts = None
         
         # 控制面板
         ctrl_frame = ttk.Frame(fig_frame)
+        self.analytics_ctrl = ctrl_frame
         ttk.Button(ctrl_frame, text="刷新图表", command=self.update_analytics).pack(side='left', padx=5)
         self.period_var = ttk.Combobox(
             ctrl_frame, 
-            values=["最近一周", "最近一月", "全部数据"],
+            values=["最近一周", "最近一月", "全部数据", ARCHIVE_PERIOD],
             state="readonly",
             width=10
         )
         self.period_var.current(0)
         self.period_var.pack(side='left', padx=5)
+        self.period_var.bind("<<ComboboxSelected>>", lambda e: self.update_analytics())
+        ttk.Button(ctrl_frame, text="归档旧学期", command=self.archive_old_terms).pack(side='left', padx=5)
         ctrl_frame.pack(fill='x', pady=5)
         fig_frame.pack(side='right', fill='both', expand=True, padx=5, pady=5)
         
         return frame
 
+    def ensure_charts(self):
+        """首次需要时导入 matplotlib 并创建 Figure"""
+        if self.charts is None:
+            Figure, FigureCanvasTkAgg = setup_matplotlib()
+            self.figure = Figure(figsize=(8, 6), dpi=100)
+            self.canvas = FigureCanvasTkAgg(self.figure, self.fig_frame)
+            self.canvas.get_tk_widget().pack(fill='both', expand=True, before=self.analytics_ctrl)
+            if self.profiler is not None:
+                self.profiler.wrap(self.canvas, "draw", "chart", "canvas.draw")
+            self.charts = AnalyticsCharts(self.figure, self.canvas)
+        return self.charts
+
     def load_initial_data(self):
         """完整的初始化流程"""
         try:
-            # 物理化学课程结构
-            pc_courses = [
-                ("热力学第一定律", 1),
-                ("热力学第二定律", 2),
-                ("多组分系统热力学", 3),
-                ("化学平衡", 4),
-                ("相平衡", 5),
-                ("化学动力学", 6),
-                ("电化学", 7),
-                ("界面现象", 8),
-                ("胶体化学", 9)
-            ]
-            
-            # 电工课程结构
-            ee_courses = [
-                ("电路的基本概念与基本定律", 1),
-                ("电路的基本定律和分析方法", 2),
-                ("正弦交流电路", 3),
-                ("三相交流电路", 4),
-                ("电路的暂态分析", 5),
-                ("磁路与铁心线圈电路", 6),
-                ("异步电动机", 7),
-                ("继电接触控制系统", 8),
-                ("半导体器件", 9),
-                ("三极管和基本放大电路", 10),
-                ("集成运放电路", 11),
-                ("电子电路中的反馈", 12),
-                ("直流稳压电源", 13)
-            ]
-            
-            # 初始化物理化学课程
-            parent = self.course_tree.insert("", "end", text="物化")
-            for chapter, order in pc_courses:
-                node = self.course_tree.insert(parent, "end", text=chapter)
-                for res in ["ppt", "作业"]:
-                    self.course_tree.insert(node, "end", text=res, values=("未开始", datetime.now().strftime("%Y-%m-%d")))
-                    self.cursor.execute('''
-                        INSERT OR IGNORE INTO courses 
-                        (course_type, chapter, resource_type, sort_order)
-                        VALUES (?, ?, ?, ?)
-                    ''', ("物化", chapter, res, order))
-            
-            # 初始化电工课程
-            parent = self.course_tree.insert("", "end", text="电工")
-            for chapter, order in ee_courses:
-                node = self.course_tree.insert(parent, "end", text=chapter)
-                for res in ["ppt", "作业"]:
-                    self.course_tree.insert(node, "end", text=res, values=("未开始", datetime.now().strftime("%Y-%m-%d")))
-                    self.cursor.execute('''
-                        INSERT OR IGNORE INTO courses 
-                        (course_type, chapter, resource_type, sort_order)
-                        VALUES (?, ?, ?, ?)
-                    ''', ("电工", chapter, res, order))
-            
-            self.conn.commit()
+            self.store.seed_courses()
+            self.load_course_tree()
             self.load_mistakes()
-            self.update_analytics()
+            self.update_due_count()
         except Exception as e:
             messagebox.showerror("初始化错误", f"数据加载失败: {str(e)}")
 
+    def load_course_tree(self):
+        """一次查询构建课程树; 资源节点在章节首次展开时才插入"""
+        self.course_tree.delete(*self.course_tree.get_children())
+        self.course_ids.clear()
+        self.pending_resources.clear()
+        course_node = chapter_node = None
+        last_course = last_chapter = None
+        for row in self.store.list_courses():
+            course_id, course_type, chapter, resource, completed, updated = row
+            if course_type != last_course:
+                course_node = self.course_tree.insert("", "end", text=course_type)
+                last_course, last_chapter = course_type, None
+            if chapter != last_chapter:
+                chapter_node = self.course_tree.insert(course_node, "end", text=chapter)
+                # 占位子节点让章节显示展开标记
+                self.course_tree.insert(chapter_node, "end", text="...")
+                self.pending_resources[chapter_node] = []
+                last_chapter = chapter
+            self.pending_resources[chapter_node].append((course_id, resource, completed, updated))
+
+    def expand_course_node(self, event=None):
+        """展开章节时插入其资源节点"""
+        node = self.course_tree.focus()
+        resources = self.pending_resources.pop(node, None)
+        if resources is None:
+            return
+        self.course_tree.delete(*self.course_tree.get_children(node))
+        for course_id, resource, completed, updated in resources:
+            iid = f"course-{course_id}"
+            self.course_tree.insert(node, "end", iid=iid, text=resource,
+                                    values=self.course_status_values(completed, updated))
+            self.course_ids[iid] = course_id
+
+    @staticmethod
+    def course_status_values(completed, updated):
+        """资源节点的 (完成状态, 最后更新日期) 列"""
+        return ("已完成" if completed else "未开始", (updated or "")[:10])
+
     def toggle_status(self):
-        """可靠的课程状态切换"""
+        """按主键切换课程资源的完成状态"""
         selected = self.course_tree.selection()
         if selected:
-            item = self.course_tree.item(selected[0])
-            current_status = item['values'][0] if item['values'] else "未开始"
-            new_status = "已完成" if current_status == "未开始" else "未开始"
-            
-            # 获取课程路径
-            path = []
-            current_item = selected[0]
-            while current_item:
-                path.insert(0, self.course_tree.item(current_item, "text"))
-                current_item = self.course_tree.parent(current_item)
-            
-            if len(path) == 3:
-                course_type, chapter, resource = path
-                self.cursor.execute('''
-                    UPDATE courses 
-                    SET completed=?, last_updated=?
-                    WHERE course_type=? AND chapter=? AND resource_type=?
-                ''', (1 if new_status == "已完成" else 0, 
-                     datetime.now().isoformat(),
-                     course_type, chapter, resource))
-                self.conn.commit()
-                self.course_tree.item(selected[0], values=(new_status, datetime.now().strftime("%Y-%m-%d")))
-            else:
+            course_id = self.course_ids.get(selected[0])
+            if course_id is None:
                 messagebox.showwarning("操作错误", "请选择具体的资源节点")
+                return
+            completed = self.course_tree.item(selected[0], "values")[0] != "已完成"
+            updated = self.store.set_course_status(course_id, completed)
+            self.course_tree.item(selected[0], values=self.course_status_values(completed, updated))
+            self.mark_analytics_dirty()
 
     def update_chapters(self, event=None):
         """动态更新章节选项"""
@@ -376,32 +580,37 @@ class StudyMasterPro:
 
     def get_chapters(self, course):
         """从数据库获取章节数据"""
-        self.cursor.execute('''
-            SELECT DISTINCT chapter 
-            FROM courses 
-            WHERE course_type=? 
-            ORDER BY sort_order
-        ''', (course,))
-        return [row[0] for row in self.cursor.fetchall()]
+        return self.store.get_chapters(course)
 
     def upload_image(self):
         """图片上传功能"""
         path = filedialog.askopenfilename(
             title="选择题目图片",
-            filetypes=[("图片文件", "*.png *.jpg *.jpeg")]
+            filetypes=[("图片文件", "*.png *.jpg *.jpeg *.webp *.bmp")]
         )
         if path:
-            try:
+            def load(store):
                 with open(path, "rb") as f:
-                    self.current_image = f.read()
-                img = Image.open(BytesIO(self.current_image))
-                img.thumbnail((300, 300))
-                photo = ImageTk.PhotoImage(img)
+                    raw = f.read()
+                # 缩小、去元数据并重新编码后再入库
+                data = normalize_image(raw)
+                return data, len(raw), image_hash(data), ThumbnailCache.decode(make_thumbnail(data, 300))
+
+            def done(result):
+                data, raw_size, digest, img = result
+                self.current_image = data
+                photo = self.thumbnails.cached(digest, 300) or self.thumbnails.remember((digest, 300), img)
                 self.image_label.config(image=photo)
                 self.image_label.image = photo
-                self.image_path.config(text=os.path.basename(path))
-            except Exception as e:
-                messagebox.showerror("图片错误", f"图片加载失败: {str(e)}")
+                self.image_path.config(text=(
+                    f"{os.path.basename(path)} ({raw_size / 1024:.0f} KB → {len(data) / 1024:.0f} KB)"))
+
+            self.image_path.config(text="读取中...")
+            self.worker.submit(
+                load, done,
+                lambda e: messagebox.showerror("图片错误", f"图片加载失败: {str(e)}"),
+                channel="upload"
+            )
 
     def submit_mistake(self):
         """提交错题完整流程"""
@@ -410,27 +619,17 @@ class StudyMasterPro:
             return
         
         try:
-            self.cursor.execute('''
-                INSERT INTO mistakes (
-                    course_type, 
-                    chapter, 
-                    question, 
-                    image, 
-                    error_type, 
-                    tags, 
-                    created_at
-                ) VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (
+            mistake_id = self.store.add_mistake(
                 self.course_var.get(),
                 self.chapter_var.get(),
                 self.detail_text.get("1.0", "end-1c"),
                 self.current_image,
                 self.error_var.get(),
-                self.tag_entry.get(),
-                datetime.now().isoformat()
-            ))
-            self.conn.commit()
-            self.load_mistakes()
+                self.tag_entry.get()
+            )
+            self.refresh_mistake_row(mistake_id)
+            self.update_due_count()
+            self.mark_analytics_dirty()
             self.clear_form()
             messagebox.showinfo("成功", "错题记录已保存")
         except sqlite3.Error as e:
@@ -447,207 +646,660 @@ class StudyMasterPro:
         self.image_label.config(image=None)
         self.image_path.config(text="未选择图片")
 
+    def import_mistakes(self):
+        """从 zip / JSONL / CSV 批量导入错题, 在后台线程按批写入"""
+        path = filedialog.askopenfilename(
+            title="选择导入文件",
+            filetypes=[("错题数据", "*.zip *.jsonl *.csv")]
+        )
+        if not path:
+            return
+        self.flush_writes()
+
+        def done(stats):
+            self.store.invalidate_sampler()
+            self.load_mistakes()
+            self.update_due_count()
+            self.mark_analytics_dirty()
+            messagebox.showinfo("导入完成", (
+                f"导入 {stats['rows']} 条错题、{stats['images']} 张图片, "
+                f"用时 {stats['seconds']} 秒 ({stats['rows_per_s']} 条/秒)"
+            ))
+
+        self.worker.submit(
+            lambda store: study_io.import_mistakes(store, path), done,
+            lambda e: messagebox.showerror("导入失败", f"导入失败: {str(e)}"),
+            channel="io"
+        )
+
+    def export_mistakes(self):
+        """把全部错题与图片导出为 zip"""
+        path = filedialog.asksaveasfilename(
+            title="导出错题",
+            defaultextension=".zip",
+            filetypes=[("zip 压缩包", "*.zip")]
+        )
+        if not path:
+            return
+        self.flush_writes()
+
+        def done(stats):
+            message = (f"导出 {stats['rows']} 条错题、{stats['images']} 张图片, "
+                       f"用时 {stats['seconds']} 秒 ({stats['mb_per_s']} MB/秒)")
+            if stats["missing_images"]:
+                messagebox.showwarning("导出完成", message + (
+                    f"\n\n{stats['missing_images']} 条错题引用的图片已不存在, 已按无图片导出。"))
+            else:
+                messagebox.showinfo("导出完成", message)
+
+        self.worker.submit(
+            lambda store: study_io.export_mistakes(store, path), done,
+            lambda e: messagebox.showerror("导出失败", f"导出失败: {str(e)}"),
+            channel="io"
+        )
+
     def load_mistakes(self):
-        """加载错题数据到列表"""
+        """重新加载错题列表的第一页"""
         self.mistake_tree.delete(*self.mistake_tree.get_children())
-        self.cursor.execute('''
-            SELECT 
-                id,
-                course_type,
-                chapter,
-                error_type,
-                CASE mastery_level
-                    WHEN 2 THEN '已掌握'
-                    WHEN 1 THEN '需复习'
-                    ELSE '未学习' END,
-                strftime('%Y-%m-%d %H:%M', created_at)
-            FROM mistakes
-            ORDER BY last_reviewed DESC
-        ''')
-        for row in self.cursor.fetchall():
-            self.mistake_tree.insert("", "end", values=row)
+        self.mistake_keys.clear()
+        self.mistake_cursor = None
+        self.worker.cancel("page")
+        self.loading_more = False
+        self.append_mistake_page(self.store.list_mistakes())
+
+    def append_mistake_page(self, rows):
+        """把一页错题追加到列表末尾, 并更新下一页游标"""
+        for row in rows:
+            iid = str(row[0])
+            self.mistake_tree.insert("", "end", iid=iid, values=row[:6])
+            self.mistake_keys[iid] = (row[6], row[0])
+        if len(rows) < MISTAKE_PAGE_SIZE:
+            self.mistake_cursor = None
+        else:
+            self.mistake_cursor = (rows[-1][6], rows[-1][0])
+
+    def on_mistake_scroll(self, first, last):
+        """滚动接近底部时加载下一页"""
+        self.mistake_scroll.set(first, last)
+        if float(last) > 0.9 and self.mistake_cursor is not None and not self.loading_more:
+            self.loading_more = True
+            self.root.after_idle(self.load_more_mistakes)
+
+    def load_more_mistakes(self):
+        """在后台按游标读取下一页"""
+        cursor = self.mistake_cursor
+        if cursor is None:
+            self.loading_more = False
+            return
+
+        def done(rows):
+            self.loading_more = False
+            self.append_mistake_page(rows)
+
+        def failed(e):
+            self.loading_more = False
+            messagebox.showerror("数据库错误", f"加载失败: {str(e)}")
+
+        self.worker.submit(lambda store: store.list_mistakes(after=cursor),
+                           done, failed, channel="page")
+
+    def refresh_mistake_row(self, mistake_id):
+        """单行增量刷新: 删除旧行, 再按排序键插回已加载区域"""
+        iid = str(mistake_id)
+        if self.search_active:
+            # 检索结果只原地更新已显示的行
+            if self.mistake_tree.exists(iid):
+                row = self.store.mistake_row(mistake_id)
+                if row is not None:
+                    self.mistake_tree.item(iid, values=row[:6])
+            return
+        selected = self.mistake_tree.selection()
+        if self.mistake_tree.exists(iid):
+            self.mistake_tree.delete(iid)
+            self.mistake_keys.pop(iid, None)
+        row = self.store.mistake_row(mistake_id)
+        if row is None:
+            return
+        key = (row[6], row[0])
+        # 列表按排序键降序排列, 二分查找插入位置
+        children = self.mistake_tree.get_children()
+        lo, hi = 0, len(children)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.mistake_keys[children[mid]] > key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == len(children) and self.mistake_cursor is not None:
+            # 落在尚未加载的部分, 翻页时自然会读到
+            return
+        self.mistake_tree.insert("", lo, iid=iid, values=row[:6])
+        self.mistake_keys[iid] = key
+        if iid in selected:
+            self.mistake_tree.selection_set(iid)
 
     def show_mistake_detail(self, event):
-        """显示错题详细信息"""
+        """显示错题详细信息 (后台读取, 只显示最后一次选中的行)"""
         selected = self.mistake_tree.selection()
         if selected:
             item_id = self.mistake_tree.item(selected[0], "values")[0]
-            self.cursor.execute("SELECT * FROM mistakes WHERE id=?", (item_id,))
-            mistake = self.cursor.fetchone()
-            
-            # 更新文本详情
-            self.detail_text.delete(1.0, tk.END)
-            self.detail_text.insert(tk.END, mistake[3])
-            
-            # 更新图片预览
-            if mistake[4]:
-                try:
-                    img = Image.open(BytesIO(mistake[4]))
-                    img.thumbnail((400, 400))
-                    photo = ImageTk.PhotoImage(img)
-                    self.image_label.config(image=photo)
-                    self.image_label.image = photo
-                except Exception as e:
-                    messagebox.showerror("图片错误", f"无法加载图片: {str(e)}")
-            else:
-                self.image_label.config(image=None)
+
+            def load(store):
+                # 缓存只在主线程读写: 工作线程查到的命中在回调前可能已被淘汰
+                mistake = store.get_mistake(item_id)
+                img = None
+                if mistake and mistake[4]:
+                    img = ThumbnailCache.prepare(store, mistake[4], 400)
+                return mistake, img
+
+            self.worker.submit(
+                load, self.fill_mistake_detail,
+                lambda e: messagebox.showerror("图片错误", f"无法加载图片: {str(e)}"),
+                channel="detail"
+            )
+
+    def fill_mistake_detail(self, result):
+        """把后台读取的错题显示到详情面板"""
+        mistake, img = result
+        if mistake is None:
+            return
+        
+        # 更新文本详情
+        self.detail_text.delete(1.0, tk.END)
+        self.detail_text.insert(tk.END, mistake[3])
+        
+        # 更新图片预览
+        photo = None
+        if mistake[4]:
+            photo = self.thumbnails.cached(mistake[4], 400)
+            if photo is None and img is not None:
+                photo = self.thumbnails.remember((mistake[4], 400), img)
+        if photo is not None:
+            self.image_label.config(image=photo)
+            self.image_label.image = photo
+        else:
+            self.image_label.config(image="")
+            self.image_label.image = None
+
+    def update_mastery(self, mastery_level):
+        """直接标记当前选中错题的掌握程度"""
+        selected = self.mistake_tree.selection()
+        if selected:
+            mistake_id = self.mistake_tree.item(selected[0], "values")[0]
+            self.store.record_review(mistake_id, mastery_level)
+            self.schedule_flush()
+            self.refresh_mistake_row(mistake_id)
+            self.update_due_count()
+            # 掌握程度经触发器改变章节薄弱度, 推荐排序需要刷新
+            self.mark_analytics_dirty()
+
+    def start_review(self):
+        """按所选模式开始复习"""
+        if self.review_mode.get() == "间隔复习":
+            self.due_review()
+        else:
+            self.random_review()
+
+    def due_review(self):
+        """间隔复习: 按到期先后复习已到期的错题"""
+        ids = self.store.due_review_ids(REVIEW_SESSION_SIZE)
+        if ids:
+            self.begin_review_session(ids)
+        else:
+            messagebox.showinfo("提示", "当前没有到期的错题")
+
+    def update_due_count(self):
+        """刷新今日待复习数"""
+        self.due_label.config(text=f"今日待复习: {self.store.due_count()}")
 
     def random_review(self):
-        """智能随机复习功能"""
-        self.cursor.execute('''
-            SELECT * FROM mistakes 
-            WHERE probability > 0 
-            ORDER BY RANDOM() * probability DESC 
-            LIMIT 1
-        ''')
-        mistake = self.cursor.fetchone()
-        if mistake:
-            self.show_review_window(mistake)
+        """智能随机复习功能: 按权重不放回地抽取一轮"""
+        ids = self.store.pick_review_ids(REVIEW_SESSION_SIZE)
+        if ids:
+            self.begin_review_session(ids)
         else:
             messagebox.showinfo("提示", "当前没有需要复习的错题")
 
-    def show_review_window(self, mistake):
-        """显示复习窗口"""
+    def begin_review_session(self, ids):
+        """开始一轮连续复习, 复用同一个复习窗口"""
+        if self.review_session is not None:
+            self.finish_review_session()
+        self.flush_writes()
+        self.review_session = ReviewSession(ids)
+        self.ensure_review_window()
+        self.review_win.deiconify()
+        self.review_win.lift()
+        self.prefetch_review_cards()
+        self.next_review_card()
+
+    def ensure_review_window(self):
+        """首次复习时创建复习窗口, 之后各轮复用"""
+        if self.review_win is not None:
+            return
         review_win = tk.Toplevel(self.root)
         review_win.title("错题复习")
         review_win.geometry("600x700")
+        review_win.protocol("WM_DELETE_WINDOW", self.finish_review_session)
+        
+        self.review_progress = ttk.Label(review_win, text="")
+        self.review_progress.pack(pady=5)
         
         # 题目文本
         text_frame = ttk.Frame(review_win)
         text_scroll = ttk.Scrollbar(text_frame)
-        text = tk.Text(
+        self.review_text = tk.Text(
             text_frame, 
             wrap=tk.WORD, 
             yscrollcommand=text_scroll.set,
             height=10
         )
-        text.insert(tk.END, mistake[3])
-        text.config(state=tk.DISABLED)
-        text.pack(side='left', fill='both', expand=True)
-        text_scroll.config(command=text.yview)
+        self.review_text.pack(side='left', fill='both', expand=True)
+        text_scroll.config(command=self.review_text.yview)
         text_scroll.pack(side='right', fill='y')
         text_frame.pack(fill='both', expand=True, padx=10, pady=5)
         
         # 题目图片
-        if mistake[4]:
-            img = Image.open(BytesIO(mistake[4]))
-            img.thumbnail((500, 500))
-            photo = ImageTk.PhotoImage(img)
-            img_label = ttk.Label(review_win, image=photo)
-            img_label.image = photo
-            img_label.pack(pady=5)
+        self.review_image = ttk.Label(review_win)
+        self.review_image.pack(pady=5)
         
         # 控制按钮
         btn_frame = ttk.Frame(review_win)
-        ttk.Button(btn_frame, text="完全掌握", 
-                 command=lambda: self.handle_review_result(mistake[0], 2, review_win)
-                 ).pack(side='left', padx=10)
-        ttk.Button(btn_frame, text="仍需复习", 
-                 command=lambda: self.handle_review_result(mistake[0], 1, review_win)
-                 ).pack(side='left', padx=10)
+        self.review_buttons = [
+            ttk.Button(btn_frame, text="完全掌握", command=lambda: self.handle_review_result(2)),
+            ttk.Button(btn_frame, text="仍需复习", command=lambda: self.handle_review_result(1)),
+        ]
+        for button in self.review_buttons:
+            button.pack(side='left', padx=10)
+        ttk.Button(btn_frame, text="结束本轮", command=self.finish_review_session).pack(side='left', padx=10)
         btn_frame.pack(pady=10)
+        self.review_win = review_win
 
-    def handle_review_result(self, mistake_id, mastery_level, window):
-        """处理复习结果"""
-        new_prob = max(0.1, 1.0 - (mastery_level-1)*0.4)
-        self.cursor.execute('''
-            UPDATE mistakes 
-            SET mastery_level=?, probability=?, last_reviewed=?
-            WHERE id=?
-        ''', (mastery_level, new_prob, datetime.now().isoformat(), mistake_id))
-        self.conn.commit()
-        window.destroy()
-        self.load_mistakes()
+    def prefetch_review_cards(self):
+        """在后台预取接下来几张卡片的题目与解码后的图片"""
+        session = self.review_session
+        for mistake_id in session.to_prefetch():
+            self.worker.submit(
+                lambda store, i=mistake_id: self.load_review_card(store, i),
+                lambda result, s=session: self.on_review_card_loaded(s, result),
+                lambda e, s=session, i=mistake_id: self.on_review_card_failed(s, i, e)
+            )
+
+    @staticmethod
+    def load_review_card(store, mistake_id, size=500):
+        """工作线程: 读取错题并解码其图片"""
+        mistake = store.get_mistake(mistake_id)
+        img = None
+        if mistake and mistake[4]:
+            img = ThumbnailCache.prepare(store, mistake[4], size)
+        return mistake_id, mistake, img
+
+    def on_review_card_loaded(self, session, result, size=500):
+        """主线程: 预取完成, 创建 PhotoImage; 正在等这张卡片时立即显示"""
+        if session is not self.review_session or session.closed:
+            return
+        mistake_id, mistake, img = result
+        photo = None
+        if img is not None:
+            photo = (self.thumbnails.cached(mistake[4], size)
+                     or self.thumbnails.remember((mistake[4], size), img))
+        session.loaded(mistake_id, (mistake, photo))
+        if session.current == mistake_id:
+            self.show_review_card()
+
+    def on_review_card_failed(self, session, mistake_id, error):
+        """主线程: 预取失败时跳过这张卡片并在进度中注明, 不让界面停在加载提示"""
+        if session is not self.review_session or session.closed:
+            return
+        session.load_failed(mistake_id)
+        if session.current == mistake_id:
+            self.show_review_card()
+
+    def next_review_card(self):
+        """翻到下一张; 全部复习完时结束本轮"""
+        session = self.review_session
+        if session.advance() is None:
+            self.finish_review_session()
+            return
+        self.prefetch_review_cards()
+        self.show_review_card()
+
+    def show_review_card(self):
+        """显示当前卡片, 尚未预取完成时先显示加载提示"""
+        session = self.review_session
+        card = session.card(session.current)
+        progress = f"第 {session.position()} / {session.total} 题"
+        if session.failed:
+            progress += f" ({session.failed} 题加载失败，已跳过)"
+        self.review_progress.config(text=progress)
+        self.review_text.config(state=tk.NORMAL)
+        self.review_text.delete("1.0", tk.END)
+        if card is None:
+            self.review_text.insert(tk.END, "加载中...")
+            self.review_text.config(state=tk.DISABLED)
+            self.review_image.config(image="")
+            for button in self.review_buttons:
+                button.state(["disabled"])
+            return
+        mistake, photo = card
+        if mistake is None:
+            # 复习期间已被删除或加载失败
+            self.review_text.config(state=tk.DISABLED)
+            self.next_review_card()
+            return
+        self.review_text.insert(tk.END, mistake[3])
+        self.review_text.config(state=tk.DISABLED)
+        self.review_image.config(image=photo or "")
+        self.review_image.image = photo
+        for button in self.review_buttons:
+            button.state(["!disabled"])
+
+    def handle_review_result(self, mastery_level):
+        """暂存当前卡片的复习结果并翻到下一张"""
+        session = self.review_session
+        if session is None or session.card(session.current) is None:
+            return
+        session.record(mastery_level)
+        self.next_review_card()
+
+    def finish_review_session(self):
+        """结束本轮: 在一个事务中提交全部结果, 隐藏复习窗口"""
+        session = self.review_session
+        if session is None:
+            return
+        session.closed = True
+        self.review_session = None
+        self.review_win.withdraw()
+        if not session.results:
+            return
+        try:
+            self.store.record_reviews(session.results)
+        except sqlite3.Error as e:
+            messagebox.showerror("数据库错误", f"保存复习结果失败: {str(e)}")
+            return
+        for mistake_id in {result[0] for result in session.results}:
+            self.refresh_mistake_row(mistake_id)
+        self.update_due_count()
+        self.mark_analytics_dirty()
+
+    def on_tab_changed(self, event=None):
+        """切换到分析页时补做积压的刷新"""
+        if self.analytics_dirty and self.analytics_visible():
+            self.update_analytics()
+
+    def analytics_visible(self):
+        """学习分析页当前是否可见"""
+        return self.notebook.select() == str(self.analytics_frame)
+
+    def mark_analytics_dirty(self):
+        """数据已变化, 下次显示分析页时刷新"""
+        self.analytics_dirty = True
+        if self.analytics_visible():
+            self.update_analytics()
+
+    def schedule_flush(self):
+        """安排一次写后延迟提交; 已有待执行的提交时不重复安排"""
+        if self.flush_after is None:
+            self.flush_after = self.root.after(WRITE_BEHIND_FLUSH_MS, self.flush_writes)
+
+    def flush_writes(self):
+        """提交积压的复习结果"""
+        self.flush_after = None
+        try:
+            self.store.flush()
+        except sqlite3.Error as e:
+            messagebox.showerror("数据库错误", f"保存复习结果失败: {str(e)}")
+
+    def update_analytics(self, delay_ms=150):
+        """请求刷新学习分析 (防抖)"""
+        self.analytics_dirty = True
+        if self.analytics_after is not None:
+            self.root.after_cancel(self.analytics_after)
+        self.analytics_after = self.root.after(delay_ms, self.refresh_analytics)
 
-    def update_analytics(self):
-        """更新学习分析数据"""
-        self.figure.clear()
+    def refresh_analytics(self):
+        """在后台读取分析数据, 分析页不可见时推迟到切换过来"""
+        self.analytics_after = None
+        if not self.analytics_visible():
+            return
+        self.analytics_dirty = False
+        # 后台的评分刷新要写库, 也要读到刚积压的复习结果
+        self.flush_writes()
         
         # 获取分析周期
         period = self.period_var.get()
-        if period == "最近一周":
-            time_condition = "AND date(created_at) > date('now', '-7 days')"
-        elif period == "最近一月":
-            time_condition = "AND date(created_at) > date('now', '-1 month')"
-        else:
-            time_condition = ""
-        
-        # 错题类型分布
-        ax1 = self.figure.add_subplot(221)
-        self.cursor.execute(f'''
-            SELECT error_type, COUNT(*) 
-            FROM mistakes 
-            WHERE 1=1 {time_condition}
-            GROUP BY error_type
-        ''')
-        data = self.cursor.fetchall()
-        if data:
-            labels, sizes = zip(*data)
-            ax1.pie(sizes, labels=labels, autopct='%1.1f%%')
-            ax1.set_title('错题类型分布')
-        else:
-            ax1.text(0.5, 0.5, '暂无数据', ha='center', va='center')
-        
-        # 学习进度分析
-        ax2 = self.figure.add_subplot(222)
-        self.cursor.execute(f'''
-            SELECT course_type, 
-                   ROUND(100.0 * SUM(completed)/COUNT(*), 1) 
-            FROM courses 
-            GROUP BY course_type
-        ''')
-        data = self.cursor.fetchall()
-        if data:
-            courses, percents = zip(*data)
-            ax2.bar(courses, percents)
-            ax2.set_ylim(0, 100)
-            ax2.set_title('课程完成进度')
-            ax2.set_ylabel('完成百分比 (%)')
-        
-        # 生成学习推荐
-        self.generate_recommendations(time_condition)
-        
-        self.figure.tight_layout()
-        self.canvas.draw()
 
-    def generate_recommendations(self, time_condition):
+        def load(store):
+            return (store.error_type_stats(period),
+                    store.course_progress(),
+                    store.incomplete_courses(),
+                    store.ranked_chapters(),
+                    load_retention(store))
+
+        self.worker.submit(
+            load, self.apply_analytics,
+            lambda e: messagebox.showerror("数据库错误", f"分析数据加载失败: {str(e)}"),
+            channel="analytics"
+        )
+
+    def apply_analytics(self, result):
+        """更新图表与推荐"""
+        error_stats, progress, incomplete, ranked, retention = result
+        charts = self.ensure_charts()
+        charts.update(error_stats, progress)
+        weak = ()
+        if retention is not None:
+            charts.update_retention(retention)
+            weak = retention["chapters"][:2]
+        self.generate_recommendations(incomplete, ranked, weak)
+
+    def archive_old_terms(self):
+        """把本学期之前的错题与已完成课程的错题移入学期分片"""
+        before = study_archive.term_start()
+        courses = study_archive.finished_courses(self.store)
+        scope = f"{before} 之前创建的错题"
+        if courses:
+            scope += f"以及已完成课程 ({'、'.join(courses)}) 的错题"
+        if not messagebox.askokcancel("归档旧学期", f"将把{scope}移入学期归档文件, 继续吗？"):
+            return
+        self.flush_writes()
+
+        def done(moved):
+            self.store.invalidate_sampler()
+            self.load_mistakes()
+            self.update_due_count()
+            self.mark_analytics_dirty()
+            summary = "\n".join(f"{term}: {count} 条" for term, count in moved.items())
+            messagebox.showinfo("归档完成", summary or "没有需要归档的错题")
+
+        self.worker.submit(
+            lambda store: study_archive.archive_mistakes(store, before, courses), done,
+            lambda e: messagebox.showerror("归档失败", f"归档失败: {str(e)}"),
+            channel="io"
+        )
+
+    def generate_recommendations(self, incomplete, ranked, weak=()):
         """生成学习推荐"""
         self.recommendation_list.delete(*self.recommendation_list.get_children())
         
         # 推荐未完成课程
-        self.cursor.execute('''
-            SELECT course_type || ' - ' || chapter, resource_type
-            FROM courses 
-            WHERE completed=0
-            ORDER BY sort_order
-            LIMIT 3
-        ''')
-        for name, res_type in self.cursor.fetchall():
+        for name, res_type in incomplete:
             self.recommendation_list.insert("", "end", values=(
                 "未完成课程", 
                 f"{name} ({res_type})"
             ))
         
-        # 推荐高频错题章节
-        self.cursor.execute(f'''
-            SELECT course_type || ' - ' || chapter, COUNT(*) 
-            FROM mistakes 
-            WHERE 1=1 {time_condition}
-            GROUP BY course_type, chapter 
-            ORDER BY COUNT(*) DESC 
-            LIMIT 2
-        ''')
-        for chapter, count in self.cursor.fetchall():
+        # 推荐薄弱度最高的章节
+        for chapter, score, count, unmastered, error_type in ranked:
             self.recommendation_list.insert("", "end", values=(
-                "高频错题", 
-                f"{chapter} (错题数: {count})"
+                "薄弱章节",
+                f"{chapter} (未掌握 {unmastered}/{count}, 多为{error_type}, 评分 {score:.1f})"
             ))
+        
+        # 推荐保持率最低的章节
+        for chapter, reviews, rate in weak:
+            self.recommendation_list.insert("", "end", values=(
+                "遗忘较多", 
+                f"{chapter} (保持率: {rate:.0%}, 复习 {reviews} 次)"
+            ))
+
+    def setup_maintenance(self):
+        """安排空闲时的增量回收与统计更新, 以及启动后的一次完整性检查"""
+        self.last_input = time.monotonic()
+        self.last_optimize = 0.0
+        self.maintenance_win = None
+        self.vacuum_notice = None
+        for sequence in ("<Any-KeyPress>", "<Any-ButtonPress>"):
+            self.root.bind_all(sequence, self.note_input, add="+")
+        self.root.after(MAINTENANCE_INTERVAL_MS, self.run_idle_maintenance)
+        self.root.after(QUICK_CHECK_DELAY_MS, self.run_quick_check)
+
+    def note_input(self, event=None):
+        """记录最近一次用户操作的时间"""
+        self.last_input = time.monotonic()
+
+    def run_idle_maintenance(self):
+        """用户空闲时在后台归还一批空闲页, 每小时更新一次查询统计"""
+        self.root.after(MAINTENANCE_INTERVAL_MS, self.run_idle_maintenance)
+        now = time.monotonic()
+        if now - self.last_input < MAINTENANCE_IDLE_S or self.review_session is not None:
+            return
+        if self.vacuum_notice is not None:
+            return
+        self.flush_writes()
+        if study_maintenance.incremental_vacuum_pending(self.store):
+            self.enable_incremental_vacuum()
+            return
+        run_optimize = now - self.last_optimize >= OPTIMIZE_INTERVAL_S
+        if run_optimize:
+            self.last_optimize = now
+
+        def task(store):
+            study_maintenance.incremental_vacuum(store)
+            if run_optimize:
+                study_maintenance.optimize(store)
+
+        # 维护失败 (如数据库正忙) 不打扰用户, 下次空闲再试
+        self.worker.submit(task, errback=lambda e: None, channel="maintenance")
+
+    def enable_incremental_vacuum(self):
+        """旧数据库整库 VACUUM 一次 (迁移 10), 后台执行期间显示提示"""
+        notice = tk.Toplevel(self.root)
+        notice.title("数据库维护")
+        notice.resizable(False, False)
+        ttk.Label(notice, text="正在整理数据库以便今后自动回收空间 (只需一次),\n"
+                               "库较大时需要一段时间, 期间保存可能稍有延迟。").pack(padx=15, pady=10)
+        progress = ttk.Progressbar(notice, mode='indeterminate', length=280)
+        progress.pack(padx=15, pady=(0, 15))
+        progress.start(15)
+        self.vacuum_notice = notice
+
+        def finished(result=None):
+            self.vacuum_notice = None
+            if notice.winfo_exists():
+                notice.destroy()
+
+        # 失败 (如数据库正忙) 时下次空闲再试
+        self.worker.submit(study_maintenance.enable_incremental_vacuum, finished, finished,
+                           channel="maintenance")
+
+    def run_quick_check(self):
+        """在后台连接上执行 quick_check, 发现问题时提示"""
+        def done(problems):
+            if problems:
+                messagebox.showwarning("数据库检查", "数据库完整性检查发现问题:\n" + "\n".join(problems[:10]))
+
+        self.worker.submit(study_maintenance.quick_check, done, lambda e: None, channel="quick-check")
+
+    def show_maintenance_window(self):
+        """数据库维护窗口: 文件大小、空闲页、最大的图片行与一键压缩"""
+        if self.maintenance_win is not None and self.maintenance_win.winfo_exists():
+            self.maintenance_win.lift()
+            self.load_maintenance_stats()
+            return
+        win = tk.Toplevel(self.root)
+        win.title("数据库维护")
+        win.geometry("600x400")
+        self.maintenance_label = ttk.Label(win, text="统计中...", justify='left')
+        self.maintenance_label.pack(fill='x', padx=10, pady=5)
+        columns = ('size', 'refs', 'mistake')
+        self.maintenance_tree = ttk.Treeview(win, columns=columns, show='tree headings')
+        self.maintenance_tree.heading('#0', text='最大的图片', anchor='w')
+        self.maintenance_tree.heading('size', text='大小 (KB)')
+        self.maintenance_tree.heading('refs', text='引用数')
+        self.maintenance_tree.heading('mistake', text='错题 ID')
+        self.maintenance_tree.column('#0', width=200)
+        for column in columns:
+            self.maintenance_tree.column(column, width=100, anchor='e')
+        self.maintenance_tree.pack(fill='both', expand=True, padx=10)
+        btn_frame = ttk.Frame(win)
+        ttk.Button(btn_frame, text="刷新", command=self.load_maintenance_stats).pack(side='left', padx=5)
+        self.compact_button = ttk.Button(btn_frame, text="一键压缩", command=self.compact_database)
+        self.compact_button.pack(side='left', padx=5)
+        btn_frame.pack(pady=5)
+        self.maintenance_win = win
+        self.load_maintenance_stats()
+
+    def load_maintenance_stats(self):
+        """在后台统计并填入维护窗口"""
+        def done(stats):
+            if not self.maintenance_win.winfo_exists():
+                return
+            mb = 1024 * 1024
+            self.maintenance_label.config(text=(
+                f"文件大小: {stats['file_bytes'] / mb:.1f} MB    "
+                f"空闲页: {stats['free_pages']} ({stats['free_bytes'] / mb:.1f} MB)    "
+                f"auto_vacuum: {stats['auto_vacuum']}"
+            ))
+            self.maintenance_tree.delete(*self.maintenance_tree.get_children())
+            for digest, size, refs, mistake_id in stats["largest_images"]:
+                self.maintenance_tree.insert("", "end", text=digest[:16],
+                                             values=(f"{size / 1024:.0f}", refs, mistake_id or ""))
+
+        self.worker.submit(
+            study_maintenance.db_stats, done,
+            lambda e: messagebox.showerror("数据库错误", f"统计失败: {str(e)}"),
+            channel="maintenance-stats"
+        )
+
+    def compact_database(self):
+        """整库 VACUUM, 完成后刷新统计"""
+        self.flush_writes()
+        self.compact_button.state(["disabled"])
+
+        def done(result):
+            before, after = result
+            if self.maintenance_win.winfo_exists():
+                self.compact_button.state(["!disabled"])
+                self.load_maintenance_stats()
+            mb = 1024 * 1024
+            messagebox.showinfo("压缩完成", f"{before / mb:.1f} MB → {after / mb:.1f} MB")
+
+        def failed(e):
+            if self.maintenance_win.winfo_exists():
+                self.compact_button.state(["!disabled"])
+            messagebox.showerror("压缩失败", f"压缩失败: {str(e)}")
+
+        self.worker.submit(study_maintenance.compact, done, failed, channel="compact")
 
     def on_close(self):
         """关闭程序时的处理"""
         if messagebox.askokcancel("退出", "确定要退出程序吗？"):
-            self.conn.close()
+            self.finish_review_session()
+            # 先释放写后延迟持有的写锁, 否则后台线程可能在等锁, close 的 join 会超时
+            self.flush_writes()
+            self.worker.close()
+            self.store.close()
+            if self.profiler is not None:
+                self.profiler.dump(self.profile_path)
             self.root.destroy()
 
 if __name__ == "__main__":
-    StudyMasterPro()
\ No newline at end of file
+    # --startup-timing: 打印启动各阶段耗时, 首个窗口可交互后即退出
+    timing = "--startup-timing" in sys.argv or bool(os.environ.get("STUDYPRO_STARTUP_TIMING"))
+    # --profile [trace.json]: 记录 SQL 与处理函数耗时, 退出时写出 Chrome trace
+    profile = os.environ.get("STUDYPRO_PROFILE")
+    if "--profile" in sys.argv:
+        following = sys.argv[sys.argv.index("--profile") + 1:][:1]
+        profile = following[0] if following and not following[0].startswith("--") else "studypro_trace.json"
+    app = StudyMasterPro(startup_timing=timing, profile_path=profile)
+    sys.exit(getattr(app, "startup_exit_code", 0))
\ No newline at end of file